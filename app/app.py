@@ -15,15 +15,18 @@
 - Статические файлы в папке static/
 """
 
+import argparse
 import os
-from http.server import HTTPServer
 from app.handlers.ImageHostingHandler import ImageHostingHandler
 from dotenv import load_dotenv
 from loguru import logger
-from config.settings import SERVER_ADDRESS
+from config.settings import SERVER_ADDRESS, SERVER_BACKEND, SERVER_MODE, SERVER_WORKERS
 from config.logger_setup import setup_logger
 from app.db.DBManager import DBManager
 from app.router import Router
+from app.server import ServerRunner
+from app.utils import metrics
+from app.utils.static_assets import StaticAssetCache
 
 # Было у router перенесено сюда, из-за проблемы с циклическими импортами
 def register_routes(router, handler_class):
@@ -53,7 +56,15 @@ def register_routes(router, handler_class):
     router.add_route('GET', '/api/images', handler_class.get_images)
     router.add_route('GET', '/api/images/<filename>', handler_class.get_image)
     router.add_route('POST', '/api/images', handler_class.post_upload)
+    router.add_route('POST', '/api/images/batch', handler_class.post_upload_batch)
     router.add_route('DELETE', '/api/images/<filename>', handler_class.delete_image)
+    router.add_route('POST', '/api/images/delete', handler_class.post_delete_batch)
+    
+    # Статистика пула соединений с БД
+    router.add_route('GET', '/api/db/pool', handler_class.get_db_pool_stats)
+
+    # Метрики Prometheus
+    router.add_route('GET', '/metrics', handler_class.get_metrics)
     
     # Маршрут для удаления изображений по ID (согласно ТЗ)
     router.add_route('GET', '/delete/<id>', handler_class.delete_image_by_id)
@@ -61,6 +72,9 @@ def register_routes(router, handler_class):
     # Маршрут для доступа к изображениям через /images/
     router.add_route('GET', '/images/<filename>', handler_class.get_image)
     
+    # Уменьшенные копии изображений: /thumbs/320/<filename> (или /images/<filename>?w=320)
+    router.add_route('GET', '/thumbs/<size>/<filename>', handler_class.get_thumbnail)
+    
     # Статические файлы (JS, CSS, иконки)
     router.add_route('GET', '/static/button.css', lambda handler, **kwargs: handler.serve_static_file('button.css'))
     router.add_route('GET', '/static/style.css', lambda handler, **kwargs: handler.serve_static_file('style.css'))
@@ -71,26 +85,64 @@ def register_routes(router, handler_class):
     logger.info('Routes registered')
 
 # Инициализируем сервер
-def run(server_class=HTTPServer, handler_class=ImageHostingHandler):
+def run(handler_class=ImageHostingHandler, mode=SERVER_MODE, workers=SERVER_WORKERS):
     load_dotenv()
     setup_logger()
+    # До первого запроса к БД: иначе в метрики попадут значения прошлого запуска
+    metrics.clear_multiprocess_dir()
 
     # Инициализируем базу данных
     db = DBManager()
     db.init_tables()
+    if mode == 'prefork':
+        # Каждый воркер откроет собственное соединение после fork()
+        db.close()
 
+    # Маршруты регистрируются до запуска воркеров и дальше только читаются
     router = Router()
     register_routes(router, handler_class)
 
-    httpd = HTTPServer(SERVER_ADDRESS, ImageHostingHandler)
-    try:
-        logger.info(f"Serving at http://{SERVER_ADDRESS[0]}:{SERVER_ADDRESS[1]}")
-        httpd.serve_forever()
-    except BaseException:
-        pass
-    finally:
-        logger.info('Server stopped')
-        httpd.server_close()
+    load_static_assets()
+
+    ServerRunner(handler_class, SERVER_ADDRESS, mode, workers).run()
+
+def load_static_assets():
+    """Загружает статику в память до запуска воркеров (они получат её через fork)"""
+    static_assets = StaticAssetCache()
+    static_assets.install_sighup()
+    static_assets.start_watcher()
+
+def run_async(mode=SERVER_MODE, workers=SERVER_WORKERS):
+    """Запускает асинхронный бэкенд (aiohttp + asyncpg) с теми же маршрутами"""
+    # Импортируем здесь, чтобы синхронный бэкенд не зависел от aiohttp и asyncpg
+    from app.handlers.AsyncImageHostingHandler import AsyncImageHostingHandler
+    from app.server.AsyncServer import AsyncServer
+
+    load_dotenv()
+    setup_logger()
+    metrics.clear_multiprocess_dir()
+
+    router = Router()
+    register_routes(router, AsyncImageHostingHandler)
+
+    load_static_assets()
+
+    AsyncServer(AsyncImageHostingHandler, SERVER_ADDRESS, mode, workers).run()
+
+def main():
+    parser = argparse.ArgumentParser(description='Image Hosting Server')
+    parser.add_argument('--backend', choices=['sync', 'async'], default=SERVER_BACKEND,
+                        help='sync — http.server + psycopg2, async — aiohttp + asyncpg')
+    parser.add_argument('--mode', choices=ServerRunner.MODES, default=SERVER_MODE,
+                        help='режим работы сервера')
+    parser.add_argument('--workers', type=int, default=SERVER_WORKERS,
+                        help='количество процессов для режима prefork')
+    args = parser.parse_args()
+
+    if args.backend == 'async':
+        run_async(args.mode, args.workers)
+    else:
+        run(mode=args.mode, workers=args.workers)
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    main()
@@ -0,0 +1,257 @@
+import asyncio
+import json
+from pathlib import Path
+
+import asyncpg
+from loguru import logger
+
+from app.utils.metrics import db_query
+from app.utils.singleton import SingletonMeta
+from config.settings import (
+    DATABASE_URL, DB_CONNECT_RETRIES, DB_RETRY_DELAY,
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT, JOBS_MAX_ATTEMPTS
+)
+
+
+class AsyncDBManager(metaclass=SingletonMeta):
+    """
+    Асинхронный менеджер базы данных PostgreSQL на asyncpg.
+
+    Повторяет интерфейс DBManager, но все методы — корутины, а соединения
+    берутся из пула asyncpg. Используется асинхронным бэкендом сервера
+    (SERVER_BACKEND=async). Пул создаётся внутри цикла событий вызовом
+    connect() и закрывается вызовом close().
+    """
+
+    def __init__(self):
+        self.pool = None
+
+    async def connect(self) -> None:
+        """Создание пула соединений с базой данных"""
+        for attempt in range(DB_CONNECT_RETRIES):
+            try:
+                self.pool = await asyncpg.create_pool(
+                    DATABASE_URL,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    timeout=DB_POOL_TIMEOUT
+                )
+                logger.info("Успешное подключение к PostgreSQL (asyncpg)")
+                return
+            except (OSError, asyncpg.PostgresError) as e:
+                if attempt < DB_CONNECT_RETRIES - 1:
+                    logger.warning(f"Попытка подключения {attempt + 1}/{DB_CONNECT_RETRIES} не удалась: {e}")
+                    await asyncio.sleep(DB_RETRY_DELAY)
+                else:
+                    logger.error(f"Не удалось подключиться к PostgreSQL после {DB_CONNECT_RETRIES} попыток")
+                    raise
+
+    async def close(self) -> None:
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    def pool_stats(self) -> dict:
+        """Статистика пула соединений: занятые и свободные соединения"""
+        size = self.pool.get_size()
+        idle = self.pool.get_idle_size()
+        return {
+            'in_use': size - idle,
+            'idle': idle,
+            'size': size,
+            'min_size': self.pool.get_min_size(),
+            'max_size': self.pool.get_max_size(),
+        }
+
+    async def init_tables(self) -> None:
+        sql_file_path = Path(__file__).parent / 'init_tables.sql'
+        logger.info(f"Инициализация таблиц из файла {sql_file_path}")
+        query = await asyncio.to_thread(sql_file_path.read_text)
+        async with self.pool.acquire() as conn:
+            await conn.execute(query)
+        logger.info('Tables initialized')
+
+    @db_query('get_images')
+    async def get_images(self, page: int = 1, per_page: int = 10, after: tuple = None) -> list[tuple]:
+        """
+        Получает список изображений с пагинацией.
+
+        Args:
+            page: Номер страницы (начиная с 1), используется без after
+            per_page: Количество изображений на странице
+            after: Позиция (upload_time, id) последней полученной записи
+
+        Returns:
+            Список кортежей с данными изображений
+        """
+        if after is not None:
+            rows = await self.pool.fetch("""
+                SELECT id, filename, original_name, size, file_type, upload_time
+                FROM images
+                WHERE (upload_time, id) < ($1, $2)
+                ORDER BY upload_time DESC, id DESC
+                LIMIT $3
+            """, after[0], after[1], per_page)
+        else:
+            offset = (page - 1) * per_page
+            rows = await self.pool.fetch("""
+                SELECT id, filename, original_name, size, file_type, upload_time
+                FROM images
+                ORDER BY upload_time DESC, id DESC
+                LIMIT $1 OFFSET $2
+            """, per_page, offset)
+        return [tuple(row) for row in rows]
+
+    @db_query('count_images')
+    async def count_images(self) -> int:
+        """Возвращает общее количество изображений"""
+        return await self.pool.fetchval("SELECT COUNT(*) FROM images")
+
+    @db_query('get_filename_by_id')
+    async def get_filename_by_id(self, image_id: int) -> str | None:
+        """Возвращает имя файла изображения по его ID или None"""
+        return await self.pool.fetchval("SELECT filename FROM images WHERE id = $1", image_id)
+
+    @db_query('add_image')
+    async def add_image(self, filename: str, original_name: str, length: int, ext: str,
+                        mime_type: str = None, blob_hash: str = None) -> None:
+        """Добавляет запись об изображении, см. DBManager.add_image"""
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                if blob_hash is not None:
+                    await conn.execute(
+                        "INSERT INTO blobs (hash, size, ref_count) VALUES ($1, $2, 1) "
+                        "ON CONFLICT (hash) DO UPDATE SET ref_count = blobs.ref_count + 1",
+                        blob_hash, length
+                    )
+                await conn.execute(
+                    "INSERT INTO images (filename, original_name, size, file_type, mime_type, blob_hash) "
+                    "VALUES ($1, $2, $3, $4, $5, $6)",
+                    filename, original_name, length, ext, mime_type, blob_hash
+                )
+
+    @db_query('add_images')
+    async def add_images(self, images: list[tuple]) -> None:
+        """
+        Добавляет записи о нескольких изображениях одной транзакцией.
+
+        Кортежи те же, что в DBManager.add_images; строки images загружаются
+        через COPY (copy_records_to_table).
+        """
+        if not images:
+            return
+        blobs = {}
+        for _, _, size, _, _, blob_hash in images:
+            if blob_hash is not None:
+                blobs[blob_hash] = (size, blobs.get(blob_hash, (size, 0))[1] + 1)
+
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                if blobs:
+                    await conn.executemany(
+                        "INSERT INTO blobs (hash, size, ref_count) VALUES ($1, $2, $3) "
+                        "ON CONFLICT (hash) DO UPDATE SET ref_count = blobs.ref_count + EXCLUDED.ref_count",
+                        [(blob_hash, size, count) for blob_hash, (size, count) in sorted(blobs.items())]
+                    )
+                await conn.copy_records_to_table(
+                    'images',
+                    records=images,
+                    columns=['filename', 'original_name', 'size', 'file_type', 'mime_type', 'blob_hash']
+                )
+
+    @db_query('get_image_file')
+    async def get_image_file(self, filename: str) -> tuple[str | None, str | None] | None:
+        """Возвращает (mime_type, blob_hash) изображения или None, если записи нет"""
+        row = await self.pool.fetchrow("SELECT mime_type, blob_hash FROM images WHERE filename = $1", filename)
+        return tuple(row) if row else None
+
+    @db_query('set_mime_type')
+    async def set_mime_type(self, filename: str, mime_type: str) -> None:
+        """Сохраняет MIME-тип для записей, созданных до появления столбца mime_type"""
+        await self.pool.execute(
+            "UPDATE images SET mime_type = $1 WHERE filename = $2 AND mime_type IS NULL",
+            mime_type, filename
+        )
+
+    @db_query('delete_image')
+    async def delete_image(self, filename: str, release_blob: callable = None) -> None:
+        """Удаляет запись об изображении, см. DBManager.delete_image"""
+        await self._delete("DELETE FROM images WHERE filename = $1 RETURNING blob_hash", filename, release_blob)
+
+    @db_query('delete_image_by_id')
+    async def delete_image_by_id(self, image_id: int, release_blob: callable = None) -> None:
+        await self._delete("DELETE FROM images WHERE id = $1 RETURNING blob_hash", image_id, release_blob)
+
+    @db_query('delete_images')
+    async def delete_images(self, ids: list[int] = (), filenames: list[str] = (),
+                            on_deleted: callable = None) -> list[tuple]:
+        """Удаляет записи о нескольких изображениях одним запросом, см. DBManager.delete_images"""
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                rows = await conn.fetch(
+                    "DELETE FROM images WHERE id = ANY($1::integer[]) OR filename = ANY($2::varchar[]) "
+                    "RETURNING id, filename, blob_hash",
+                    list(ids), list(filenames)
+                )
+                deleted = [tuple(row) for row in rows]
+
+                refs = {}
+                for _, _, blob_hash in deleted:
+                    if blob_hash is not None:
+                        refs[blob_hash] = refs.get(blob_hash, 0) + 1
+                if refs:
+                    hashes = sorted(refs)
+                    await conn.execute(
+                        "UPDATE blobs SET ref_count = blobs.ref_count - d.n "
+                        "FROM unnest($1::char(64)[], $2::integer[]) AS d(hash, n) WHERE blobs.hash = d.hash",
+                        hashes, [refs[h] for h in hashes]
+                    )
+                if deleted and on_deleted is not None:
+                    await on_deleted(conn, deleted)
+        return deleted
+
+    @db_query('enqueue_jobs')
+    async def enqueue_jobs(self, kind: str, payloads: list[dict], conn=None) -> None:
+        """
+        Ставит задачи в очередь app.jobs, см. JobQueue.enqueue_many.
+
+        conn — соединение открытой транзакции, иначе задачи вставляются отдельно.
+        """
+        if not payloads:
+            return
+        rows = [(kind, json.dumps(payload), JOBS_MAX_ATTEMPTS) for payload in payloads]
+        query = "INSERT INTO jobs (kind, payload, max_attempts) VALUES ($1, $2::jsonb, $3)"
+        if conn is not None:
+            await conn.executemany(query, rows)
+        else:
+            await self.pool.executemany(query, rows)
+
+    @db_query('purge_blobs')
+    async def purge_blobs(self, hashes: list[str], release_blob: callable = None) -> list[str]:
+        """Удаляет строки blobs без ссылок и их файлы, см. DBManager.purge_blobs"""
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                rows = await conn.fetch(
+                    "DELETE FROM blobs WHERE hash = ANY($1::char(64)[]) AND ref_count <= 0 RETURNING hash",
+                    list(hashes)
+                )
+                released = [row['hash'] for row in rows]
+                if release_blob is not None:
+                    for blob_hash in released:
+                        await asyncio.to_thread(release_blob, blob_hash)
+        return released
+
+    async def _delete(self, query: str, key, release_blob: callable = None) -> None:
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                blob_hash = await conn.fetchval(query, key)
+                if not blob_hash:
+                    return
+                # Как в DBManager._release_blob: файл удаляется, пока строка blobs заблокирована
+                ref_count = await conn.fetchval(
+                    "UPDATE blobs SET ref_count = ref_count - 1 WHERE hash = $1 RETURNING ref_count", blob_hash
+                )
+                if ref_count is not None and ref_count <= 0:
+                    await conn.execute("DELETE FROM blobs WHERE hash = $1", blob_hash)
+                    if release_blob is not None:
+                        await asyncio.to_thread(release_blob, blob_hash)
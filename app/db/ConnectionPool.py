@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+from loguru import logger
+
+
+class PoolTimeoutError(Exception):
+    """Не удалось получить соединение из пула за отведённое время"""
+
+
+class ConnectionPool:
+    """
+    Ограниченный потокобезопасный пул соединений psycopg2.
+
+    Работает по принципу:
+    - При создании открывает min_size соединений
+    - getconn() отдаёт свободное соединение или открывает новое, пока
+      их общее число не достигло max_size; иначе ждёт до timeout секунд
+    - Перед выдачей соединение проверяется: закрытые и сломанные
+      соединения заменяются новыми
+    - putconn() возвращает соединение в пул, откатывая незавершённую транзакцию
+
+    Пул привязан к процессу: после fork() унаследованные соединения
+    забываются (без закрытия, чтобы не оборвать сессии родителя).
+
+    Аргументы:
+        dsn_kwargs (dict): параметры для psycopg2.connect
+        min_size (int): сколько соединений держать открытыми всегда
+        max_size (int): максимальное количество соединений
+        timeout (float): сколько секунд ждать свободное соединение
+        healthcheck_interval (float): через сколько секунд простоя соединение
+                                      перед выдачей проверяется запросом SELECT 1
+    """
+
+    def __init__(self, dsn_kwargs: dict,
+                 min_size: int = 1,
+                 max_size: int = 10,
+                 timeout: float = 5.0,
+                 healthcheck_interval: float = 30.0):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError(f'Invalid pool size: min={min_size}, max={max_size}')
+        self.dsn_kwargs = dsn_kwargs
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+
+        self._cond = threading.Condition(threading.Lock())
+        self._reset_state()
+        for _ in range(min_size):
+            self._idle.append((self._open(), time.monotonic()))
+            self._size += 1
+
+    def _reset_state(self) -> None:
+        self._pid = os.getpid()
+        self._idle = []          # [(conn, время возврата в пул)]
+        self._size = 0           # всего открыто соединений (свободные + выданные)
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'reconnects': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    def _open(self):
+        return psycopg2.connect(**self.dsn_kwargs)
+
+    def _check_pid(self) -> None:
+        if self._pid != os.getpid():
+            logger.info(f'Connection pool inherited by process {os.getpid()}, resetting')
+            self._reset_state()
+
+    @staticmethod
+    def _is_broken(conn) -> bool:
+        return (conn.closed
+                or conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN)
+
+    def _healthcheck(self, conn, idle_since: float) -> bool:
+        """Проверяет соединение перед выдачей"""
+        if self._is_broken(conn):
+            return False
+        if time.monotonic() - idle_since < self.healthcheck_interval:
+            return True
+        try:
+            # Обычный курсор: проверка не должна попадать в метрики запросов
+            with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """
+        Выдаёт соединение из пула.
+
+        Возвращает:
+            соединение psycopg2
+
+        Исключения:
+            PoolTimeoutError: если за timeout секунд соединение не освободилось
+        """
+        started = time.monotonic()
+        waited = False
+        with self._cond:
+            self._check_pid()
+            while not self._idle and self._size >= self.max_size:
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f'No free database connection in {self.timeout}s (max_size={self.max_size})')
+                waited = True
+                self._cond.wait(remaining)
+
+            if self._idle:
+                conn, idle_since = self._idle.pop()
+            else:
+                conn, idle_since = None, None
+                # Резервируем место, само соединение откроем вне блокировки
+                self._size += 1
+
+            wait_time = time.monotonic() - started
+            self._stats['checkouts'] += 1
+            if waited:
+                self._stats['waits'] += 1
+            self._stats['wait_time_total'] += wait_time
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait_time)
+
+        try:
+            if conn is None:
+                return self._open()
+            if not self._healthcheck(conn, idle_since):
+                logger.warning('Broken database connection in pool, reconnecting')
+                self._discard(conn)
+                conn = self._open()
+                with self._cond:
+                    self._stats['reconnects'] += 1
+            return conn
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def putconn(self, conn) -> None:
+        """Возвращает соединение в пул"""
+        if self._pid != os.getpid():
+            # Соединение из чужого процесса, в этот пул его не возвращаем
+            return
+        if not self._is_broken(conn):
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                pass
+
+        with self._cond:
+            if self._is_broken(conn):
+                self._size -= 1
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @staticmethod
+    def _discard(conn) -> None:
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def closeall(self) -> None:
+        """Закрывает все свободные соединения пула"""
+        with self._cond:
+            if self._pid != os.getpid():
+                self._reset_state()
+                return
+            for conn, _ in self._idle:
+                self._discard(conn)
+            self._size -= len(self._idle)
+            self._idle = []
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        """
+        Возвращает статистику пула для подбора его размера.
+
+        Возвращает:
+            dict: in_use, idle, size, min_size, max_size, checkouts, waits,
+                  timeouts, reconnects, wait_time_total, wait_time_max, wait_time_avg
+        """
+        with self._cond:
+            self._check_pid()
+            stats = dict(self._stats)
+            stats.update({
+                'in_use': self._size - len(self._idle),
+                'idle': len(self._idle),
+                'size': self._size,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            })
+        checkouts = stats['checkouts']
+        stats['wait_time_avg'] = stats['wait_time_total'] / checkouts if checkouts else 0.0
+        return stats
@@ -2,25 +2,67 @@ import logging
 import time
 import os
 import psycopg2
+from psycopg2.extensions import cursor as BaseCursor
+from psycopg2.extras import execute_values
+from contextlib import contextmanager
 from loguru import logger
 from pathlib import Path
 
+from app.db.ConnectionPool import ConnectionPool
+from app.utils import metrics, profiling
+from app.utils.metrics import db_query
 from app.utils.singleton import SingletonMeta
-from config.settings import DB_CONFIG, DB_CONNECT_RETRIES, DB_RETRY_DELAY
+from config.settings import (
+    DB_CONFIG, DB_CONNECT_RETRIES, DB_RETRY_DELAY,
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT, DB_POOL_HEALTHCHECK_INTERVAL
+)
+
+
+class TimedCursor(BaseCursor):
+    """
+    Курсор, который измеряет время каждого запроса для метрик Prometheus.
+
+    Имя запроса берётся из декоратора metrics.db_query на методе DBManager.
+    """
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        failed = False
+        try:
+            with profiling.phase('db'):
+                return super().execute(query, vars)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            metrics.observe_query(time.perf_counter() - started, failed)
 
 
 class DBManager(metaclass=SingletonMeta):
-    """Менеджер подключения к базе данных PostgreSQL"""
+    """
+    Менеджер подключения к базе данных PostgreSQL.
+
+    Соединения берутся из ограниченного пула (ConnectionPool) на время одной
+    операции, поэтому запросы из разных потоков выполняются параллельно и их
+    транзакции не перемешиваются. Размер пула и время ожидания свободного
+    соединения задаются в config/settings.py.
+    """
     
     def __init__(self):
-        self.conn = None
+        self.pool = None
         self._connect()
     
     def _connect(self):
-        """Установка соединения с базой данных"""
+        """Создание пула соединений с базой данных"""
         for attempt in range(DB_CONNECT_RETRIES):
             try:
-                self.conn = psycopg2.connect(**DB_CONFIG)
+                self.pool = ConnectionPool(
+                    dict(DB_CONFIG, cursor_factory=TimedCursor),
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    healthcheck_interval=DB_POOL_HEALTHCHECK_INTERVAL
+                )
                 logger.info("Успешное подключение к PostgreSQL")
                 return
             except psycopg2.OperationalError as e:
@@ -30,20 +72,41 @@ class DBManager(metaclass=SingletonMeta):
                 else:
                     logger.error(f"Не удалось подключиться к PostgreSQL после {DB_CONNECT_RETRIES} попыток")
                     raise
-    
-    def get_connection(self):
-        """Получение активного соединения"""
-        if not self.conn or self.conn.closed:
-            self._connect()
-        return self.conn
+
+    @contextmanager
+    def connection(self):
+        """
+        Выдаёт соединение из пула на время блока with.
+
+        При успешном выходе из блока транзакция фиксируется,
+        при исключении — откатывается. После блока соединение
+        возвращается в пул.
+        """
+        with profiling.phase('db_pool'):
+            conn = self.pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    def close(self) -> None:
+        """Закрывает свободные соединения (например, перед запуском рабочих процессов)"""
+        self.pool.closeall()
+
+    def pool_stats(self) -> dict:
+        """Статистика пула соединений: занятые, свободные, время ожидания"""
+        return self.pool.stats()
 
     def execute(self, query: str) -> None:
-        if not self.conn:
-            logger.error("No database connection")
-            return
         try:
-            with self.conn.cursor() as cursor:
-                cursor.execute(query)
+            with self.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(query)
         except psycopg2.Error as e:
             logger.error(f"Error executing query: {e}")
 
@@ -56,10 +119,6 @@ class DBManager(metaclass=SingletonMeta):
             logger.error(f"File {filename} not found")
 
     def init_tables(self) -> None:
-        if not self.conn:
-            logger.error("No database connection")
-            return
-        
         # Используем абсолютный путь к SQL-файлу
         current_dir = Path(__file__).parent
         sql_file_path = current_dir / 'init_tables.sql'
@@ -67,51 +126,271 @@ class DBManager(metaclass=SingletonMeta):
         logger.info(f"Инициализация таблиц из файла {sql_file_path}")
         self.execute_file(sql_file_path)
         logger.info('Tables initialized')
-        self.conn.commit()
 
-    def get_images(self, page: int = 1, per_page: int = 10) -> list[tuple]:
+    @db_query('get_images')
+    def get_images(self, page: int = 1, per_page: int = 10, after: tuple = None) -> list[tuple]:
         """
         Получает список изображений с пагинацией.
         
         Args:
-            page: Номер страницы (начиная с 1)
+            page: Номер страницы (начиная с 1), используется без after
             per_page: Количество изображений на странице
+            after: Позиция (upload_time, id) последней полученной записи.
+                   Если задана, выборка идёт по ключу, а не через OFFSET:
+                   стоимость запроса не зависит от глубины страницы.
             
         Returns:
             Список кортежей с данными изображений
         """
-        offset = (page - 1) * per_page
-        logger.info(f'Try to get images with offset {offset}, limit {per_page}')
-        with self.get_connection().cursor() as cursor:
-            cursor.execute("""
-                SELECT id, filename, original_name, size, file_type, upload_time 
-                FROM images 
-                ORDER BY upload_time DESC 
-                LIMIT %s OFFSET %s
-            """, (per_page, offset))
-            return cursor.fetchall()
-
-    def add_image(self, filename: str, original_name: str, length: int, ext: str) -> None:
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                if after is not None:
+                    cursor.execute("""
+                        SELECT id, filename, original_name, size, file_type, upload_time
+                        FROM images
+                        WHERE (upload_time, id) < (%s, %s)
+                        ORDER BY upload_time DESC, id DESC
+                        LIMIT %s
+                    """, (after[0], after[1], per_page))
+                else:
+                    offset = (page - 1) * per_page
+                    cursor.execute("""
+                        SELECT id, filename, original_name, size, file_type, upload_time
+                        FROM images
+                        ORDER BY upload_time DESC, id DESC
+                        LIMIT %s OFFSET %s
+                    """, (per_page, offset))
+                return cursor.fetchall()
+
+    @db_query('count_images')
+    def count_images(self) -> int:
+        """Возвращает общее количество изображений"""
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM images")
+                return cursor.fetchone()[0]
+
+    @db_query('get_filename_by_id')
+    def get_filename_by_id(self, image_id) -> str | None:
+        """Возвращает имя файла изображения по его ID или None"""
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT filename FROM images WHERE id = %s", (image_id,))
+                result = cursor.fetchone()
+                return result[0] if result else None
+
+    @db_query('add_image')
+    def add_image(self, filename: str, original_name: str, length: int, ext: str,
+                  mime_type: str = None, blob_hash: str = None) -> None:
+        """
+        Добавляет запись об изображении.
+
+        Если задан blob_hash (STORAGE_MODE=cas), в той же транзакции
+        увеличивается счётчик ссылок на файл в таблице blobs.
+        """
         logger.info(f'Try to add image {filename}')
-        with self.conn.cursor() as cursor:
-            cursor.execute(
-                "INSERT INTO images "
-                "(filename, original_name, size, file_type)"
-                "VALUES (%s, %s, %s, %s)",
-                (filename, original_name, length, ext)
-            )
-        self.conn.commit()
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                if blob_hash is not None:
+                    cursor.execute(
+                        "INSERT INTO blobs (hash, size, ref_count) VALUES (%s, %s, 1) "
+                        "ON CONFLICT (hash) DO UPDATE SET ref_count = blobs.ref_count + 1",
+                        (blob_hash, length)
+                    )
+                cursor.execute(
+                    "INSERT INTO images "
+                    "(filename, original_name, size, file_type, mime_type, blob_hash)"
+                    "VALUES (%s, %s, %s, %s, %s, %s)",
+                    (filename, original_name, length, ext, mime_type, blob_hash)
+                )
+
+    @db_query('add_images')
+    def add_images(self, images: list[tuple]) -> None:
+        """
+        Добавляет записи о нескольких изображениях одной транзакцией.
+
+        Аргументы:
+            images: кортежи (filename, original_name, size, file_type, mime_type, blob_hash)
+
+        Все строки вставляются одним INSERT через execute_values; счётчики
+        ссылок в blobs увеличиваются одним запросом на весь пакет. Если
+        вставка не удалась, не добавляется ни одна запись.
+        """
+        if not images:
+            return
+        logger.info(f'Try to add {len(images)} images')
 
+        # Один файл может встретиться в пакете несколько раз, а ON CONFLICT
+        # не может изменить одну строку дважды — складываем ссылки заранее
+        blobs = {}
+        for _, _, size, _, _, blob_hash in images:
+            if blob_hash is not None:
+                blobs[blob_hash] = (size, blobs.get(blob_hash, (size, 0))[1] + 1)
+
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                if blobs:
+                    # Сортировка по хэшу — одинаковый порядок блокировок, без взаимоблокировок
+                    execute_values(
+                        cursor,
+                        "INSERT INTO blobs (hash, size, ref_count) VALUES %s "
+                        "ON CONFLICT (hash) DO UPDATE SET ref_count = blobs.ref_count + EXCLUDED.ref_count",
+                        [(blob_hash, size, count) for blob_hash, (size, count) in sorted(blobs.items())]
+                    )
+                execute_values(
+                    cursor,
+                    "INSERT INTO images (filename, original_name, size, file_type, mime_type, blob_hash) VALUES %s",
+                    images,
+                    page_size=1000
+                )
+
+    @db_query('get_image_file')
+    def get_image_file(self, filename: str) -> tuple[str | None, str | None] | None:
+        """
+        Возвращает (mime_type, blob_hash) изображения или None, если записи нет.
+
+        mime_type равен None у записей, созданных до появления столбца,
+        blob_hash — у файлов, которые хранятся под своим именем.
+        """
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT mime_type, blob_hash FROM images WHERE filename = %s", (filename,))
+                return cursor.fetchone()
+
+    @db_query('set_mime_type')
+    def set_mime_type(self, filename: str, mime_type: str) -> None:
+        """Сохраняет MIME-тип для записей, созданных до появления столбца mime_type"""
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE images SET mime_type = %s WHERE filename = %s AND mime_type IS NULL",
+                    (mime_type, filename)
+                )
+
+    @db_query('clear_images')
     def clear_images(self) -> None:
-        with self.conn.cursor() as cursor:
-            cursor.execute("DELETE FROM images")
-        self.conn.commit()
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM images")
 
-    def delete_image(self, filename: str) -> None:
+    @db_query('delete_image')
+    def delete_image(self, filename: str, release_blob: callable = None) -> None:
+        """
+        Удаляет запись об изображении.
+
+        Аргументы:
+            filename: имя файла изображения
+            release_blob: функция release_blob(hash), удаляющая файл, на который
+                больше никто не ссылается (см. _release_blob)
+
+        Исключения:
+            psycopg2.Error: запись не удалена — вызывающий не должен удалять
+                файл и сообщать об успехе
+        """
         logger.info(f'Try to delete image {filename}')
-        try:
-            with self.conn.cursor() as cursor:
-                cursor.execute("DELETE FROM images WHERE filename = %s", (filename,))
-            self.conn.commit()
-        except psycopg2.Error as e:
-            logger.error(f"Error deleting image: {e}")
\ No newline at end of file
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM images WHERE filename = %s RETURNING blob_hash", (filename,))
+                row = cursor.fetchone()
+                if row and row[0]:
+                    self._release_blob(cursor, row[0], release_blob)
+
+    @db_query('delete_image_by_id')
+    def delete_image_by_id(self, image_id, release_blob: callable = None) -> None:
+        logger.info(f'Try to delete image with id {image_id}')
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM images WHERE id = %s RETURNING blob_hash", (image_id,))
+                row = cursor.fetchone()
+                if row and row[0]:
+                    self._release_blob(cursor, row[0], release_blob)
+
+    @db_query('delete_images')
+    def delete_images(self, ids: list[int] = (), filenames: list[str] = (),
+                      on_deleted: callable = None) -> list[tuple]:
+        """
+        Удаляет записи о нескольких изображениях одним запросом.
+
+        Счётчики ссылок в blobs уменьшаются одним UPDATE, но строки с нулевым
+        счётчиком не удаляются: файлы освобождает purge_blobs уже после
+        ответа клиенту (см. app.storage.UnlinkQueue).
+
+        Аргументы:
+            ids: идентификаторы изображений
+            filenames: имена файлов изображений
+            on_deleted: функция on_deleted(cursor, deleted), выполняемая в той же
+                транзакции (например, постановка задачи files.unlink в app.jobs)
+
+        Возвращает:
+            list[tuple]: (id, filename, blob_hash) удалённых записей
+        """
+        logger.info(f'Try to delete {len(ids)} images by id and {len(filenames)} by filename')
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "DELETE FROM images WHERE id = ANY(%s::integer[]) OR filename = ANY(%s::varchar[]) "
+                    "RETURNING id, filename, blob_hash",
+                    (list(ids), list(filenames))
+                )
+                deleted = cursor.fetchall()
+
+                refs = {}
+                for _, _, blob_hash in deleted:
+                    if blob_hash is not None:
+                        refs[blob_hash] = refs.get(blob_hash, 0) + 1
+                if refs:
+                    hashes = sorted(refs)
+                    cursor.execute(
+                        "UPDATE blobs SET ref_count = blobs.ref_count - d.n "
+                        "FROM unnest(%s::char(64)[], %s::integer[]) AS d(hash, n) WHERE blobs.hash = d.hash",
+                        (hashes, [refs[h] for h in hashes])
+                    )
+                if deleted and on_deleted is not None:
+                    on_deleted(cursor, deleted)
+        return deleted
+
+    @db_query('purge_blobs')
+    def purge_blobs(self, hashes: list[str], release_blob: callable = None) -> list[str]:
+        """
+        Удаляет строки blobs без ссылок и их файлы.
+
+        Как и в _release_blob, файлы удаляются внутри транзакции: DELETE
+        блокирует строки, и загрузка того же содержимого либо успела
+        увеличить счётчик (тогда строка не удаляется), либо ждёт коммита и
+        создаёт файл заново.
+
+        Возвращает:
+            list[str]: хэши освобождённых файлов
+        """
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "DELETE FROM blobs WHERE hash = ANY(%s::char(64)[]) AND ref_count <= 0 RETURNING hash",
+                    (list(hashes),)
+                )
+                released = [row[0] for row in cursor.fetchall()]
+                if release_blob is not None:
+                    for blob_hash in released:
+                        release_blob(blob_hash)
+        return released
+
+    @staticmethod
+    def _release_blob(cursor, blob_hash: str, release_blob: callable = None) -> None:
+        """
+        Уменьшает счётчик ссылок на файл и удаляет его, если ссылок не осталось.
+
+        Файл удаляется внутри транзакции, пока строка blobs заблокирована
+        UPDATE: параллельная загрузка того же содержимого ждёт на
+        INSERT ... ON CONFLICT и после коммита создаёт файл заново, поэтому
+        не может остаться записи без файла. Если удалить файл не удалось,
+        транзакция откатывается.
+        """
+        cursor.execute(
+            "UPDATE blobs SET ref_count = ref_count - 1 WHERE hash = %s RETURNING ref_count",
+            (blob_hash,)
+        )
+        row = cursor.fetchone()
+        if row and row[0] <= 0:
+            cursor.execute("DELETE FROM blobs WHERE hash = %s", (blob_hash,))
+            if release_blob is not None:
+                release_blob(blob_hash)
@@ -2,6 +2,7 @@
 Пакет db - работа с базой данных.
 """
 
+from .ConnectionPool import ConnectionPool, PoolTimeoutError
 from .DBManager import DBManager
 
-__all__ = ['DBManager']
\ No newline at end of file
+__all__ = ['ConnectionPool', 'DBManager', 'PoolTimeoutError']
\ No newline at end of file
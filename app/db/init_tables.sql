@@ -8,8 +8,48 @@ CREATE TABLE IF NOT EXISTS images (
     upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- MIME-тип, определённый libmagic при загрузке (file_type хранит только расширение).
+-- У записей, созданных до появления столбца, заполняется при первом обращении
+ALTER TABLE images ADD COLUMN IF NOT EXISTS mime_type VARCHAR(100);
+
 -- Создание индекса для быстрого поиска по имени файла
 CREATE INDEX IF NOT EXISTS idx_images_filename ON images(filename);
 
--- Создание индекса для сортировки по времени загрузки
-CREATE INDEX IF NOT EXISTS idx_images_upload_time ON images(upload_time DESC);
\ No newline at end of file
+-- Составной индекс для постраничной выдачи по курсору (upload_time, id).
+-- Покрывает и сортировку по одному upload_time, поэтому старый индекс не нужен
+CREATE INDEX IF NOT EXISTS idx_images_upload_time_id ON images(upload_time DESC, id DESC);
+DROP INDEX IF EXISTS idx_images_upload_time;
+
+-- Файлы в режиме хранения по содержимому (STORAGE_MODE=cas).
+-- Одинаковые загрузки ссылаются на один файл, ref_count — число таких ссылок
+CREATE TABLE IF NOT EXISTS blobs (
+    hash CHAR(64) PRIMARY KEY,
+    size BIGINT NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Хэш файла изображения; NULL — файл лежит в IMAGES_PATH под своим именем
+ALTER TABLE images ADD COLUMN IF NOT EXISTS blob_hash CHAR(64) REFERENCES blobs(hash);
+CREATE INDEX IF NOT EXISTS idx_images_blob_hash ON images(blob_hash);
+
+-- Очередь фоновых задач (app/jobs). Задачу забирает воркер
+-- (SELECT ... FOR UPDATE SKIP LOCKED) и держит до locked_until; если
+-- воркер не успел завершить её к этому времени, задачу заберёт другой
+CREATE TABLE IF NOT EXISTS jobs (
+    id BIGSERIAL PRIMARY KEY,
+    kind VARCHAR(100) NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    status VARCHAR(10) NOT NULL DEFAULT 'queued',  -- queued | running | failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_by VARCHAR(100),
+    locked_until TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Выполненные задачи удаляются, поэтому индекс покрывает только ожидающие
+CREATE INDEX IF NOT EXISTS idx_jobs_queued ON jobs(run_at) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_jobs_running ON jobs(locked_until) WHERE status = 'running';
@@ -1,12 +1,94 @@
+import io
 import json
+import os
 import os.path
+import time
+from contextlib import closing
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler
-from urllib.parse import urlparse
+from socketserver import ThreadingMixIn
+from urllib.parse import quote, urlparse
 
 from loguru import logger
 
 from app.router import Router
-from config.settings import STATIC_PATH
+from app.utils import metrics, profiling
+from app.utils.access_log import AccessLog
+from app.utils.compression import compress_dynamic, dynamic_encoding
+from app.utils.conditional import if_range_matches
+from app.utils.static_assets import StaticAssetCache
+from config.settings import (
+    STATIC_PATH, DEFAULT_CACHE_CONTROL,
+    SERVER_KEEPALIVE_TIMEOUT, SERVER_KEEPALIVE_MAX_REQUESTS, SERVER_DRAIN_MAX_SIZE
+)
+
+class _CountingReader(io.BufferedIOBase):
+    """Обёртка над rfile, которая считает прочитанные байты: по ним видно, сколько тела запроса осталось"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.consumed = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size=-1) -> bytes:
+        data = self.raw.read(size)
+        self.consumed += len(data)
+        return data
+
+    def read1(self, size=-1) -> bytes:
+        data = self.raw.read1(size)
+        self.consumed += len(data)
+        return data
+
+    def readinto(self, b) -> int:
+        size = self.raw.readinto(b)
+        self.consumed += size or 0
+        return size
+
+    def readline(self, size=-1) -> bytes:
+        data = self.raw.readline(size)
+        self.consumed += len(data)
+        return data
+
+    def peek(self, size=0) -> bytes:
+        return self.raw.peek(size)
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self.raw.close()
+
+
+class _CountingWriter(io.BufferedIOBase):
+    """Обёртка над wfile, которая считает отправленные байты (для метрик)"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.written = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self.raw.write(b)
+        size = len(b) if isinstance(b, bytes) else memoryview(b).nbytes
+        self.written += size
+        return size
+
+    def flush(self) -> None:
+        self.raw.flush()
+
+    def close(self) -> None:
+        # IOBase.close вызывает flush, поэтому исходный поток закрываем после
+        try:
+            super().close()
+        finally:
+            self.raw.close()
+
 
 class AdvancedHTTPRequestHandler(BaseHTTPRequestHandler):
     """
@@ -25,22 +107,171 @@ class AdvancedHTTPRequestHandler(BaseHTTPRequestHandler):
         - do_HEAD: обрабатывает HEAD-запросы.
         - send_html: отправляет HTML-файл как ответ.
         - send_json: отправляет JSON-ответ.
+        - send_file: отправляет файл с диска через sendfile с поддержкой Range.
+        - send_object: отправляет объект удалённого хранилища потоком с поддержкой Range.
+        - send_body: отправляет тело из памяти с Content-Length.
+
+    Текстовые ответы send_body сжимаются по Accept-Encoding
+    (см. compression.dynamic_encoding), картинки и файлы send_file — нет.
+
+    Соединения постоянные (HTTP/1.1 keep-alive, см. handle): у каждого
+    ответа должен быть Content-Length. Ответ без него отправляется, но
+    соединение после него закрывается.
     """
 
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело ответа уходят отдельными send: без TCP_NODELAY алгоритм Нейгла
+    # придержал бы тело до подтверждения заголовков (до 40 мс на keep-alive соединении)
+    disable_nagle_algorithm = True
+
+    # Размер блока для отправки файла, если sendfile недоступен
+    FILE_CHUNK_SIZE = 64 * 1024
+
     def __init__(self, request, client_address, server):
         self.default_response = lambda: self.handle_error(404, "Страница не найдена")
         self.router = Router()
         super().__init__(request, client_address, server)
 
+    def setup(self):
+        super().setup()
+        self.rfile = _CountingReader(self.rfile)
+        self.wfile = _CountingWriter(self.wfile)
+
+    def handle(self):
+        """
+        Обслуживает соединение: запросы идут по нему друг за другом (keep-alive).
+
+        Следующего запроса соединение ждёт не дольше SERVER_KEEPALIVE_TIMEOUT
+        секунд и закрывается после SERVER_KEEPALIVE_MAX_REQUESTS запросов
+        (последний ответ содержит Connection: close).
+        """
+        self.requests_served = 0
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            self.requests_served += 1
+            if not self._wait_for_request():
+                break
+            self.handle_one_request()
+
+    def _wait_for_request(self) -> bool:
+        """Ждёт начала следующего запроса; False — клиент закрыл соединение или молчал дольше таймаута"""
+        self.connection.settimeout(SERVER_KEEPALIVE_TIMEOUT)
+        try:
+            # Молчащее соединение закрываем тихо: log_error из handle_one_request тут не нужен
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def _keepalive_allowed(self) -> bool:
+        # Однопоточный сервер (режим single) не должен ждать следующего запроса
+        # одного клиента, пока другие стоят в очереди
+        return (SERVER_KEEPALIVE_TIMEOUT > 0
+                and self.requests_served + 1 < SERVER_KEEPALIVE_MAX_REQUESTS
+                and isinstance(self.server, ThreadingMixIn))
+
+    def handle_expect_100(self):
+        # Промежуточный ответ 100 Continue отправляется без заголовков из end_headers
+        self.send_response_only(HTTPStatus.CONTINUE)
+        BaseHTTPRequestHandler.end_headers(self)
+        return True
+
+    def log_request(self, code='-', size='-'):
+        # Запрос пишет журнал доступа (AccessLog) после обработки, а не при отправке статуса
+        pass
+
+    def log_message(self, format, *args):
+        # Остались только сообщения log_error (например, неразборчивый запрос) — в основной журнал
+        logger.warning(f'{self.address_string()}: {format % args}')
+
+    def send_response(self, code, message=None):
+        # Запоминаем, какие заголовки выставил обработчик, и код ответа для метрик
+        self._response_headers = set()
+        self._response_status = code
+        self._headers_sent = False
+        super().send_response(code, message)
+
+    def send_header(self, keyword, value):
+        if hasattr(self, '_response_headers'):
+            self._response_headers.add(keyword.lower())
+        super().send_header(keyword, value)
+
     def end_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
-        self.send_header('Pragma', 'no-cache')
-        self.send_header('Expires', '0')
+        # Политику кэширования задаёт маршрут; если он её не задал — ответ динамический
+        if 'cache-control' not in getattr(self, '_response_headers', ()):
+            self.send_header('Cache-Control', DEFAULT_CACHE_CONTROL)
+            self.send_header('Pragma', 'no-cache')
+            self.send_header('Expires', '0')
+        self._send_connection_header()
         super().end_headers()
+        self._headers_sent = True
+
+    def _send_connection_header(self) -> None:
+        """
+        Решает, останется ли соединение открытым после ответа.
 
-    def handle_error(self, status_code: int, message: str):
+        Соединение закрывается, если keep-alive выключен или исчерпан,
+        если у ответа нет Content-Length (конец тела можно обозначить
+        только закрытием) или если непрочитанный остаток тела
+        запроса больше SERVER_DRAIN_MAX_SIZE — его дешевле не дочитывать.
+        """
+        headers = getattr(self, '_response_headers', set())
+        if not self.close_connection:
+            unread = self._unread_body_size()
+            framed = ('content-length' in headers
+                      or self._response_status in (HTTPStatus.NO_CONTENT, HTTPStatus.NOT_MODIFIED))
+            if (not self._keepalive_allowed() or not framed
+                    or unread is None or unread > SERVER_DRAIN_MAX_SIZE):
+                self.close_connection = True
+        if self.close_connection:
+            if 'connection' not in headers:
+                self.send_header('Connection', 'close')
+        elif self.request_version == 'HTTP/1.0':
+            # Клиент HTTP/1.0 попросил keep-alive — подтверждаем
+            self.send_header('Connection', 'keep-alive')
+
+    def _unread_body_size(self) -> int | None:
+        """Сколько байт тела запроса ещё не прочитано; None — неизвестно (chunked или неверный Content-Length)"""
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            return None
+        content_length = self.headers.get('Content-Length')
+        if not content_length:
+            return 0
+        if not content_length.isdigit():
+            return None
+        body_read = self.rfile.consumed - getattr(self, '_body_start', self.rfile.consumed)
+        return max(0, int(content_length) - body_read)
+
+    def _drain_request_body(self) -> None:
+        """
+        Дочитывает тело запроса, которое обработчик не прочитал (ошибка,
+        404, ранний ответ), чтобы следующий запрос на соединении начался
+        с начала. Слишком большой или неизвестный остаток не читается —
+        соединение закрывается.
+        """
+        unread = self._unread_body_size()
+        if unread is None or unread > SERVER_DRAIN_MAX_SIZE:
+            self.close_connection = True
+            return
+        try:
+            while unread > 0:
+                chunk = self.rfile.read(min(unread, self.FILE_CHUNK_SIZE))
+                if not chunk:
+                    self.close_connection = True
+                    return
+                unread -= len(chunk)
+        except OSError:
+            self.close_connection = True
+
+    def handle_error(self, status_code: int, message: str, headers: dict = None):
         logger.error(f'Error {status_code}: {message}')
+        if getattr(self, '_headers_sent', False):
+            # Ответ уже начат — второй ответ сломал бы соединение; клиент увидит обрыв
+            self.close_connection = True
+            return
         # Получаем заголовок Accept
         accept = self.headers.get('Accept', '')
 
@@ -60,13 +291,13 @@ class AdvancedHTTPRequestHandler(BaseHTTPRequestHandler):
             #     'message': message,
             #     'image': image
             # })
-            self.send_html('error.html', code=status_code, context={
+            self.send_html('error.html', code=status_code, headers=headers, context={
                 'status_code': status_code,
                 'message': message
             })
         else:
             # Отправляем JSON для Postman
-            self.send_json({'error': message}, code=status_code)
+            self.send_json({'error': message}, code=status_code, headers=headers)
 
     def send_html(self, file: str,
                   code: int = 200,
@@ -74,38 +305,301 @@ class AdvancedHTTPRequestHandler(BaseHTTPRequestHandler):
                   file_path: str = STATIC_PATH,
                   context: dict = None) -> None:
         try:
-            self.send_response(code)
-            self.send_header('Content-type', 'text/html')
-            if headers:
-                for header, value in headers.items():
-                    self.send_header(header, value)
-            self.end_headers()
-
-            with open(os.path.join(file_path, file), encoding='utf-8') as f:
-                content = f.read()
+            # Шаблоны из STATIC_PATH берём из кэша в памяти, остальные читаем с диска
+            asset = StaticAssetCache().get(file) if file_path == STATIC_PATH else None
+            if asset is not None:
+                content = asset.body.decode('utf-8')
+            else:
+                with open(os.path.join(file_path, file), encoding='utf-8') as f:
+                    content = f.read()
 
             # Простая подстановка переменных вида {{ ключ }}
             if context:
                 for key, value in context.items():
                     content = content.replace(f'{{{{ {key} }}}}', str(value))
 
-            self.wfile.write(content.encode('utf-8'))
-
         except Exception as e:
             logger.error(f"Ошибка при отправке HTML: {e}")
             self.send_json({'error': 'Internal Server Error'}, code=500)
+            return
+
+        self.send_body(content.encode('utf-8'), 'text/html', code, headers)
 
     def send_json(self, response: dict,
                   code: int = 200,
-                  headers: dict = None) -> None:
-        
+                  headers: dict = None,
+                  content_type: str = 'application/json') -> None:
+        self.send_body(json.dumps(response).encode('utf-8'), content_type, code, headers)
+
+    def send_body(self, body: bytes, content_type: str, code: int = 200, headers: dict = None) -> None:
+        """
+        Отправляет ответ с телом из памяти и Content-Length (на HEAD — только заголовки).
+
+        Тело сжимается целиком, если клиент принимает сжатие (_response_encoding):
+        длина сжатого тела известна, поэтому Content-Length сохраняется.
+        """
+        headers = dict(headers or {})
+        encoding = self._response_encoding(content_type, code, headers, len(body))
+        if encoding:
+            body = compress_dynamic(body, encoding)
         self.send_response(code)
-        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-type', content_type)
+        if headers:
+            for header, value in headers.items():
+                self.send_header(header, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _response_encoding(self, content_type: str, code: int, headers: dict, size: int) -> str | None:
+        """Сжатие ответа по Accept-Encoding; добавляет в headers Vary и Content-Encoding (см. dynamic_encoding)"""
+        return dynamic_encoding(self.headers.get('Accept-Encoding'), content_type, code, headers, size)
+
+    def send_file(self, file_path: str,
+                  content_type: str = None,
+                  headers: dict = None,
+                  meta=None) -> None:
+        """
+        Отправляет файл с диска.
+
+        Тело отправляется системным вызовом sendfile (файл не копируется
+        в память Python), а если он недоступен — блоками по FILE_CHUNK_SIZE.
+        Поддерживаются заголовки Range и If-Range: для одного диапазона байт
+        возвращается 206 Partial Content, для недопустимого — 416.
+        Ответ содержит ETag и Last-Modified; на If-None-Match и
+        If-Modified-Since отвечает 304 Not Modified без тела.
+
+        Аргументы:
+            file_path (str): путь к файлу
+            content_type (str): MIME-тип файла
+            headers (dict): дополнительные заголовки ответа
+            meta (ImageMetadata): заранее известные размер, mtime и ETag файла.
+                Если переданы, fstat не вызывается, а 304 отправляется
+                без открытия файла.
+
+        Исключения:
+            FileNotFoundError: если файла нет
+        """
+        if meta is not None and self.is_not_modified(meta.etag, meta.mtime):
+            self.send_not_modified(meta.etag, meta.last_modified, headers)
+            return
+
+        with open(file_path, 'rb') as f:
+            if meta is not None:
+                size, mtime = meta.size, meta.mtime
+                last_modified, etag = meta.last_modified, meta.etag
+            else:
+                stat = os.fstat(f.fileno())
+                size, mtime = stat.st_size, stat.st_mtime
+                last_modified = formatdate(stat.st_mtime, usegmt=True)
+                etag = self.make_etag(stat)
+
+                if self.is_not_modified(etag, mtime):
+                    self.send_not_modified(etag, last_modified, headers)
+                    return
+
+            byte_range = self._requested_range(size, mtime, last_modified, etag)
+            body_range = self._send_range_headers(size, last_modified, etag, byte_range, content_type, headers)
+            if body_range is not None and self.command != 'HEAD' and size:
+                with profiling.phase('send'):
+                    self._send_file_body(f, *body_range)
+
+    def send_object(self, storage, key: str, stored, content_type: str = None, headers: dict = None) -> None:
+        """
+        Отправляет объект хранилища, у которого нет локального файла (S3Storage).
+
+        Заголовки, условные запросы и Range — как в send_file. Тело читается
+        из хранилища потоком (для Range — только нужный диапазон) и
+        отправляется блоками по FILE_CHUNK_SIZE.
+
+        Аргументы:
+            storage (Storage): хранилище
+            key (str): ключ объекта
+            stored: размер, mtime, last_modified и etag объекта (ImageMetadata)
+            content_type (str): MIME-тип
+            headers (dict): дополнительные заголовки ответа
+
+        Исключения:
+            FileNotFoundError: если объекта нет (до отправки заголовков)
+        """
+        if self.is_not_modified(stored.etag, stored.mtime):
+            self.send_not_modified(stored.etag, stored.last_modified, headers)
+            return
+
+        byte_range = self._requested_range(stored.size, stored.mtime, stored.last_modified, stored.etag)
+        if byte_range == 'unsatisfiable' or self.command == 'HEAD' or not stored.size:
+            self._send_range_headers(stored.size, stored.last_modified, stored.etag, byte_range, content_type, headers)
+            return
+
+        start, end = byte_range or (0, stored.size - 1)
+        # Объект открываем до заголовков: если его нет, обработчик ещё может ответить 404
+        with closing(storage.open(key, start, end - start + 1)) as body:
+            self._send_range_headers(stored.size, stored.last_modified, stored.etag, byte_range, content_type, headers)
+            with profiling.phase('send'):
+                while chunk := body.read(self.FILE_CHUNK_SIZE):
+                    self.wfile.write(chunk)
+
+    def send_accel_redirect(self, uri: str, content_type: str, headers: dict = None) -> None:
+        """
+        Поручает отдачу файла nginx: ответ без тела с заголовком X-Accel-Redirect.
+
+        nginx перенаправляет запрос во internal location uri и сам отдаёт
+        файл с диска (sendfile, Range, If-Modified-Since); Content-Type и
+        Cache-Control он берёт из этого ответа. nginx декодирует uri, поэтому
+        он кодируется здесь: в ключе могут быть не-ASCII символы, '#' и '?'.
+
+        Аргументы:
+            uri (str): адрес файла во internal location nginx
+            content_type (str): MIME-тип
+            headers (dict): дополнительные заголовки ответа
+        """
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
         if headers:
             for header, value in headers.items():
                 self.send_header(header, value)
+        self.send_header('X-Accel-Redirect', quote(uri))
+        self.send_header('Content-Length', '0')
         self.end_headers()
-        self.wfile.write(json.dumps(response).encode('utf-8'))
+
+    def _send_range_headers(self, size: int, last_modified: str, etag: str, byte_range,
+                            content_type: str = None, headers: dict = None) -> tuple[int, int] | None:
+        """
+        Отправляет статус и заголовки ответа с файлом: 200, 206 для Range
+        или 416 для недопустимого диапазона.
+
+        byte_range — результат _requested_range.
+
+        Возвращает:
+            (offset, count) — какие байты отправить, или None после 416
+        """
+        if byte_range == 'unsatisfiable':
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+
+        start, end = byte_range or (0, size - 1)
+        status = 206 if byte_range is not None else 200
+        self.send_response(status)
+        if content_type:
+            self.send_header('Content-type', content_type)
+        if headers:
+            for header, value in headers.items():
+                self.send_header(header, value)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', last_modified)
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        return start, end - start + 1
+
+    @staticmethod
+    def make_etag(stat: os.stat_result) -> str:
+        """Строгий ETag по времени изменения и размеру файла"""
+        return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+    def is_not_modified(self, etag: str, mtime: float = None) -> bool:
+        """
+        Проверяет условные заголовки If-None-Match и If-Modified-Since.
+
+        If-None-Match имеет приоритет: если он есть, If-Modified-Since
+        не проверяется (RFC 9110, раздел 13.2.2).
+
+        Возвращает:
+            bool: True, если у клиента актуальная копия и можно ответить 304
+        """
+        if self.command not in ('GET', 'HEAD'):
+            return False
+
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            if if_none_match.strip() == '*':
+                return True
+            # Для If-None-Match используется слабое сравнение — префикс W/ не важен
+            candidates = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+            return etag.removeprefix('W/') in candidates
+
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since and mtime is not None:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def send_not_modified(self, etag: str, last_modified: str = None, headers: dict = None) -> None:
+        """Отправляет 304 Not Modified с валидаторами и политикой кэширования"""
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        if last_modified:
+            self.send_header('Last-Modified', last_modified)
+        if headers:
+            for header, value in headers.items():
+                self.send_header(header, value)
+        self.end_headers()
+
+    def _requested_range(self, size: int, mtime: float, last_modified: str, etag: str):
+        """
+        Разбирает заголовок Range.
+
+        Возвращает:
+            None — отдать файл целиком,
+            (start, end) — отдать диапазон байт включительно,
+            'unsatisfiable' — диапазон за пределами файла (416).
+        """
+        range_header = self.headers.get('Range')
+        if not range_header or self.command not in ('GET', 'HEAD'):
+            return None
+
+        # If-Range: диапазон отдаём, только если файл не менялся
+        if_range = self.headers.get('If-Range')
+        if if_range and not if_range_matches(if_range, mtime, last_modified, etag):
+            return None
+
+        unit, _, spec = range_header.partition('=')
+        # Несколько диапазонов (multipart/byteranges) не поддерживаем — отдаём файл целиком
+        if unit.strip().lower() != 'bytes' or ',' in spec:
+            return None
+        first, _, last = spec.strip().partition('-')
+        try:
+            if first == '':
+                # bytes=-500: последние 500 байт
+                length = int(last)
+                if length <= 0:
+                    return 'unsatisfiable'
+                return max(0, size - length), size - 1
+            start = int(first)
+            end = int(last) if last else size - 1
+        except ValueError:
+            return None
+        if start >= size or start > end:
+            return 'unsatisfiable'
+        return start, min(end, size - 1)
+
+    def _send_file_body(self, f, offset: int, count: int) -> None:
+        """Отправляет count байт файла начиная с offset"""
+        self.wfile.flush()
+        try:
+            # socket.sendfile использует os.sendfile, а без него — обычный send
+            sent = self.connection.sendfile(f, offset, count)
+            self.wfile.written += sent
+            return
+        except (AttributeError, NotImplementedError, ValueError):
+            # Соединение не является обычным сокетом — отправляем блоками
+            pass
+        f.seek(offset)
+        remaining = count
+        while remaining > 0:
+            chunk = f.read(min(self.FILE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            self.wfile.write(chunk)
+            remaining -= len(chunk)
 
     def _handle_request(self, method: str) -> None:
         """
@@ -113,38 +607,54 @@ class AdvancedHTTPRequestHandler(BaseHTTPRequestHandler):
         
         Параметры:
         - method: HTTP-метод (GET, POST, PUT, PATCH, DELETE, HEAD)
+
+        Время обработки, код ответа и объём запроса и ответа учитываются
+        в метриках под шаблоном маршрута (см. app.utils.metrics), а при
+        включённом профилировании запрос трассируется (app.utils.profiling).
         """
+        trace = profiling.begin(method, self.path, self.headers)
+        started = time.perf_counter()
+        written = self.wfile.written
+        self._response_status = None
+        self._headers_sent = False
+        self._body_start = self.rfile.consumed
+        route = None
         try:
             # Разбираем URL
             parsed_url = urlparse(self.path)
             path = parsed_url.path
             
-            # Получаем обработчик для пути
-            handler, result = self.router.resolve(method, path)
+            # Ищем маршрут: сигнатура обработчика разобрана при регистрации,
+            # поэтому Route.call сам передаёт ему нужные параметры пути
+            match = self.router.match(method, path)
             
-            if isinstance(result, str):
-                # Если result - строка, значит это сообщение об ошибке
-                if result == '404 Not Found':
+            if match.route is None:
+                if match.allowed:
+                    self.handle_error(405, 'Method Not Allowed',
+                                      headers={'Allow': ', '.join(sorted(match.allowed))})
+                else:
                     self.handle_error(404, 'Not Found')
-                elif result == '405 Method Not Allowed':
-                    self.handle_error(405, 'Method Not Allowed')
                 return
             
-            if handler:
-                # Если это метод get_image, передаем только filename из URL
-                if method == 'GET' and handler.__name__ == 'get_image':
-                    filename = path.split('/')[-1]
-                    handler(self, filename=filename)
-                # Если это метод get_index или get_upload, не передаем никаких аргументов
-                elif handler.__name__ in ['get_index', 'get_upload']:
-                    handler(self)
-                else:
-                    # Для остальных методов передаем все параметры
-                    handler(self, **result)
-            else:
-                self.handle_error(404, 'Not Found')
+            route = match.route.path
+            match.route.call(self, match.params)
         except Exception as e:
             self.handle_error(500, f'Internal Server Error: {str(e)}')
+        finally:
+            duration = time.perf_counter() - started
+            status = self._response_status or 0
+            request_bytes = self.headers.get('Content-Length', '')
+            request_bytes = int(request_bytes) if request_bytes.isdigit() else 0
+            response_bytes = self.wfile.written - written
+            metrics.observe_request(method, route, status, duration, request_bytes, response_bytes)
+            AccessLog().record(method, self.path, self.request_version, route, status, duration,
+                               request_bytes, response_bytes, self.client_address[0], self.headers)
+            profiling.end(trace, route, status)
+            if self._response_status is None:
+                # Обработчик ничего не ответил — клиент не дождётся ответа на этом соединении
+                self.close_connection = True
+            if not self.close_connection:
+                self._drain_request_body()
 
     def do_GET(self):
         """Обработка GET запросов"""
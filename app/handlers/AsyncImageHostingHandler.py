@@ -0,0 +1,794 @@
+import asyncio
+import hashlib
+import json
+import os.path
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote, urlparse
+
+from aiohttp import web
+from loguru import logger
+from multidict import CIMultiDict
+
+from app.db.AsyncDBManager import AsyncDBManager
+from app.handlers.FileHandler import FileHandler, UploadedFile
+from app.jobs.tasks import thumbnail_payloads, unlink_payloads
+from app.media import ThumbnailService, VariantService
+from app.storage import BlobStore, UnlinkQueue, get_storage
+from app.utils import metrics
+from app.utils.bulk_delete import parse_delete_request
+from app.utils.compression import negotiate_encoding
+from app.utils.conditional import if_range_matches
+from app.utils.image_metadata import ImageMetadata, ImageMetadataCache
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.utils.static_assets import StaticAssetCache
+from config import settings
+
+
+class _RangeFileResponse(web.FileResponse):
+    """
+    FileResponse, который отдаёт диапазон, только если так решил обработчик.
+
+    aiohttp понимает в If-Range только дату: с несовпавшим ETag он всё равно
+    отвечает 206. Поэтому If-Range проверяет AsyncImageHostingHandler.byte_range,
+    а FileResponse получает запрос без If-Range и, если диапазон отдавать не
+    нужно, без Range.
+    """
+
+    def __init__(self, path: str, use_range: bool, **kwargs):
+        super().__init__(path, **kwargs)
+        self._use_range = use_range
+
+    async def prepare(self, request: web.BaseRequest):
+        dropped = ('if-range',) if self._use_range else ('if-range', 'range')
+        headers = CIMultiDict((name, value) for name, value in request.headers.items()
+                              if name.lower() not in dropped)
+        return await super().prepare(request.clone(headers=headers))
+
+
+"""
+Асинхронный обработчик запросов сервера хостинга изображений.
+
+Повторяет методы ImageHostingHandler, но работает поверх aiohttp:
+каждый метод — корутина, которая возвращает web.StreamResponse.
+Благодаря этому register_routes регистрирует одни и те же маршруты
+для обоих бэкендов, а медленные клиенты и простаивающие keep-alive
+соединения стоят корутину, а не поток.
+"""
+class AsyncImageHostingHandler:
+    server_version = 'Image Hosting Server/0.2'
+
+    # Размер блока при потоковой записи загружаемого файла
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, request: web.Request):
+        self.request = request
+        self.path = request.path_qs
+        self.headers = request.headers
+        self.db = AsyncDBManager()
+        self.storage = get_storage()
+
+    async def handle_error(self, status_code: int, message: str) -> web.Response:
+        logger.error(f'Error {status_code}: {message}')
+        accept = self.headers.get('Accept', '')
+
+        # Отправляем HTML для Браузера
+        if 'text/html' in accept:
+            asset = StaticAssetCache().get('error.html')
+            if asset is not None:
+                content = asset.body.decode('utf-8')
+                for key, value in {'status_code': status_code, 'message': message}.items():
+                    content = content.replace(f'{{{{ {key} }}}}', str(value))
+                return web.Response(text=content, status=status_code, content_type='text/html')
+        # Отправляем JSON для Postman
+        return self.send_json({'error': message}, code=status_code)
+
+    @staticmethod
+    def send_json(response: dict, code: int = 200, headers: dict = None) -> web.Response:
+        return web.Response(
+            text=json.dumps(response),
+            status=code,
+            content_type='application/json',
+            headers=headers
+        )
+
+    async def redirect_to(self, path):
+        """
+        Выполняет перенаправление клиента на указанный путь.
+
+        Args:
+            path: Путь, на который нужно перенаправить клиента
+        """
+        return web.Response(status=302, headers={'Location': path})
+
+    def is_not_modified(self, etag: str, mtime: float = None) -> bool:
+        """
+        Проверяет If-None-Match и If-Modified-Since,
+        см. AdvancedHTTPRequestHandler.is_not_modified.
+        """
+        if self.request.method not in ('GET', 'HEAD'):
+            return False
+
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            if if_none_match.strip() == '*':
+                return True
+            candidates = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+            return etag.removeprefix('W/') in candidates
+
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since and mtime is not None:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def byte_range(self, size: int, mtime: float, last_modified: str, etag: str):
+        """
+        Разбирает Range с учётом If-Range, см. AdvancedHTTPRequestHandler._requested_range.
+
+        Возвращает:
+            None — отдать файл целиком,
+            (start, stop) — отдать байты start..stop-1,
+            'unsatisfiable' — диапазон за пределами файла (416).
+        """
+        if self.request.method not in ('GET', 'HEAD') or 'Range' not in self.headers:
+            return None
+        if_range = self.headers.get('If-Range')
+        if if_range and not if_range_matches(if_range, mtime, last_modified, etag):
+            return None
+        try:
+            byte_range = self.request.http_range
+        except ValueError:
+            # Несколько диапазонов или ошибка в заголовке — отдаём файл целиком
+            return None
+        if byte_range.start is None and byte_range.stop is None:
+            return None
+        start, stop = 0, size
+        if byte_range.start is not None and byte_range.start < 0:
+            # bytes=-500: последние 500 байт
+            start = max(0, size + byte_range.start)
+        else:
+            start = byte_range.start or 0
+            stop = min(size, byte_range.stop if byte_range.stop is not None else size)
+        if start >= stop:
+            return 'unsatisfiable'
+        return start, stop
+
+    @staticmethod
+    def range_not_satisfiable(size: int) -> web.Response:
+        # Без Cache-Control ответа на файл: ошибку кэшировать нельзя (DEFAULT_CACHE_CONTROL)
+        return web.Response(status=416, headers={'Content-Range': f'bytes */{size}'})
+
+    def file_response(self, path: str, headers: dict) -> web.StreamResponse:
+        """
+        FileResponse (sendfile) с Range и If-Range по тем же правилам, что и
+        у синхронного бэкенда (см. _RangeFileResponse).
+        """
+        if 'Range' not in self.headers:
+            return web.FileResponse(path, headers=headers)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return web.FileResponse(path, headers=headers)
+        # ETag в том же формате, что у FileResponse и AdvancedHTTPRequestHandler.make_etag
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        byte_range = self.byte_range(stat.st_size, stat.st_mtime, formatdate(stat.st_mtime, usegmt=True), etag)
+        if byte_range == 'unsatisfiable':
+            return self.range_not_satisfiable(stat.st_size)
+        return _RangeFileResponse(path, use_range=byte_range is not None, headers=headers)
+
+    async def serve_static_file(self, path: str, content_type: str = None):
+        """
+        Отправляет статические файлы клиенту.
+
+        Args:
+            path: Путь к файлу в папке static/
+            content_type: Тип контента (MIME-тип) файла
+
+        Файлы берутся из кэша в памяти (StaticAssetCache) вместе с
+        заранее сжатыми вариантами, поэтому диск не затрагивается.
+        """
+        asset = StaticAssetCache().get(path.lstrip('/'))
+        if asset is None:
+            return await self.handle_error(404, f'File not found: {path}')
+
+        encoding = negotiate_encoding(self.headers.get('Accept-Encoding'), asset.encodings)
+        etag = asset.etag_for(encoding)
+        headers = {
+            'Cache-Control': settings.FAVICON_CACHE_CONTROL if path.endswith('.ico') else settings.STATIC_CACHE_CONTROL,
+            'ETag': etag,
+            'Last-Modified': asset.last_modified,
+        }
+        if asset.encodings:
+            headers['Vary'] = 'Accept-Encoding'
+
+        if self.is_not_modified(etag, asset.mtime):
+            return web.Response(status=304, headers=headers)
+
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        headers['Content-Type'] = content_type or asset.content_type
+        body = asset.encodings[encoding] if encoding else asset.body
+        return web.Response(body=body if self.request.method != 'HEAD' else None, headers=headers)
+
+    async def get_index(self):
+        """Возвращает основную HTML-страницу с интерфейсом приложения."""
+        return await self.serve_static_file('index.html', 'text/html')
+
+    async def get_upload(self):
+        """Возвращает HTML-страницу с формой для загрузки изображений."""
+        return await self.serve_static_file('upload.html', 'text/html')
+
+    async def get_images(self):
+        """
+        Возвращает список загруженных картинок в формате JSON с поддержкой пагинации.
+
+        Параметры и формат ответа совпадают с ImageHostingHandler.get_images.
+        """
+        try:
+            query = self.request.query
+            page = int(query.get('page', 1))
+            per_page = int(query.get('per_page', 10))
+
+            if page < 1:
+                page = 1
+            if per_page < 1:
+                per_page = 10
+            elif per_page > 50:
+                per_page = 50
+
+            after = None
+            if query.get('cursor'):
+                try:
+                    after = decode_cursor(query['cursor'])
+                except ValueError:
+                    return await self.handle_error(400, 'Invalid cursor')
+
+            images = await self.db.get_images(page, per_page + 1, after=after)
+            has_more = len(images) > per_page
+            images = images[:per_page]
+
+            images_list = [{
+                'id': img[0],
+                'filename': img[1],
+                'original_name': img[2],
+                'size': img[3],
+                'file_type': img[4],
+                'upload_time': img[5].isoformat() if hasattr(img[5], 'isoformat') else str(img[5])
+            } for img in images]
+
+            response_data = {"images": images_list}
+            if after is None:
+                response_data["total"] = await self.db.count_images()
+                response_data["page"] = page
+            response_data["per_page"] = per_page
+            response_data["next_cursor"] = encode_cursor(images[-1][5], images[-1][0]) if has_more else None
+
+            return self.send_json(response_data, headers={'Cache-Control': 'no-cache'})
+        except Exception as e:
+            return await self.handle_error(500, f'Error listing images: {str(e)}')
+
+    async def get_db_pool_stats(self):
+        """Возвращает статистику пула соединений с БД в формате JSON."""
+        return self.send_json(self.db.pool_stats(), headers={'Cache-Control': 'no-cache'})
+
+    async def get_metrics(self):
+        """Отдаёт метрики всех воркеров в текстовом формате Prometheus"""
+        if not metrics.enabled():
+            return await self.handle_error(404, 'Metrics are disabled')
+        body, content_type = await asyncio.to_thread(metrics.render)
+        # Content-Type задаём заголовком целиком: в CONTENT_TYPE_LATEST уже есть version и charset
+        return web.Response(body=body, headers={'Content-Type': content_type})
+
+    async def get_image(self, filename=None):
+        """
+        Отдает картинку по её имени.
+
+        Args:
+            filename: Имя файла картинки (опционально, может быть получено из URL)
+        """
+        try:
+            if filename is None:
+                filename = urlparse(self.path).path.split('/')[-1]
+
+            # /images/<filename>?w=320 — то же, что /thumbs/320/<filename>
+            if 'w' in self.request.query:
+                return await self.get_thumbnail(self.request.query['w'], filename)
+
+            meta = await self.get_image_metadata(filename)
+            if meta is None:
+                return await self.handle_error(404, 'Image not found')
+
+            if not meta.mime_type.startswith('image/'):
+                return await self.handle_error(400, 'Invalid file type')
+
+            try:
+                return await self.send_negotiated_image(meta)
+            except FileNotFoundError:
+                ImageMetadataCache().evict(meta.filename)
+                return await self.handle_error(404, 'Image not found')
+        except Exception as e:
+            return await self.handle_error(500, f'Error serving image: {str(e)}')
+
+    async def send_negotiated_image(self, meta: ImageMetadata) -> web.StreamResponse:
+        """Копия в WebP/AVIF или оригинал, см. ImageHostingHandler.send_negotiated_image"""
+        service = VariantService()
+        if not service.applies_to(meta.mime_type):
+            return await self.send_image(meta)
+
+        headers = {'Cache-Control': settings.IMAGE_CACHE_CONTROL, 'Vary': 'Accept'}
+        image_format = service.negotiate(self.headers.get('Accept'))
+        if image_format is not None:
+            variant, pending = service.lookup(meta.filename, image_format, meta.size, source=meta.key)
+            if variant is not None:
+                headers['Content-Type'] = service.CONTENT_TYPES[image_format]
+                if settings.ACCEL_REDIRECT_ENABLED:
+                    headers['X-Accel-Redirect'] = quote(settings.ACCEL_REDIRECT_VARIANTS_PREFIX +
+                                                        service.relative_path(meta.filename, image_format))
+                    return web.Response(headers=headers)
+                return self.file_response(variant, headers)
+            if pending:
+                headers['Cache-Control'] = settings.VARIANT_PENDING_CACHE_CONTROL
+        return await self.send_image(meta, headers)
+
+    async def send_image(self, meta: ImageMetadata, headers: dict = None) -> web.StreamResponse:
+        """
+        Отдаёт оригинал: локальный файл — через nginx (ACCEL_REDIRECT_ENABLED,
+        см. AdvancedHTTPRequestHandler.send_accel_redirect) или FileResponse
+        (sendfile), из удалённого хранилища — потоком, с поддержкой Range и
+        условных заголовков (If-None-Match, If-Modified-Since).
+        """
+        headers = {
+            'Content-Type': meta.mime_type,
+            'Cache-Control': settings.IMAGE_CACHE_CONTROL,
+            **(headers or {})
+        }
+        if meta.path is not None and settings.ACCEL_REDIRECT_ENABLED:
+            headers['X-Accel-Redirect'] = quote(settings.ACCEL_REDIRECT_PREFIX + meta.key)
+            return web.Response(headers=headers)
+        if meta.path is not None:
+            return self.file_response(meta.path, headers)
+
+        headers.update({'ETag': meta.etag, 'Last-Modified': meta.last_modified, 'Accept-Ranges': 'bytes'})
+        if self.is_not_modified(meta.etag, meta.mtime):
+            return web.Response(status=304, headers=headers)
+
+        start, stop, status = 0, meta.size, 200
+        byte_range = self.byte_range(meta.size, meta.mtime, meta.last_modified, meta.etag)
+        if byte_range == 'unsatisfiable':
+            return self.range_not_satisfiable(meta.size)
+        if byte_range is not None:
+            start, stop = byte_range
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{stop - 1}/{meta.size}'
+        headers['Content-Length'] = str(stop - start)
+        if self.request.method == 'HEAD' or start == stop:
+            return web.Response(status=status, headers=headers)
+
+        # Объект открываем до ответа: если его нет, ещё можно ответить 404
+        body = await asyncio.to_thread(self.storage.open, meta.key, start, stop - start)
+
+        async def stream():
+            try:
+                while chunk := await asyncio.to_thread(body.read, self.CHUNK_SIZE):
+                    yield chunk
+            finally:
+                body.close()
+
+        return web.Response(body=stream(), status=status, headers=headers)
+
+    async def get_image_metadata(self, filename: str) -> ImageMetadata | None:
+        """Сведения о файле изображения, см. ImageHostingHandler.get_image_metadata"""
+        filename = os.path.basename(filename)
+        cache = ImageMetadataCache()
+        meta = cache.get(filename)
+        if meta is not None:
+            if cache.is_fresh(meta):
+                return meta
+            if await self.db.get_image_file(filename) is None:
+                cache.evict(filename)
+                return None
+            cache.touch(meta)
+            return meta
+
+        mime_type, blob_hash = await self.db.get_image_file(filename) or (None, None)
+
+        keys = [BlobStore.key_for(blob_hash)] if blob_hash else []
+        keys.append(filename)
+        for key in keys:
+            stored = await asyncio.to_thread(self.storage.stat, key)
+            if stored is not None:
+                break
+        else:
+            return None
+
+        if mime_type is None:
+            head = await asyncio.to_thread(self.storage.read, key, 0, FileHandler.MAGIC_HEADER_SIZE)
+            mime_type = await asyncio.to_thread(FileHandler.detect_mime, head)
+            await self.db.set_mime_type(filename, mime_type)
+
+        meta = ImageMetadata(filename, stored, mime_type, blob_hash)
+        cache.put(meta)
+        return meta
+
+    async def get_thumbnail(self, size, filename):
+        """
+        Отдает уменьшенную копию картинки шириной size пикселей.
+
+        Поведение совпадает с ImageHostingHandler.get_thumbnail: пока копия
+        создаётся в пуле процессов, корутина ждёт её, не занимая цикл событий.
+        """
+        try:
+            try:
+                width = int(size)
+            except (TypeError, ValueError):
+                width = 0
+            width = ThumbnailService.snap_width(width)
+            if width is None:
+                return await self.handle_error(400, f'Unsupported thumbnail size: {size}')
+
+            meta = await self.get_image_metadata(filename)
+            if meta is None:
+                return await self.handle_error(404, 'Image not found')
+
+            if not meta.mime_type.startswith('image/'):
+                return await self.handle_error(400, 'Invalid file type')
+
+            try:
+                future = ThumbnailService().submit(filename, width, source=meta.key)
+                thumb_path = await asyncio.wait_for(asyncio.wrap_future(future), settings.THUMBNAIL_TIMEOUT)
+            except Exception as e:
+                logger.error(f'Thumbnail {width}px for {filename} is not available, serving original: {e}')
+                return await self.send_image(meta)
+
+            return self.file_response(thumb_path, {
+                'Content-Type': meta.mime_type,
+                'Cache-Control': settings.IMAGE_CACHE_CONTROL
+            })
+        except Exception as e:
+            return await self.handle_error(500, f'Error serving thumbnail: {str(e)}')
+
+    async def post_upload(self):
+        """
+        Обрабатывает POST запрос для загрузки изображения.
+
+        Тело запроса читается по частям: файл пишется на диск блоками
+        по CHUNK_SIZE, поэтому в памяти не держится целиком. Тело больше
+        UPLOAD_MAX_BODY_SIZE (по Content-Length) отклоняется до чтения (413).
+        """
+        tmp_path = None
+        try:
+            # Тело не читаем, если по Content-Length уже видно, что оно слишком большое
+            if (self.request.content_length or 0) > settings.UPLOAD_MAX_BODY_SIZE:
+                return await self.handle_error(413, 'Request body is too large')
+
+            if not self.headers.get('Content-Type', '').startswith('multipart/form-data'):
+                return await self.handle_error(400, 'No image file found in request')
+
+            reader = await self.request.multipart()
+            while True:
+                part = await reader.next()
+                if part is None:
+                    return await self.handle_error(400, 'No image file found in request')
+                if part.name == 'file' and part.filename:
+                    break
+
+            original_name = part.filename
+            upload_id = uuid.uuid4()
+            tmp_path = os.path.join(self.storage.spool_dir, f'.upload-{upload_id}')
+
+            file_size = 0
+            head = b''
+            hasher = hashlib.new(BlobStore.HASH_ALGORITHM) if settings.STORAGE_MODE == 'cas' else None
+            with open(tmp_path, 'wb') as f:
+                while True:
+                    chunk = await part.read_chunk(self.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    file_size += len(chunk)
+                    if file_size > settings.ALLOWED_LENGTH:
+                        return await self.handle_error(413, 'File is too large')
+                    if len(head) < FileHandler.MAGIC_HEADER_SIZE:
+                        head += chunk[:FileHandler.MAGIC_HEADER_SIZE - len(head)]
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+
+            metrics.observe_upload('single', file_size)
+
+            # Проверяем тип файла
+            mime_type = await asyncio.to_thread(FileHandler.detect_mime, head)
+            if mime_type not in settings.ALLOWED_MIME_TYPES:
+                return await self.handle_error(400, 'Invalid file type')
+            file_ext = settings.MIME_EXTENSIONS[mime_type]
+            filename = f"{upload_id}.{file_ext}"
+
+            blob_hash = hasher.hexdigest() if hasher is not None else None
+            if blob_hash is not None:
+                key = BlobStore.key_for(blob_hash)
+            else:
+                key = filename
+                await asyncio.to_thread(self.storage.put_file, key, tmp_path, mime_type)
+
+            try:
+                await self.db.add_image(
+                    filename=filename,
+                    original_name=original_name,
+                    length=file_size,
+                    ext=file_ext,
+                    mime_type=mime_type,
+                    blob_hash=blob_hash
+                )
+            except Exception:
+                if blob_hash is None:
+                    await asyncio.to_thread(self.storage.delete, key)
+                raise
+
+            if blob_hash is not None:
+                # Файл кладём только после коммита, см. DBManager._release_blob
+                try:
+                    await asyncio.to_thread(BlobStore().put, tmp_path, blob_hash, mime_type)
+                except Exception:
+                    await self.db.delete_image(filename, release_blob=BlobStore().unlink)
+                    raise
+            await self.cache_metadata(filename, key, mime_type, blob_hash)
+            await self.generate_thumbnails([(filename, key)])
+
+            return self.send_json({
+                'success': True,
+                'filename': filename,
+                'original_name': original_name,
+                'size': file_size,
+                'file_type': mime_type
+            })
+        except Exception as e:
+            logger.error(f'Error uploading file: {str(e)}')
+            return await self.handle_error(500, str(e))
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                await asyncio.to_thread(os.remove, tmp_path)
+
+    async def post_upload_batch(self):
+        """
+        Обрабатывает POST запрос для пакетной загрузки изображений.
+
+        Формат запроса и ответа — как у ImageHostingHandler.post_upload_batch.
+        Файлы читаются по частям в UploadedFile, типы проверяются в пуле
+        FileHandler.validate_files, записи добавляются одной транзакцией (COPY).
+        """
+        uploads = []
+        try:
+            if not self.headers.get('Content-Type', '').startswith('multipart/form-data'):
+                return await self.handle_error(400, 'No image files found in request')
+            if (self.request.content_length or 0) > settings.UPLOAD_BATCH_MAX_BODY_SIZE:
+                return await self.handle_error(413, 'Request body is too large')
+
+            reader = await self.request.multipart()
+            while True:
+                part = await reader.next()
+                if part is None:
+                    break
+                if not part.filename:
+                    continue
+                if len(uploads) >= settings.UPLOAD_BATCH_MAX_FILES:
+                    return await self.handle_error(413, f'Too many files in request (max {settings.UPLOAD_BATCH_MAX_FILES})')
+
+                tmp_path = os.path.join(self.storage.spool_dir, f'.upload-{uuid.uuid4().hex}')
+                hasher = hashlib.new(BlobStore.HASH_ALGORITHM) if settings.STORAGE_MODE == 'cas' else None
+                upload = UploadedFile(part.name, part.filename, tmp_path, hasher)
+                uploads.append(upload)
+                with open(tmp_path, 'wb') as f:
+                    while True:
+                        chunk = await part.read_chunk(self.CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        upload.size += len(chunk)
+                        if upload.error is not None:
+                            continue
+                        if upload.size > settings.ALLOWED_LENGTH:
+                            # Остальные файлы пакета принимаем, этот — дочитываем без записи
+                            upload.error = f'File is too large (max {settings.ALLOWED_LENGTH} bytes)'
+                            continue
+                        if len(upload.head) < FileHandler.MAGIC_HEADER_SIZE:
+                            upload.head += chunk[:FileHandler.MAGIC_HEADER_SIZE - len(upload.head)]
+                        if hasher is not None:
+                            hasher.update(chunk)
+                        await asyncio.to_thread(f.write, chunk)
+
+            if not uploads:
+                return await self.handle_error(400, 'No image files found in request')
+            for upload in uploads:
+                if upload.error is None:
+                    metrics.observe_upload('batch', upload.size)
+
+            mime_types = await asyncio.to_thread(FileHandler.validate_files, uploads)
+
+            results = []
+            accepted = []  # (upload, result, строка для add_images, ключ файла в хранилище)
+            for upload, mime_type in zip(uploads, mime_types):
+                result = {'original_name': upload.filename}
+                results.append(result)
+                if upload.error is not None or mime_type is None:
+                    result.update(success=False, error=upload.error or 'Invalid file type')
+                    continue
+                file_ext = settings.MIME_EXTENSIONS[mime_type]
+                filename = f"{uuid.uuid4()}.{file_ext}"
+                blob_hash = upload.digest
+                key = BlobStore.key_for(blob_hash) if blob_hash is not None else filename
+                row = (filename, upload.filename, upload.size, file_ext, mime_type, blob_hash)
+                accepted.append((upload, result, row, key))
+
+            moved = []
+            try:
+                for upload, _, row, key in accepted:
+                    if row[5] is None:
+                        await asyncio.to_thread(self.storage.put_file, key, upload.path, row[4])
+                        moved.append(key)
+                await self.db.add_images([row for _, _, row, _ in accepted])
+            except Exception:
+                for key in moved:
+                    await asyncio.to_thread(self.storage.delete, key)
+                raise
+
+            stored = []
+            for upload, result, (filename, _, size, _, mime_type, blob_hash), key in accepted:
+                if blob_hash is not None:
+                    # Файл кладём только после коммита, см. DBManager._release_blob
+                    try:
+                        await asyncio.to_thread(BlobStore().put, upload.path, blob_hash, mime_type)
+                    except Exception as e:
+                        logger.error(f'Cannot store blob {blob_hash}: {e}')
+                        await self.db.delete_image(filename, release_blob=BlobStore().unlink)
+                        result.update(success=False, error='Cannot store file')
+                        continue
+                await self.cache_metadata(filename, key, mime_type, blob_hash)
+                result.update(success=True, filename=filename, size=size, file_type=mime_type)
+                stored.append((filename, key))
+            await self.generate_thumbnails(stored)
+
+            uploaded = len(stored)
+            return self.send_json({
+                'success': uploaded > 0,
+                'uploaded': uploaded,
+                'failed': len(results) - uploaded,
+                'results': results
+            })
+        except Exception as e:
+            logger.error(f'Error uploading files: {str(e)}')
+            return await self.handle_error(500, str(e))
+        finally:
+            for upload in uploads:
+                await asyncio.to_thread(upload.discard)
+
+    async def delete_image(self, filename):
+        """
+        Удаляет изображение по его имени.
+
+        Args:
+            filename: Имя файла изображения
+        """
+        try:
+            meta = await self.get_image_metadata(filename)
+            if meta is None:
+                return await self.handle_error(404, 'Image not found')
+            ImageMetadataCache().evict(filename)
+
+            if settings.JOBS_ENABLED:
+                await self.delete_images_deferred(filenames=[filename])
+            else:
+                await self.db.delete_image(filename, release_blob=BlobStore().unlink)
+                if meta.blob_hash is None:
+                    await asyncio.to_thread(self.storage.delete, meta.key)
+                await asyncio.to_thread(ThumbnailService().delete, filename)
+                await asyncio.to_thread(VariantService().delete, filename)
+
+            return self.send_json({
+                'success': True,
+                'message': 'Image deleted successfully'
+            })
+        except Exception as e:
+            return await self.handle_error(500, f'Error deleting image: {str(e)}')
+
+    async def delete_image_by_id(self, id=None):
+        """
+        Удаляет изображение по его ID и перенаправляет на страницу со списком.
+
+        Args:
+            id: Идентификатор изображения в базе данных
+        """
+        try:
+            try:
+                image_id = int(id)
+            except (TypeError, ValueError):
+                return await self.handle_error(400, 'Image ID is required')
+
+            filename = await self.db.get_filename_by_id(image_id)
+            if not filename:
+                return await self.handle_error(404, f'Image with ID {id} not found')
+
+            meta = await self.get_image_metadata(filename)
+            ImageMetadataCache().evict(filename)
+
+            if settings.JOBS_ENABLED:
+                await self.delete_images_deferred(filenames=[filename])
+            else:
+                await self.db.delete_image_by_id(image_id, release_blob=BlobStore().unlink)
+                if meta is not None and meta.blob_hash is None:
+                    await asyncio.to_thread(self.storage.delete, meta.key)
+                await asyncio.to_thread(ThumbnailService().delete, filename)
+                await asyncio.to_thread(VariantService().delete, filename)
+            return await self.redirect_to('/all_images.html')
+        except Exception as e:
+            logger.error(f'Error deleting image by ID: {str(e)}')
+            return await self.handle_error(500, f'Error deleting image: {str(e)}')
+
+    async def post_delete_batch(self):
+        """
+        Обрабатывает POST запрос для пакетного удаления изображений.
+
+        Формат запроса и ответа — как у ImageHostingHandler.post_delete_batch.
+        """
+        try:
+            if (self.request.content_length or 0) > settings.DELETE_BATCH_MAX_BODY_SIZE:
+                return await self.handle_error(413, 'Request body is too large')
+            try:
+                ids, filenames = parse_delete_request(await self.request.read())
+            except ValueError as e:
+                return await self.handle_error(400, str(e))
+
+            deleted = await self.delete_images_deferred(ids, filenames)
+
+            deleted_ids = {image_id for image_id, _, _ in deleted}
+            deleted_filenames = {filename for _, filename, _ in deleted}
+            return self.send_json({
+                'success': True,
+                'deleted': len(deleted),
+                'not_found': {
+                    'ids': [i for i in ids if i not in deleted_ids],
+                    'filenames': [f for f in filenames if f not in deleted_filenames]
+                }
+            })
+        except Exception as e:
+            logger.error(f'Error deleting images: {str(e)}')
+            return await self.handle_error(500, f'Error deleting images: {str(e)}')
+
+    async def cache_metadata(self, filename: str, key: str, mime_type: str, blob_hash: str = None) -> None:
+        """Кладёт в ImageMetadataCache сведения о только что сохранённом файле"""
+        stored = await asyncio.to_thread(self.storage.stat, key)
+        if stored is not None:
+            ImageMetadataCache().put(ImageMetadata(filename, stored, mime_type, blob_hash))
+
+    async def generate_thumbnails(self, images: list[tuple]) -> None:
+        """Запускает создание миниатюр, см. ImageHostingHandler.generate_thumbnails"""
+        if settings.JOBS_ENABLED:
+            await self.db.enqueue_jobs('thumbnails.generate', thumbnail_payloads(images))
+            return
+        for filename, source in images:
+            ThumbnailService().generate_defaults(filename, source=source)
+
+    async def delete_images_deferred(self, ids: list[int] = (), filenames: list[str] = ()) -> list[tuple]:
+        """
+        Удаляет записи одним запросом, а файлы — после ответа,
+        см. ImageHostingHandler.delete_images_deferred.
+        """
+        if settings.JOBS_ENABLED:
+            async def enqueue_unlink(conn, rows):
+                await self.db.enqueue_jobs('files.unlink', unlink_payloads(rows), conn=conn)
+
+            deleted = await self.db.delete_images(ids, filenames, on_deleted=enqueue_unlink)
+        else:
+            deleted = await self.db.delete_images(ids, filenames)
+            loop = asyncio.get_running_loop()
+
+            def purge_blobs(hashes, release_blob=None):
+                # Вызывается из потока UnlinkQueue: запрос к asyncpg выполняем в event loop
+                return asyncio.run_coroutine_threadsafe(
+                    self.db.purge_blobs(hashes, release_blob=release_blob), loop
+                ).result()
+
+            UnlinkQueue().submit(deleted, purge_blobs=purge_blobs)
+        for _, filename, _ in deleted:
+            ImageMetadataCache().evict(filename)
+        return deleted
@@ -1,80 +1,364 @@
-import email
-from email.parser import BytesParser
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import BytesHeaderParser
 from email.policy import default
 import magic
 from loguru import logger
-from app.db import DBManager
+from app.storage import get_storage
+from app.utils import metrics, profiling
 from config import settings
 
+
+# magic.Magic для каждого потока, см. FileHandler._magic
+_magic_local = threading.local()
+
+# (pid, ThreadPoolExecutor) для FileHandler.validate_files
+_validation_pool = None
+_validation_pool_lock = threading.Lock()
+
+
+class UploadTooLarge(Exception):
+    """Тело запроса или загружаемый файл превышают допустимый размер (413)"""
+
+
+class MultipartError(Exception):
+    """Некорректное тело multipart/form-data (400)"""
+
+
+class UploadedFile:
+    """
+    Файл из multipart/form-data, уже записанный во временный файл на диске.
+
+    Атрибуты:
+        field (str): имя поля формы
+        filename (str): оригинальное имя файла
+        path (str): путь к временному файлу
+        size (int): размер файла в байтах
+        head (bytes): первые байты файла для определения типа через libmagic
+        hasher: объект hashlib, если парсер считает хэш содержимого, иначе None
+        error (str | None): почему файл не принят (например, слишком большой),
+            если парсер не прерывает разбор из-за одного файла
+    """
+
+    def __init__(self, field: str, filename: str, path: str, hasher=None):
+        self.field = field
+        self.filename = filename
+        self.path = path
+        self.size = 0
+        self.head = b''
+        self.hasher = hasher
+        self.error = None
+
+    @property
+    def digest(self) -> str | None:
+        """Хэш содержимого в hex, посчитанный во время записи файла"""
+        return self.hasher.hexdigest() if self.hasher is not None else None
+
+    def discard(self) -> None:
+        """Удаляет временный файл, если он ещё есть"""
+        if self.path is None:
+            return
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self.path = None
+
+
+class MultipartStreamParser:
+    """
+    Потоковый парсер multipart/form-data.
+
+    Читает тело запроса блоками по chunk_size байт и ищет разделители
+    частей, в том числе разорванные между блоками. Файлы сразу пишутся
+    во временные файлы в upload_dir, поэтому память на загрузку —
+    O(chunk_size), а не O(размер тела).
+
+    Аргументы:
+        boundary (bytes): разделитель частей из заголовка Content-Type
+        upload_dir (str): директория для временных файлов
+        max_file_size (int): максимальный размер одного файла
+        chunk_size (int): размер блока чтения
+        hash_algorithm (str): если задан (например, 'sha256'), хэш каждого
+            файла считается по ходу записи — повторно читать файл не нужно
+        max_files (int): максимальное количество файлов в запросе
+        fail_on_oversize (bool): True — слишком большой файл прерывает разбор
+            (UploadTooLarge), False — файл пропускается с UploadedFile.error,
+            а остальные файлы разбираются дальше (пакетная загрузка)
+    """
+
+    # Ограничения на заголовки части и на значения обычных полей формы
+    MAX_HEADERS_SIZE = 16 * 1024
+    MAX_FIELD_SIZE = 64 * 1024
+
+    def __init__(self, boundary: bytes, upload_dir: str,
+                 max_file_size: int = settings.ALLOWED_LENGTH,
+                 chunk_size: int = settings.UPLOAD_CHUNK_SIZE,
+                 hash_algorithm: str = None,
+                 max_files: int = None,
+                 fail_on_oversize: bool = True):
+        self.delimiter = b'--' + boundary
+        self.upload_dir = upload_dir
+        self.max_file_size = max_file_size
+        self.chunk_size = chunk_size
+        self.hash_algorithm = hash_algorithm
+        self.max_files = max_files
+        self.fail_on_oversize = fail_on_oversize
+        self._stream = None
+        self._remaining = 0
+        self._buffer = bytearray()
+
+    def _fill(self) -> None:
+        """Дочитывает следующий блок тела запроса в буфер"""
+        if self._remaining <= 0:
+            raise MultipartError('Unexpected end of multipart body')
+        with profiling.phase('read'):
+            chunk = self._stream.read(min(self.chunk_size, self._remaining))
+        if not chunk:
+            raise MultipartError('Connection closed before the end of multipart body')
+        self._remaining -= len(chunk)
+        self._buffer += chunk
+
+    def _read_until(self, separator: bytes, sink, limit: int = None) -> None:
+        """
+        Передаёт в sink данные до separator и убирает separator из буфера.
+
+        В буфере всегда остаётся хвост длиной len(separator) - 1, чтобы
+        не пропустить разделитель, который пришёл в двух блоках.
+        """
+        keep = len(separator) - 1
+        consumed = 0
+        while True:
+            index = self._buffer.find(separator)
+            if index != -1:
+                sink(bytes(self._buffer[:index]))
+                del self._buffer[:index + len(separator)]
+                return
+            if len(self._buffer) > keep:
+                data = bytes(self._buffer[:-keep]) if keep else bytes(self._buffer)
+                consumed += len(data)
+                if limit is not None and consumed > limit:
+                    raise MultipartError('Multipart part headers are too large')
+                sink(data)
+                del self._buffer[:len(data)]
+            self._fill()
+
+    def _ensure(self, size: int) -> None:
+        while len(self._buffer) < size:
+            self._fill()
+
+    def parse(self, stream, content_length: int) -> tuple[dict, list[UploadedFile]]:
+        """
+        Разбирает тело запроса.
+
+        Аргументы:
+            stream: файловый объект с телом запроса (например, rfile)
+            content_length (int): значение заголовка Content-Length
+
+        Возвращает:
+            tuple[dict, list[UploadedFile]]: обычные поля формы и загруженные файлы
+
+        Исключения:
+            UploadTooLarge: если файл или поле превышают допустимый размер
+            MultipartError: если тело запроса некорректно
+        """
+        self._stream = stream
+        self._remaining = content_length
+        self._buffer = bytearray()
+        fields = {}
+        files = []
+
+        try:
+            # Пропускаем преамбулу до первого разделителя
+            self._read_until(self.delimiter, lambda data: None, limit=self.MAX_HEADERS_SIZE)
+
+            while True:
+                self._ensure(2)
+                marker = bytes(self._buffer[:2])
+                del self._buffer[:2]
+                if marker == b'--':
+                    break
+                if marker != b'\r\n':
+                    raise MultipartError('Malformed multipart delimiter')
+
+                raw_headers = bytearray()
+                self._read_until(b'\r\n\r\n', raw_headers.extend, limit=self.MAX_HEADERS_SIZE)
+                name, filename = self._parse_disposition(bytes(raw_headers))
+
+                if filename is not None:
+                    if self.max_files is not None and len(files) >= self.max_files:
+                        raise UploadTooLarge(f'Too many files in request (max {self.max_files})')
+                    upload = self._open_upload(name, filename)
+                    files.append(upload)
+                    with open(upload.path, 'wb') as f:
+                        self._read_until(b'\r\n' + self.delimiter, self._file_sink(upload, f))
+                else:
+                    value = bytearray()
+                    self._read_until(b'\r\n' + self.delimiter, self._field_sink(value))
+                    if name is not None:
+                        fields[name] = value.decode('utf-8', errors='replace')
+
+            # Эпилог после закрывающего разделителя нам не нужен
+            while self._remaining > 0:
+                self._buffer.clear()
+                self._fill()
+        except BaseException:
+            for upload in files:
+                upload.discard()
+            raise
+
+        return fields, files
+
+    def _open_upload(self, name: str, filename: str) -> UploadedFile:
+        fd, path = tempfile.mkstemp(dir=self.upload_dir, prefix='.upload-')
+        # mkstemp создаёт файл с правами 0600, а картинки читает и nginx
+        os.fchmod(fd, 0o644)
+        os.close(fd)
+        hasher = hashlib.new(self.hash_algorithm) if self.hash_algorithm else None
+        return UploadedFile(name, filename, path, hasher)
+
+    def _file_sink(self, upload: UploadedFile, f):
+        def sink(data: bytes) -> None:
+            upload.size += len(data)
+            if upload.error is not None:
+                # Файл уже отклонён — дочитываем часть, ничего не записывая
+                return
+            if upload.size > self.max_file_size:
+                if self.fail_on_oversize:
+                    raise UploadTooLarge(f'File {upload.filename} exceeds {self.max_file_size} bytes')
+                upload.error = f'File is too large (max {self.max_file_size} bytes)'
+                return
+            if len(upload.head) < FileHandler.MAGIC_HEADER_SIZE:
+                upload.head += data[:FileHandler.MAGIC_HEADER_SIZE - len(upload.head)]
+            if upload.hasher is not None:
+                upload.hasher.update(data)
+            with profiling.phase('write'):
+                f.write(data)
+        return sink
+
+    def _field_sink(self, value: bytearray):
+        def sink(data: bytes) -> None:
+            if len(value) + len(data) > self.MAX_FIELD_SIZE:
+                raise UploadTooLarge('Form field is too large')
+            value.extend(data)
+        return sink
+
+    @staticmethod
+    def _parse_disposition(raw_headers: bytes) -> tuple[str | None, str | None]:
+        # Браузеры не экранируют обратную косую черту в multipart/form-data
+        # (кавычки кодируют как %22), а парсер email считает её экранированием
+        headers = BytesHeaderParser(policy=default).parsebytes(raw_headers.replace(b'\\', b'\\\\'))
+        disposition = headers.get('Content-Disposition')
+        if disposition is None:
+            return None, None
+        params = disposition.params
+        filename = params.get('filename')
+        if filename is not None:
+            # Некоторые браузеры присылают полный путь к файлу
+            filename = os.path.basename(filename.replace('\\', '/'))
+        return params.get('name'), filename
+
+
 class FileHandler:
     """Обработчик файлов для загрузки и валидации."""
-    
+
+    # Сколько первых байт файла нужно libmagic для определения типа
+    MAGIC_HEADER_SIZE = 2048
+
     @staticmethod
-    def parse_multipart_form_data(headers, body):
-        """Парсинг multipart/form-data."""
+    def get_boundary(headers) -> bytes | None:
+        """Извлекает boundary из заголовка Content-Type или возвращает None"""
         content_type = headers.get('Content-Type', '')
-        if not content_type.startswith('multipart/form-data'):
+        if not content_type.startswith('multipart/form-data') or 'boundary=' not in content_type:
             return None
+        boundary = content_type.split('boundary=')[1].split(';')[0].strip().strip('"')
+        return boundary.encode() if boundary else None
 
-        # Извлекаем boundary из Content-Type
-        boundary = content_type.split('boundary=')[1].encode()
-        
-        # Разделяем тело на части
-        parts = body.split(boundary)
-        
-        # Пропускаем первую и последнюю пустые части
-        parts = parts[1:-1]
-        
-        result = {}
-        for part in parts:
+    @staticmethod
+    def parse_multipart_stream(headers, stream, content_length: int,
+                               upload_dir: str = None,
+                               **parser_options) -> tuple[dict, list[UploadedFile]] | None:
+        """
+        Потоковый парсинг multipart/form-data.
+
+        Возвращает None, если запрос не multipart/form-data,
+        иначе — поля формы и список файлов во временных файлах upload_dir
+        (по умолчанию — spool_dir хранилища, см. app.storage.Storage).
+        В режиме STORAGE_MODE=cas для файлов считается SHA-256 (UploadedFile.digest).
+        parser_options передаются в MultipartStreamParser (max_files, fail_on_oversize).
+        """
+        boundary = FileHandler.get_boundary(headers)
+        if boundary is None:
+            return None
+        hash_algorithm = 'sha256' if settings.STORAGE_MODE == 'cas' else None
+        if upload_dir is None:
+            upload_dir = get_storage().spool_dir
+        parser = MultipartStreamParser(boundary, upload_dir, hash_algorithm=hash_algorithm, **parser_options)
+        with profiling.phase('parse'):
+            return parser.parse(stream, content_length)
+
+    @staticmethod
+    def validate_files(uploads: list[UploadedFile]) -> list[str | None]:
+        """
+        Проверяет тип нескольких файлов параллельно в пуле потоков.
+
+        libmagic работает без GIL, поэтому файлы пакета проверяются
+        одновременно на UPLOAD_VALIDATION_WORKERS потоках.
+
+        Возвращает:
+            list: MIME-тип для каждого допустимого файла, None — для недопустимого
+        """
+        def check(upload: UploadedFile) -> str | None:
+            if upload.error is not None:
+                return None
             try:
-                # Пропускаем пустые части
-                if not part.strip():
-                    continue
-                
-                # Удаляем начальные \r\n
-                part = part.strip(b'\r\n')
-                
-                # Парсим заголовки части
-                headers_end = part.find(b'\r\n\r\n')
-                if headers_end == -1:
-                    continue
-                    
-                headers_text = part[:headers_end]
-                content = part[headers_end + 4:]
-                
-                # Удаляем последний \r\n из контента
-                if content.endswith(b'\r\n'):
-                    content = content[:-2]
-                
-                headers = email.message_from_bytes(headers_text, policy=default)
-                
-                # Извлекаем имя поля
-                content_disposition = headers.get('Content-Disposition', '')
-                if 'name=' not in content_disposition:
-                    continue
-                    
-                name = content_disposition.split('name=')[1].split(';')[0].strip('"')
-                
-                # Если это файл
-                if 'filename=' in content_disposition:
-                    filename = content_disposition.split('filename=')[1].strip('"')
-                    result[name] = {'filename': filename, 'content': content}
-                else:
-                    result[name] = content.decode()
+                mime_type = FileHandler.detect_mime(upload.head)
             except Exception as e:
-                logger.error(f'Error parsing part: {e}')
-                continue
-        
-        return result
+                logger.error(f"Error validating file {upload.filename}: {e}")
+                return None
+            return mime_type if mime_type in settings.ALLOWED_MIME_TYPES else None
+
+        # Потоки пула не видят трассировку запроса, поэтому фаза — на весь пакет
+        with profiling.phase('validate'):
+            if len(uploads) < 2:
+                return [check(upload) for upload in uploads]
+            return list(FileHandler._validation_executor().map(check, uploads))
+
+    @staticmethod
+    def _validation_executor() -> ThreadPoolExecutor:
+        # Пул создаётся при первом пакете; после fork() — заново в каждом процессе
+        global _validation_pool
+        with _validation_pool_lock:
+            if _validation_pool is None or _validation_pool[0] != os.getpid():
+                executor = ThreadPoolExecutor(max_workers=max(1, settings.UPLOAD_VALIDATION_WORKERS),
+                                              thread_name_prefix='upload-validation')
+                _validation_pool = (os.getpid(), executor)
+            return _validation_pool[1]
 
     @staticmethod
-    def validate_file(file_content: bytes) -> bool:
-        """Проверка безопасности файла"""
+    def detect_mime(file_content: bytes) -> str:
+        """Определение MIME-типа по первым байтам файла"""
+        started = time.perf_counter()
         try:
-            mime = magic.Magic(mime=True)
-            file_type = mime.from_buffer(file_content)
-            return file_type in settings.ALLOWED_MIME_TYPES
-        except Exception as e:
-            logger.error(f"Error validating file: {e}")
-            return False
+            with profiling.phase('validate'):
+                return FileHandler._magic().from_buffer(file_content)
+        finally:
+            metrics.observe_validation('buffer', time.perf_counter() - started)
+
+    @staticmethod
+    def _magic() -> magic.Magic:
+        """
+        Объект libmagic текущего потока.
+
+        Создание magic.Magic загружает базу сигнатур, поэтому объект создаётся
+        один раз на поток, а не на каждый вызов. Общий объект на все потоки
+        использовать нельзя: libmagic не потокобезопасна.
+        """
+        mime = getattr(_magic_local, 'mime', None)
+        if mime is None:
+            mime = _magic_local.mime = magic.Magic(mime=True)
+        return mime
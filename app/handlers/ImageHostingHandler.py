@@ -12,16 +12,26 @@ import email
 from email.parser import BytesParser
 from email.policy import default
 from app.handlers.AdvancedHandler import AdvancedHTTPRequestHandler
-from app.handlers.FileHandler import FileHandler
+from app.handlers.FileHandler import FileHandler, MultipartError, UploadTooLarge
+from app.utils.bulk_delete import parse_delete_request
+from app.utils import metrics
+from app.utils.compression import negotiate_encoding
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.utils.image_metadata import ImageMetadata, ImageMetadataCache
+from app.utils.static_assets import StaticAssetCache
 from app.db import DBManager
+from app.jobs import JobQueue
+from app.jobs.tasks import thumbnail_payloads, unlink_payloads
+from app.media import ThumbnailService, VariantService
+from app.storage import BlobStore, UnlinkQueue, get_storage
 from config import settings
 
 from PIL import Image
-import json
 import re
 import secrets
 import time
 from datetime import datetime
+from urllib.parse import parse_qs, urlparse
 
 
 """
@@ -38,12 +48,9 @@ class ImageHostingHandler(AdvancedHTTPRequestHandler):
     server_version = 'Image Hosting Server/0.2'
 
     def __init__(self, request, client_address, server):
-        # Отладочная информация о путях
-        logger.info(f"STATIC_PATH: {settings.STATIC_PATH}")
-        logger.info(f"STATIC_PATH существует: {os.path.exists(settings.STATIC_PATH)}")
-        logger.info(f"Содержимое STATIC_PATH: {os.listdir(settings.STATIC_PATH) if os.path.exists(settings.STATIC_PATH) else 'не существует'}")
-        
         self.db = DBManager()
+        self.storage = get_storage()
+        self.static_assets = StaticAssetCache()
         super().__init__(request, client_address, server)
         
 
@@ -56,6 +63,7 @@ class ImageHostingHandler(AdvancedHTTPRequestHandler):
         """
         self.send_response(302)
         self.send_header('Location', path)
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
     def serve_static_file(self, path: str, content_type: str = None):
@@ -66,47 +74,49 @@ class ImageHostingHandler(AdvancedHTTPRequestHandler):
             path: Путь к файлу в папке static/
             content_type: Тип контента (MIME-тип) файла
         
-        Этот метод обрабатывает:
-        1. Проверку существования файла
-        2. Определение правильного content-type
-        3. Отправку файла с правильными заголовками
+        Файлы берутся из кэша в памяти (StaticAssetCache), поэтому запрос
+        не обращается к диску. Этот метод обрабатывает:
+        1. Поиск файла в кэше
+        2. Условный запрос по ETag/Last-Modified (304)
+        3. Выбор заранее сжатого варианта (br, gzip) по Accept-Encoding
+        4. Отправку файла с правильными заголовками
         """
         try:
-            file_path = os.path.join(settings.STATIC_PATH, path.lstrip('/'))
-            logger.info(f"Запрошен файл: {file_path}")
-            logger.info(f"Файл существует: {os.path.isfile(file_path)}")
-            
-            if not os.path.isfile(file_path):
-                self.handle_error(404, f'File not found: {file_path}')
+            asset = self.static_assets.get(path.lstrip('/'))
+            if asset is None:
+                self.handle_error(404, f'File not found: {path}')
                 return
 
-            # Определяем content-type если не указан
-            if not content_type:
-                if path.endswith('.html'):
-                    content_type = 'text/html'
-                elif path.endswith('.js'):
-                    content_type = 'application/javascript'
-                elif path.endswith('.ico'):
-                    content_type = 'image/x-icon'
-                elif path.endswith('.css'):
-                    content_type = 'text/css'
-
-            self.send_response(200)
-            if content_type:
-                self.send_header('Content-type', content_type)
-                
             # Специальные заголовки для favicon
             if path.endswith('.ico'):
-                self.send_header('Cache-Control', 'public, max-age=31536000')
+                cache_control = settings.FAVICON_CACHE_CONTROL
             else:
-                self.send_header('Cache-Control', 'public, max-age=3600')
-                
-            # Отправляем размер файла
-            self.send_header('Content-Length', str(os.path.getsize(file_path)))
+                cache_control = settings.STATIC_CACHE_CONTROL
+
+            encoding = negotiate_encoding(self.headers.get('Accept-Encoding'), asset.encodings)
+            body = asset.encodings[encoding] if encoding else asset.body
+            etag = asset.etag_for(encoding)
+            headers = {'Cache-Control': cache_control}
+            if asset.encodings:
+                headers['Vary'] = 'Accept-Encoding'
+
+            if self.is_not_modified(etag, asset.mtime):
+                self.send_not_modified(etag, asset.last_modified, headers)
+                return
+
+            self.send_response(200)
+            self.send_header('Content-type', content_type or asset.content_type)
+            for header, value in headers.items():
+                self.send_header(header, value)
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', asset.last_modified)
+            self.send_header('Content-Length', str(len(body)))
             self.end_headers()
-            
-            with open(file_path, 'rb') as f:
-                self.wfile.write(f.read())
+
+            if self.command != 'HEAD':
+                self.wfile.write(body)
         except Exception as e:
             self.handle_error(500, f'Error serving file: {str(e)}')
 
@@ -131,7 +141,8 @@ class ImageHostingHandler(AdvancedHTTPRequestHandler):
         Возвращает список всех загруженных картинок в формате JSON с поддержкой пагинации.
         
         Параметры запроса:
-        - page: номер страницы (по умолчанию 1)
+        - cursor: курсор из next_cursor предыдущего ответа (постраничная выдача по ключу)
+        - page: номер страницы (по умолчанию 1), используется без cursor
         - per_page: количество изображений на странице (по умолчанию 10)
         
         Формат ответа:
@@ -149,17 +160,19 @@ class ImageHostingHandler(AdvancedHTTPRequestHandler):
             ],
             "total": 100,
             "page": 1,
-            "per_page": 10
+            "per_page": 10,
+            "next_cursor": "WyIyMDI0LTA0LTExVDEyOjAwOjAwIiwxXQ"
         }
+
+        С cursor поля total и page не возвращаются: COUNT(*) по всей таблице
+        стоил бы дороже самой выборки. next_cursor равен null на последней странице.
         """
         try:
-            logger.info(f'GET {self.path}')
-            
             # Получаем параметры из запроса
-            from urllib.parse import parse_qs, urlparse
             query = parse_qs(urlparse(self.path).query)
             page = int(query.get('page', [1])[0])
             per_page = int(query.get('per_page', [10])[0])
+            cursor = query.get('cursor', [None])[0]
             
             # Проверяем, что значения корректны
             if page < 1:
@@ -168,19 +181,19 @@ class ImageHostingHandler(AdvancedHTTPRequestHandler):
                 per_page = 10
             elif per_page > 50:  # Ограничиваем макс. количество
                 per_page = 50
+
+            after = None
+            if cursor:
+                try:
+                    after = decode_cursor(cursor)
+                except ValueError:
+                    self.handle_error(400, 'Invalid cursor')
+                    return
             
-            # Получаем изображения из БД с сортировкой по времени загрузки
-            images = self.db.get_images(page, per_page)
-            
-            # Получаем общее количество изображений
-            with self.db.get_connection().cursor() as cursor:
-                cursor.execute("SELECT COUNT(*) FROM images")
-                total = cursor.fetchone()[0]
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json; charset=utf-8')
-            self.send_header('Cache-Control', 'no-cache')
-            self.end_headers()
+            # Запрашиваем на одну запись больше, чтобы узнать, есть ли следующая страница
+            images = self.db.get_images(page, per_page + 1, after=after)
+            has_more = len(images) > per_page
+            images = images[:per_page]
             
             # Преобразуем кортежи в словари для JSON
             images_list = []
@@ -204,17 +217,38 @@ class ImageHostingHandler(AdvancedHTTPRequestHandler):
                     'file_type': img[4],   # file_type
                     'upload_time': upload_time  # upload_time, преобразованное в строку
                 })
-                
-            response_data = {
-                "images": images_list,
-                "total": total,
-                "page": page,
-                "per_page": per_page
-            }
-            self.wfile.write(json.dumps(response_data).encode('utf-8'))
+
+            response_data = {"images": images_list}
+            if after is None:
+                # Общее количество нужно только для нумерованных страниц
+                response_data["total"] = self.db.count_images()
+                response_data["page"] = page
+            response_data["per_page"] = per_page
+            response_data["next_cursor"] = encode_cursor(images[-1][5], images[-1][0]) if has_more else None
+
+            self.send_json(response_data, headers={'Cache-Control': 'no-cache'},
+                           content_type='application/json; charset=utf-8')
         except Exception as e:
             self.handle_error(500, f'Error listing images: {str(e)}')
 
+    def get_db_pool_stats(self):
+        """
+        Возвращает статистику пула соединений с БД в формате JSON.
+
+        Помогает подобрать DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE под нагрузку:
+        in_use и idle — занятые и свободные соединения, waits и wait_time_* —
+        сколько раз и как долго запросы ждали свободное соединение.
+        """
+        self.send_json(self.db.pool_stats(), headers={'Cache-Control': 'no-cache'})
+
+    def get_metrics(self):
+        """Отдаёт метрики всех воркеров в текстовом формате Prometheus"""
+        if not metrics.enabled():
+            self.handle_error(404, 'Metrics are disabled')
+            return
+        body, content_type = metrics.render()
+        self.send_body(body, content_type)
+
     def get_image(self, filename=None):
         """
         Отдает картинку по её имени.
@@ -223,109 +257,399 @@ class ImageHostingHandler(AdvancedHTTPRequestHandler):
             filename: Имя файла картинки (опционально, может быть получено из URL)
         
         Этот метод:
-        1. Проверяет существование файла
-        2. Определяет тип содержимого (MIME-тип)
-        3. Отправляет файл изображения с правильными заголовками
+        1. Берет сведения о файле (ключ, размер, MIME-тип, ETag) из ImageMetadataCache
+        2. Отправляет файл изображения с правильными заголовками
+           (через sendfile или потоком из хранилища, с поддержкой Range для докачки);
+           клиентам, принимающим WebP/AVIF, — готовую копию в этом формате
         """
         try:
             # Если filename не передан, получаем его из URL
             if filename is None:
-                filename = self.path.split('/')[-1]
+                filename = urlparse(self.path).path.split('/')[-1]
+
+            # /images/<filename>?w=320 — то же, что /thumbs/320/<filename>
+            if '?' in self.path:
+                width = parse_qs(urlparse(self.path).query).get('w', [None])[0]
+                if width is not None:
+                    self.get_thumbnail(width, filename)
+                    return
             
-            logger.info(f'GET /images/{filename}')
-            image_path = os.path.join(settings.IMAGES_PATH, filename)
-            if not os.path.isfile(image_path):
+            meta = self.get_image_metadata(filename)
+            if meta is None:
                 self.handle_error(404, 'Image not found')
                 return
 
             # Проверяем тип файла
-            mime = magic.Magic(mime=True)
-            file_type = mime.from_file(image_path)
-            if not file_type.startswith('image/'):
+            if not meta.mime_type.startswith('image/'):
                 self.handle_error(400, 'Invalid file type')
                 return
 
-            self.send_response(200)
-            self.send_header('Content-type', file_type)
-            self.send_header('Cache-Control', 'public, max-age=3600')
-            self.end_headers()
-            with open(image_path, 'rb') as f:
-                self.wfile.write(f.read())
+            try:
+                self.send_negotiated_image(meta)
+            except FileNotFoundError:
+                # Файл удалили или перенесли (другой процесс-воркер, миграция в BlobStore)
+                ImageMetadataCache().evict(filename)
+                meta = self.get_image_metadata(filename)
+                if meta is None:
+                    self.handle_error(404, 'Image not found')
+                    return
+                self.send_negotiated_image(meta)
         except Exception as e:
             self.handle_error(500, f'Error serving image: {str(e)}')
 
+    def send_negotiated_image(self, meta: ImageMetadata) -> None:
+        """
+        Отправляет копию в WebP/AVIF, если клиент принимает этот формат
+        (заголовок Accept) и копия готова, иначе оригинал (см. VariantService).
+        """
+        service = VariantService()
+        if not service.applies_to(meta.mime_type):
+            self.send_image(meta)
+            return
+
+        headers = {'Cache-Control': settings.IMAGE_CACHE_CONTROL, 'Vary': 'Accept'}
+        image_format = service.negotiate(self.headers.get('Accept'))
+        if image_format is not None:
+            variant, pending = service.lookup(meta.filename, image_format, meta.size, source=meta.key)
+            if variant is not None:
+                content_type = service.CONTENT_TYPES[image_format]
+                if settings.ACCEL_REDIRECT_ENABLED:
+                    uri = settings.ACCEL_REDIRECT_VARIANTS_PREFIX + service.relative_path(meta.filename, image_format)
+                    self.send_accel_redirect(uri, content_type, headers)
+                else:
+                    self.send_file(variant, content_type, headers=headers)
+                return
+            if pending:
+                headers['Cache-Control'] = settings.VARIANT_PENDING_CACHE_CONTROL
+        self.send_image(meta, headers)
+
+    def send_image(self, meta: ImageMetadata, headers: dict = None) -> None:
+        """
+        Отправляет оригинал: локальный файл — через nginx (ACCEL_REDIRECT_ENABLED)
+        или sendfile, из удалённого хранилища — потоком.
+        """
+        headers = headers or {'Cache-Control': settings.IMAGE_CACHE_CONTROL}
+        if meta.path is not None and settings.ACCEL_REDIRECT_ENABLED:
+            self.send_accel_redirect(settings.ACCEL_REDIRECT_PREFIX + meta.key, meta.mime_type, headers)
+        elif meta.path is not None:
+            self.send_file(meta.path, meta.mime_type, headers=headers, meta=meta)
+        else:
+            self.send_object(self.storage, meta.key, meta, meta.mime_type, headers=headers)
+
+    def get_image_metadata(self, filename: str) -> ImageMetadata | None:
+        """
+        Возвращает сведения о файле изображения или None, если файла нет.
+
+        Сначала ищет в ImageMetadataCache; запись старше IMAGE_METADATA_CACHE_TTL
+        сверяет с таблицей images (изображение могли удалить в другом процессе,
+        а файл — ещё нет). При промахе берет из БД MIME-тип и хэш содержимого
+        (файл в BlobStore) и запрашивает сведения о файле у хранилища; для
+        старых записей без mime_type определяет его через libmagic и сохраняет в БД.
+        """
+        filename = os.path.basename(filename)
+        cache = ImageMetadataCache()
+        meta = cache.get(filename)
+        if meta is not None:
+            if cache.is_fresh(meta):
+                return meta
+            if self.db.get_image_file(filename) is None:
+                cache.evict(filename)
+                return None
+            cache.touch(meta)
+            return meta
+
+        mime_type, blob_hash = self.db.get_image_file(filename) or (None, None)
+
+        # Файл из BlobStore; во время миграции он может ещё лежать под своим именем
+        keys = [BlobStore.key_for(blob_hash)] if blob_hash else []
+        keys.append(filename)
+        for key in keys:
+            stored = self.storage.stat(key)
+            if stored is not None:
+                break
+        else:
+            return None
+
+        if mime_type is None:
+            mime_type = FileHandler.detect_mime(self.storage.read(key, 0, FileHandler.MAGIC_HEADER_SIZE))
+            self.db.set_mime_type(filename, mime_type)
+
+        meta = ImageMetadata(filename, stored, mime_type, blob_hash)
+        cache.put(meta)
+        return meta
+
+    def get_thumbnail(self, size, filename):
+        """
+        Отдает уменьшенную копию картинки шириной size пикселей.
+
+        Args:
+            size: Ширина копии (из THUMBNAIL_SIZES или в пределах
+                  THUMBNAIL_MIN_WIDTH..THUMBNAIL_MAX_WIDTH — тогда она
+                  округляется вверх до кратной THUMBNAIL_WIDTH_STEP)
+            filename: Имя файла картинки
+
+        Копия берётся из кэша на диске (THUMBS_PATH), а если её ещё нет —
+        создаётся в пуле процессов ThumbnailService (в том числе для
+        оригиналов из удалённого хранилища). Если создать копию не
+        удалось, отдается оригинал.
+        """
+        try:
+            try:
+                width = int(size)
+            except (TypeError, ValueError):
+                width = 0
+            width = ThumbnailService.snap_width(width)
+            if width is None:
+                self.handle_error(400, f'Unsupported thumbnail size: {size}')
+                return
+
+            meta = self.get_image_metadata(filename)
+            if meta is None:
+                self.handle_error(404, 'Image not found')
+                return
+
+            if not meta.mime_type.startswith('image/'):
+                self.handle_error(400, 'Invalid file type')
+                return
+
+            try:
+                thumb_path = ThumbnailService().get(filename, width, source=meta.key)
+            except Exception as e:
+                logger.error(f'Thumbnail {width}px for {filename} is not available, serving original: {e}')
+                self.send_image(meta)
+                return
+
+            self.send_file(thumb_path, meta.mime_type, headers={'Cache-Control': settings.IMAGE_CACHE_CONTROL})
+        except Exception as e:
+            self.handle_error(500, f'Error serving thumbnail: {str(e)}')
+
     def post_upload(self):
         """
         Обрабатывает POST запрос для загрузки изображения.
         
         Этот метод:
-        1. Принимает данные формы с файлом
-        2. Проверяет тип файла (допустимы только изображения)
-        3. Генерирует уникальное имя файла
-        4. Сохраняет файл и добавляет информацию в базу данных
-        5. Возвращает JSON-ответ с информацией об успешной загрузке
+        1. Проверяет Content-Length до чтения тела (413, если слишком большое)
+        2. Потоково разбирает форму: файл пишется во временный файл блоками
+        3. Проверяет тип файла (допустимы только изображения)
+        4. Сохраняет временный файл в хранилище под уникальным именем
+        5. Добавляет информацию в базу данных
+        6. Возвращает JSON-ответ с информацией об успешной загрузке
         """
+        files = []
         try:
-            logger.info(f'POST {self.path}')
-            
-            # Получаем заголовки и тело запроса
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length)
+            content_length = self.headers.get('Content-Length')
+            if content_length is None or not content_length.isdigit():
+                self.close_connection = True
+                self.handle_error(411, 'Content-Length required')
+                return
+            content_length = int(content_length)
+            if content_length > settings.UPLOAD_MAX_BODY_SIZE:
+                # Тело не читаем, поэтому соединение дальше использовать нельзя
+                self.close_connection = True
+                self.handle_error(413, 'Request body is too large')
+                return
             
-            # Парсим multipart/form-data
-            form_data = FileHandler.parse_multipart_form_data(self.headers, body)
+            # Потоково разбираем multipart/form-data
+            parsed = FileHandler.parse_multipart_stream(self.headers, self.rfile, content_length)
+            if parsed is None:
+                self.handle_error(400, 'No image file found in request')
+                return
+            form_fields, files = parsed
             
-            if not form_data or 'file' not in form_data:
+            file_data = next((f for f in files if f.field == 'file'), None)
+            if file_data is None:
                 self.handle_error(400, 'No image file found in request')
                 return
-                
-            file_data = form_data['file']
+            metrics.observe_upload('single', file_data.size)
             
             # Проверяем тип файла
-            if not FileHandler.validate_file(file_data['content']):
+            mime_type = FileHandler.detect_mime(file_data.head)
+            if mime_type not in settings.ALLOWED_MIME_TYPES:
                 self.handle_error(400, 'Invalid file type')
                 return
                 
             # Получаем информацию о файле
-            original_name = file_data['filename']
-            file_content = file_data['content']
-            file_size = len(file_content)
-            file_ext = original_name.split('.')[-1].lower()
+            original_name = file_data.filename
+            file_size = file_data.size
+            file_ext = settings.MIME_EXTENSIONS[mime_type]
             
             # Генерируем уникальное имя файла
             filename = f"{uuid.uuid4()}.{file_ext}"
-            file_path = os.path.join(settings.IMAGES_PATH, filename)
-            
-            # Сохраняем файл
-            with open(file_path, 'wb') as f:
-                f.write(file_content)
+
+            # В режиме cas парсер уже посчитал хэш содержимого
+            blob_hash = file_data.digest
+            if blob_hash is not None:
+                key = BlobStore.key_for(blob_hash)
+            else:
+                # Сохраняем файл: в LocalStorage временный файл уже на диске, он просто переименовывается
+                key = filename
+                self.storage.put_file(key, file_data.path, mime_type)
                 
             # Сохраняем информацию в БД
-            self.db.add_image(
-                filename=filename,
-                original_name=original_name,
-                length=file_size,
-                ext=file_ext
-            )
+            try:
+                self.db.add_image(
+                    filename=filename,
+                    original_name=original_name,
+                    length=file_size,
+                    ext=file_ext,
+                    mime_type=mime_type,
+                    blob_hash=blob_hash
+                )
+            except Exception:
+                if blob_hash is None:
+                    self.storage.delete(key)
+                raise
+
+            if blob_hash is not None:
+                # Файл кладём только после коммита (см. DBManager._release_blob).
+                # Если такое содержимое уже загружали, временный файл удалит discard()
+                try:
+                    BlobStore().put(file_data.path, blob_hash, mime_type)
+                except Exception:
+                    self.db.delete_image(filename, release_blob=BlobStore().unlink)
+                    raise
+            self.cache_metadata(filename, key, mime_type, blob_hash)
+
+            # Миниатюры готовятся в фоне, ответ их не ждёт
+            self.generate_thumbnails([(filename, key)])
             
             # Отправляем ответ
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json; charset=utf-8')
-            self.end_headers()
-            
             response_data = {
                 'success': True,
                 'filename': filename,
                 'original_name': original_name,
                 'size': file_size,
-                'file_type': f'image/{file_ext}'
+                'file_type': mime_type
             }
             
-            self.wfile.write(json.dumps(response_data).encode('utf-8'))
+            self.send_json(response_data, content_type='application/json; charset=utf-8')
             
+        except UploadTooLarge as e:
+            self.close_connection = True
+            self.handle_error(413, str(e))
+        except MultipartError as e:
+            self.close_connection = True
+            self.handle_error(400, str(e))
         except Exception as e:
             logger.error(f'Error uploading file: {str(e)}')
             self.handle_error(500, str(e))
+        finally:
+            for upload in files:
+                upload.discard()
+
+    def post_upload_batch(self):
+        """
+        Обрабатывает POST запрос для пакетной загрузки изображений.
+
+        Принимает multipart/form-data с любым количеством файловых частей
+        (до UPLOAD_BATCH_MAX_FILES). Этот метод:
+        1. Потоково разбирает форму; слишком большой файл отклоняется,
+           но не прерывает разбор остальных
+        2. Проверяет типы всех файлов параллельно (FileHandler.validate_files)
+        3. Добавляет записи обо всех принятых файлах одной транзакцией
+        4. Возвращает JSON с результатом по каждому файлу:
+        {
+            "success": true,
+            "uploaded": 2,
+            "failed": 1,
+            "results": [
+                {"original_name": "a.jpg", "success": true, "filename": "...", "size": 1024, "file_type": "image/jpeg"},
+                {"original_name": "b.txt", "success": false, "error": "Invalid file type"},
+                ...
+            ]
+        }
+        """
+        files = []
+        try:
+            content_length = self.headers.get('Content-Length')
+            if content_length is None or not content_length.isdigit():
+                self.close_connection = True
+                self.handle_error(411, 'Content-Length required')
+                return
+            content_length = int(content_length)
+            if content_length > settings.UPLOAD_BATCH_MAX_BODY_SIZE:
+                self.close_connection = True
+                self.handle_error(413, 'Request body is too large')
+                return
+
+            parsed = FileHandler.parse_multipart_stream(
+                self.headers, self.rfile, content_length,
+                max_files=settings.UPLOAD_BATCH_MAX_FILES,
+                fail_on_oversize=False
+            )
+            if parsed is None or not parsed[1]:
+                self.handle_error(400, 'No image files found in request')
+                return
+            form_fields, files = parsed
+            for upload in files:
+                if upload.error is None:
+                    metrics.observe_upload('batch', upload.size)
+
+            mime_types = FileHandler.validate_files(files)
+
+            results = []
+            accepted = []  # (upload, result, строка для add_images, ключ файла в хранилище)
+            for upload, mime_type in zip(files, mime_types):
+                result = {'original_name': upload.filename}
+                results.append(result)
+                if upload.error is not None or mime_type is None:
+                    result.update(success=False, error=upload.error or 'Invalid file type')
+                    continue
+                file_ext = settings.MIME_EXTENSIONS[mime_type]
+                filename = f"{uuid.uuid4()}.{file_ext}"
+                blob_hash = upload.digest
+                key = BlobStore.key_for(blob_hash) if blob_hash is not None else filename
+                row = (filename, upload.filename, upload.size, file_ext, mime_type, blob_hash)
+                accepted.append((upload, result, row, key))
+
+            # Файлы без хэша сохраняем до вставки, файлы BlobStore — после коммита
+            moved = []
+            try:
+                for upload, _, row, key in accepted:
+                    if row[5] is None:
+                        self.storage.put_file(key, upload.path, row[4])
+                        moved.append(key)
+                self.db.add_images([row for _, _, row, _ in accepted])
+            except Exception:
+                for key in moved:
+                    self.storage.delete(key)
+                raise
+
+            stored = []
+            for upload, result, (filename, _, size, _, mime_type, blob_hash), key in accepted:
+                if blob_hash is not None:
+                    try:
+                        BlobStore().put(upload.path, blob_hash, mime_type)
+                    except Exception as e:
+                        logger.error(f'Cannot store blob {blob_hash}: {e}')
+                        self.db.delete_image(filename, release_blob=BlobStore().unlink)
+                        result.update(success=False, error='Cannot store file')
+                        continue
+                self.cache_metadata(filename, key, mime_type, blob_hash)
+                result.update(success=True, filename=filename, size=size, file_type=mime_type)
+                stored.append((filename, key))
+            self.generate_thumbnails(stored)
+
+            uploaded = len(stored)
+            self.send_json({
+                'success': uploaded > 0,
+                'uploaded': uploaded,
+                'failed': len(results) - uploaded,
+                'results': results
+            })
+
+        except UploadTooLarge as e:
+            self.close_connection = True
+            self.handle_error(413, str(e))
+        except MultipartError as e:
+            self.close_connection = True
+            self.handle_error(400, str(e))
+        except Exception as e:
+            logger.error(f'Error uploading files: {str(e)}')
+            self.handle_error(500, str(e))
+        finally:
+            for upload in files:
+                upload.discard()
 
     def delete_image(self, filename):
         """
@@ -337,35 +661,38 @@ class ImageHostingHandler(AdvancedHTTPRequestHandler):
         Этот метод:
         1. Проверяет существование файла
         2. Удаляет запись из базы данных
-        3. Удаляет физический файл
+        3. Удаляет физический файл (в BlobStore — только если на него
+           больше не ссылаются другие записи)
         4. Возвращает JSON-ответ с результатом операции
         """
         try:
-            logger.info(f'DELETE /api/images/{filename}')
-            image_path = os.path.join(settings.IMAGES_PATH, filename)
-            
             # Проверяем существование файла
-            if not os.path.isfile(image_path):
+            meta = self.get_image_metadata(filename)
+            if meta is None:
                 self.handle_error(404, 'Image not found')
                 return
-                
-            # Удаляем запись из БД
-            self.db.delete_image(filename)
-            
-            # Удаляем файл
-            os.remove(image_path)
+            ImageMetadataCache().evict(filename)
+
+            if settings.JOBS_ENABLED:
+                # Файлы удалит воркер app.jobs, ответ его не ждёт
+                self.delete_images_deferred(filenames=[filename])
+            else:
+                # Удаляем запись из БД (файл из BlobStore удаляется вместе с последней ссылкой)
+                self.db.delete_image(filename, release_blob=BlobStore().unlink)
+
+                # Удаляем файл и его уменьшенные копии
+                if meta.blob_hash is None:
+                    self.storage.delete(meta.key)
+                ThumbnailService().delete(filename)
+                VariantService().delete(filename)
             
             # Отправляем успешный ответ
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json; charset=utf-8')
-            self.end_headers()
-            
             response_data = {
                 'success': True,
                 'message': 'Image deleted successfully'
             }
             
-            self.wfile.write(json.dumps(response_data).encode('utf-8'))
+            self.send_json(response_data, content_type='application/json; charset=utf-8')
             
         except Exception as e:
             self.handle_error(500, f'Error deleting image: {str(e)}')
@@ -379,41 +706,133 @@ class ImageHostingHandler(AdvancedHTTPRequestHandler):
         
         Этот метод:
         1. Получает информацию об изображении из БД по ID
-        2. Удаляет физический файл
-        3. Удаляет запись из БД
+        2. Удаляет запись из БД
+        3. Удаляет физический файл (в BlobStore — вместе с последней ссылкой)
         4. Перенаправляет пользователя на страницу со списком изображений
         """
         try:
-            logger.info(f'GET /delete/{id}')
-            
             if id is None:
                 self.handle_error(400, 'Image ID is required')
                 return
                 
             # Получаем имя файла по ID
-            with self.db.get_connection().cursor() as cursor:
-                cursor.execute("SELECT filename FROM images WHERE id = %s", (id,))
-                result = cursor.fetchone()
-                
-                if not result:
-                    self.handle_error(404, f'Image with ID {id} not found')
-                    return
-                    
-                filename = result[0]
-            
-            # Удаляем физический файл
-            image_path = os.path.join(settings.IMAGES_PATH, filename)
-            if os.path.isfile(image_path):
-                os.remove(image_path)
+            filename = self.db.get_filename_by_id(id)
+            if not filename:
+                self.handle_error(404, f'Image with ID {id} not found')
+                return
             
-            # Удаляем запись из БД
-            with self.db.get_connection().cursor() as cursor:
-                cursor.execute("DELETE FROM images WHERE id = %s", (id,))
-            self.db.get_connection().commit()
+            meta = self.get_image_metadata(filename)
+            ImageMetadataCache().evict(filename)
+
+            if settings.JOBS_ENABLED:
+                self.delete_images_deferred(filenames=[filename])
+            else:
+                # Удаляем запись из БД
+                self.db.delete_image_by_id(id, release_blob=BlobStore().unlink)
+
+                # Удаляем физический файл
+                if meta is not None and meta.blob_hash is None:
+                    self.storage.delete(meta.key)
+                ThumbnailService().delete(filename)
+                VariantService().delete(filename)
             
             # Перенаправляем на страницу со списком изображений
             self.redirect_to('/all_images.html')
             
         except Exception as e:
             logger.error(f'Error deleting image by ID: {str(e)}')
-            self.handle_error(500, f'Error deleting image: {str(e)}')
\ No newline at end of file
+            self.handle_error(500, f'Error deleting image: {str(e)}')
+
+    def post_delete_batch(self):
+        """
+        Обрабатывает POST запрос для пакетного удаления изображений.
+
+        Тело запроса: {"ids": [1, 2, 3], "filenames": ["<uuid>.jpg"]}.
+
+        Этот метод:
+        1. Удаляет все записи одним запросом DELETE ... WHERE id = ANY(...)
+        2. Ставит файлы и уменьшенные копии в очередь на фоновое удаление
+           (delete_images_deferred) и отвечает сразу после коммита
+        3. Возвращает JSON:
+        {
+            "success": true,
+            "deleted": 2,
+            "not_found": {"ids": [3], "filenames": []}
+        }
+        """
+        try:
+            content_length = self.headers.get('Content-Length')
+            if content_length is None or not content_length.isdigit():
+                self.close_connection = True
+                self.handle_error(411, 'Content-Length required')
+                return
+            content_length = int(content_length)
+            if content_length > settings.DELETE_BATCH_MAX_BODY_SIZE:
+                self.close_connection = True
+                self.handle_error(413, 'Request body is too large')
+                return
+
+            try:
+                ids, filenames = parse_delete_request(self.rfile.read(content_length))
+            except ValueError as e:
+                self.handle_error(400, str(e))
+                return
+
+            deleted = self.delete_images_deferred(ids, filenames)
+
+            deleted_ids = {image_id for image_id, _, _ in deleted}
+            deleted_filenames = {filename for _, filename, _ in deleted}
+            self.send_json({
+                'success': True,
+                'deleted': len(deleted),
+                'not_found': {
+                    'ids': [i for i in ids if i not in deleted_ids],
+                    'filenames': [f for f in filenames if f not in deleted_filenames]
+                }
+            })
+
+        except Exception as e:
+            logger.error(f'Error deleting images: {str(e)}')
+            self.handle_error(500, f'Error deleting images: {str(e)}')
+
+    def cache_metadata(self, filename: str, key: str, mime_type: str, blob_hash: str = None) -> None:
+        """Кладёт в ImageMetadataCache сведения о только что сохранённом файле"""
+        stored = self.storage.stat(key)
+        if stored is not None:
+            ImageMetadataCache().put(ImageMetadata(filename, stored, mime_type, blob_hash))
+
+    def generate_thumbnails(self, images: list[tuple]) -> None:
+        """
+        Запускает создание миниатюр для пар (filename, ключ оригинала в хранилище).
+
+        При JOBS_ENABLED ставит задачи thumbnails.generate для воркеров
+        app.jobs, иначе отдаёт работу пулу ThumbnailService этого процесса.
+        """
+        if settings.JOBS_ENABLED:
+            JobQueue().enqueue_many('thumbnails.generate', thumbnail_payloads(images))
+            return
+        for filename, source in images:
+            ThumbnailService().generate_defaults(filename, source=source)
+
+    def delete_images_deferred(self, ids: list[int] = (), filenames: list[str] = ()) -> list[tuple]:
+        """
+        Удаляет записи одним запросом, а файлы — после ответа.
+
+        При JOBS_ENABLED задачи files.unlink ставятся в той же транзакции,
+        что и удаление, иначе файлы удаляет поток UnlinkQueue этого процесса.
+
+        Возвращает:
+            list[tuple]: (id, filename, blob_hash) удалённых записей
+        """
+        if settings.JOBS_ENABLED:
+            deleted = self.db.delete_images(
+                ids, filenames,
+                on_deleted=lambda cursor, rows: JobQueue().enqueue_many('files.unlink', unlink_payloads(rows),
+                                                                        cursor=cursor)
+            )
+        else:
+            deleted = self.db.delete_images(ids, filenames)
+            UnlinkQueue().submit(deleted, purge_blobs=self.db.purge_blobs)
+        for _, filename, _ in deleted:
+            ImageMetadataCache().evict(filename)
+        return deleted
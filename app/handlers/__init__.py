@@ -3,7 +3,10 @@
 """
 
 from .AdvancedHandler import AdvancedHTTPRequestHandler
-from .FileHandler import FileHandler
+from .FileHandler import FileHandler, MultipartStreamParser, MultipartError, UploadedFile, UploadTooLarge
 from .ImageHostingHandler import ImageHostingHandler
 
-__all__ = ['AdvancedHTTPRequestHandler', 'FileHandler', 'ImageHostingHandler']
\ No newline at end of file
+__all__ = [
+    'AdvancedHTTPRequestHandler', 'FileHandler', 'ImageHostingHandler',
+    'MultipartStreamParser', 'MultipartError', 'UploadedFile', 'UploadTooLarge'
+]
\ No newline at end of file
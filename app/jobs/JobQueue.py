@@ -0,0 +1,180 @@
+import random
+
+from loguru import logger
+from psycopg2.extras import Json, execute_values
+
+from app.db import DBManager
+from app.utils.singleton import SingletonMeta
+from config import settings
+
+
+class Job:
+    """
+    Задача, полученная воркером из очереди.
+
+    Атрибуты:
+        id (int): идентификатор строки jobs
+        kind (str): тип задачи (ключ app.jobs.tasks.TASKS)
+        payload (dict): параметры задачи
+        attempts (int): номер текущей попытки, начиная с 1
+        max_attempts (int): после стольких неудачных попыток задача получает статус failed
+    """
+    __slots__ = ('id', 'kind', 'payload', 'attempts', 'max_attempts')
+
+    def __init__(self, id: int, kind: str, payload: dict, attempts: int, max_attempts: int):
+        self.id = id
+        self.kind = kind
+        self.payload = payload
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+
+
+class JobQueue(metaclass=SingletonMeta):
+    """
+    Очередь фоновых задач в таблице jobs.
+
+    Задача ставится в очередь одной вставкой — в той же транзакции, что и
+    изменение, которое её породило (аргумент cursor), поэтому не теряется,
+    если процесс сервера завершится сразу после ответа.
+
+    Воркер забирает задачи запросом SELECT ... FOR UPDATE SKIP LOCKED:
+    воркеры не ждут друг друга и не получают одну задачу дважды. Забранная
+    задача помечается running до locked_until (JOBS_VISIBILITY_TIMEOUT);
+    транзакция на время выполнения не держится. Если воркер упал, после
+    locked_until задачу заберёт другой, поэтому задачи должны быть
+    идемпотентными. Выполненные задачи удаляются, неудачные повторяются с
+    экспоненциальной задержкой, после max_attempts попыток остаются со
+    статусом failed.
+    """
+
+    def __init__(self):
+        self.db = DBManager()
+
+    def enqueue(self, kind: str, payload: dict = None, delay: float = 0,
+                max_attempts: int = None, cursor=None) -> int:
+        """
+        Ставит задачу в очередь.
+
+        Аргументы:
+            kind: тип задачи
+            payload: параметры задачи (сериализуются в JSON)
+            delay: через сколько секунд задачу можно выполнять
+            max_attempts: сколько раз пытаться выполнить (по умолчанию JOBS_MAX_ATTEMPTS)
+            cursor: курсор открытой транзакции; без него задача вставляется отдельной транзакцией
+
+        Возвращает:
+            int: id задачи
+        """
+        return self.enqueue_many(kind, [payload or {}], delay, max_attempts, cursor)[0]
+
+    def enqueue_many(self, kind: str, payloads: list[dict], delay: float = 0,
+                     max_attempts: int = None, cursor=None) -> list[int]:
+        """Ставит в очередь несколько задач одного типа одной вставкой"""
+        if not payloads:
+            return []
+        max_attempts = max_attempts or settings.JOBS_MAX_ATTEMPTS
+        query = (
+            "INSERT INTO jobs (kind, payload, max_attempts, run_at) VALUES %s RETURNING id"
+        )
+        template = "(%s, %s, %s, CURRENT_TIMESTAMP + make_interval(secs => %s))"
+        rows = [(kind, Json(payload), max_attempts, delay) for payload in payloads]
+        if cursor is not None:
+            return [row[0] for row in execute_values(cursor, query, rows, template, fetch=True)]
+        with self.db.connection() as conn:
+            with conn.cursor() as cursor:
+                return [row[0] for row in execute_values(cursor, query, rows, template, fetch=True)]
+
+    def claim(self, worker_id: str, kinds: list[str], limit: int = 1) -> list[Job]:
+        """
+        Забирает до limit готовых к выполнению задач указанных типов.
+
+        Готовы задачи со статусом queued, у которых наступил run_at, и
+        задачи running, чей воркер не уложился в locked_until.
+        """
+        with self.db.connection() as conn:
+            with conn.cursor() as cursor:
+                # Задачи, которые раз за разом не успевают к locked_until, больше не повторяем
+                cursor.execute(
+                    "UPDATE jobs SET status = 'failed', locked_by = NULL, locked_until = NULL, "
+                    "last_error = 'Visibility timeout expired' "
+                    "WHERE status = 'running' AND locked_until < CURRENT_TIMESTAMP AND attempts >= max_attempts"
+                )
+                cursor.execute(
+                    """
+                    UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_by = %s,
+                        locked_until = CURRENT_TIMESTAMP + make_interval(secs => %s)
+                    WHERE id IN (
+                        SELECT id FROM jobs
+                        WHERE kind = ANY(%s)
+                          AND ((status = 'queued' AND run_at <= CURRENT_TIMESTAMP)
+                               OR (status = 'running' AND locked_until < CURRENT_TIMESTAMP))
+                        ORDER BY run_at, id
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, kind, payload, attempts, max_attempts
+                    """,
+                    (worker_id, settings.JOBS_VISIBILITY_TIMEOUT, list(kinds), limit)
+                )
+                return [Job(*row) for row in cursor.fetchall()]
+
+    def complete(self, job: Job, worker_id: str) -> None:
+        """Удаляет выполненную задачу (если её не успел забрать другой воркер)"""
+        with self.db.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "DELETE FROM jobs WHERE id = %s AND locked_by = %s AND status = 'running'",
+                    (job.id, worker_id)
+                )
+
+    def fail(self, job: Job, worker_id: str, error: str) -> float | None:
+        """
+        Возвращает задачу в очередь с задержкой или помечает её failed.
+
+        Возвращает:
+            float | None: задержка до следующей попытки; None — попыток больше не будет
+        """
+        if job.attempts >= job.max_attempts:
+            delay = None
+            query = ("UPDATE jobs SET status = 'failed', locked_by = NULL, locked_until = NULL, last_error = %s "
+                     "WHERE id = %s AND locked_by = %s")
+            params = (error, job.id, worker_id)
+        else:
+            delay = self.retry_delay(job.attempts)
+            query = ("UPDATE jobs SET status = 'queued', locked_by = NULL, locked_until = NULL, last_error = %s, "
+                     "run_at = CURRENT_TIMESTAMP + make_interval(secs => %s) "
+                     "WHERE id = %s AND locked_by = %s")
+            params = (error, delay, job.id, worker_id)
+        with self.db.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+        return delay
+
+    @staticmethod
+    def retry_delay(attempts: int) -> float:
+        """Экспоненциальная задержка со случайной составляющей, чтобы повторы не шли пачкой"""
+        delay = min(settings.JOBS_RETRY_MAX_DELAY, settings.JOBS_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+        return random.uniform(delay / 2, delay)
+
+    def retry_failed(self, kind: str = None) -> int:
+        """Возвращает задачи со статусом failed в очередь. Возвращает их количество"""
+        with self.db.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE jobs SET status = 'queued', attempts = 0, run_at = CURRENT_TIMESTAMP "
+                    "WHERE status = 'failed' AND (%s::varchar IS NULL OR kind = %s)",
+                    (kind, kind)
+                )
+                count = cursor.rowcount
+        logger.info(f'Requeued {count} failed jobs')
+        return count
+
+    def stats(self) -> dict:
+        """Количество задач по типам и статусам: {kind: {status: count}}"""
+        with self.db.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT kind, status, count(*) FROM jobs GROUP BY kind, status ORDER BY kind, status")
+                stats = {}
+                for kind, status, count in cursor.fetchall():
+                    stats.setdefault(kind, {})[status] = count
+        return stats
@@ -0,0 +1,93 @@
+import os
+import socket
+import threading
+import time
+
+from loguru import logger
+
+from app.jobs.JobQueue import Job, JobQueue
+from app.jobs.tasks import TASKS
+from config import settings
+
+
+class JobWorker:
+    """
+    Выполняет задачи из JobQueue в нескольких потоках.
+
+    Каждый поток забирает по одной задаче; если очередь пуста, ждёт
+    JOBS_POLL_INTERVAL секунд. stop() дожидается, пока потоки закончат
+    текущие задачи, новые после этого не забираются.
+
+    Аргументы:
+        threads (int): количество потоков (по умолчанию JOBS_WORKER_THREADS)
+        kinds (list[str]): типы задач, которые выполняет воркер (по умолчанию все из TASKS)
+    """
+
+    def __init__(self, threads: int = None, kinds: list[str] = None):
+        self.threads = max(1, threads or settings.JOBS_WORKER_THREADS)
+        self.kinds = list(kinds or TASKS)
+        unknown = set(self.kinds) - set(TASKS)
+        if unknown:
+            raise ValueError(f'Unknown job kinds: {", ".join(sorted(unknown))}')
+        self.queue = JobQueue()
+        self._stop = threading.Event()
+        self._workers = []
+
+    def worker_id(self) -> str:
+        """Кто держит задачу: хост, процесс и поток (пишется в jobs.locked_by)"""
+        return f'{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}'[:100]
+
+    def run(self) -> None:
+        """Запускает потоки и ждёт вызова stop()"""
+        logger.info(f'Job worker started: {self.threads} threads, kinds: {", ".join(self.kinds)}')
+        self._workers = [
+            threading.Thread(target=self._loop, name=f'job-worker-{i}')
+            for i in range(self.threads)
+        ]
+        for worker in self._workers:
+            worker.start()
+        for worker in self._workers:
+            worker.join()
+        logger.info('Job worker stopped')
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run_once(self) -> int:
+        """Выполняет готовые задачи в текущем потоке, пока они есть. Возвращает их количество"""
+        processed = 0
+        while not self._stop.is_set() and self._process_next():
+            processed += 1
+        return processed
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self._process_next():
+                    continue
+            except Exception as e:
+                # Например, БД недоступна — ждём и пробуем снова
+                logger.error(f'Cannot claim job: {e}')
+            self._stop.wait(settings.JOBS_POLL_INTERVAL)
+
+    def _process_next(self) -> bool:
+        worker_id = self.worker_id()
+        jobs = self.queue.claim(worker_id, self.kinds, limit=1)
+        if not jobs:
+            return False
+        self._execute(jobs[0], worker_id)
+        return True
+
+    def _execute(self, job: Job, worker_id: str) -> None:
+        started = time.perf_counter()
+        try:
+            TASKS[job.kind](job.payload)
+        except Exception as e:
+            delay = self.queue.fail(job, worker_id, f'{type(e).__name__}: {e}')
+            if delay is None:
+                logger.error(f'Job {job.id} ({job.kind}) failed after {job.attempts} attempts: {e}')
+            else:
+                logger.warning(f'Job {job.id} ({job.kind}) attempt {job.attempts} failed, retry in {delay:.0f}s: {e}')
+            return
+        self.queue.complete(job, worker_id)
+        logger.info(f'Job {job.id} ({job.kind}) done in {time.perf_counter() - started:.3f}s')
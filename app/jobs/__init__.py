@@ -0,0 +1,9 @@
+"""
+Пакет jobs - фоновые задачи в очереди PostgreSQL (таблица jobs).
+"""
+
+from app.jobs.JobQueue import Job, JobQueue
+from app.jobs.JobWorker import JobWorker
+from app.jobs.tasks import TASKS, task
+
+__all__ = ['Job', 'JobQueue', 'JobWorker', 'TASKS', 'task']
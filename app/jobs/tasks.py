@@ -0,0 +1,90 @@
+"""
+Типы фоновых задач.
+
+Задача — функция от payload (dict), зарегистрированная декоратором @task.
+Задачи выполняются «как минимум один раз» (см. JobQueue), поэтому каждая
+должна спокойно переносить повторный запуск. Ошибка в задаче означает
+повтор с задержкой.
+
+Здесь же — функции, которые собирают payload для задач, чтобы
+синхронный и асинхронный обработчики ставили одинаковые задачи.
+"""
+
+from typing import Callable
+
+from loguru import logger
+
+from app.db import DBManager
+from app.media import ThumbnailService
+from app.storage import BlobStore, UnlinkQueue, get_storage
+from config import settings
+
+# Тип задачи -> функция, выполняющая её
+TASKS: dict[str, Callable[[dict], None]] = {}
+
+
+def task(kind: str):
+    """Регистрирует функцию как обработчик задач типа kind"""
+    def register(func: Callable[[dict], None]) -> Callable[[dict], None]:
+        TASKS[kind] = func
+        return func
+    return register
+
+
+def thumbnail_payloads(images: list[tuple]) -> list[dict]:
+    """payload задач thumbnails.generate для пар (filename, ключ оригинала в хранилище)"""
+    return [{'filename': filename, 'source': source} for filename, source in images]
+
+
+def unlink_payloads(deleted: list[tuple]) -> list[dict]:
+    """payload задач files.unlink для (id, filename, blob_hash) удалённых записей, по UNLINK_BATCH_SIZE в задаче"""
+    deleted = [list(row) for row in deleted]
+    return [{'images': deleted[start:start + settings.UNLINK_BATCH_SIZE]}
+            for start in range(0, len(deleted), settings.UNLINK_BATCH_SIZE)]
+
+
+@task('thumbnails.generate')
+def generate_thumbnails(payload: dict) -> None:
+    """Готовит уменьшенные копии ширин payload['widths'] (по умолчанию THUMBNAIL_SIZES)"""
+    service = ThumbnailService()
+    for width in payload.get('widths') or settings.THUMBNAIL_SIZES:
+        try:
+            service.get(payload['filename'], width, source=payload.get('source'))
+        except FileNotFoundError:
+            # Изображение успели удалить — делать нечего
+            logger.info(f"Image {payload['filename']} is gone, thumbnails skipped")
+            return
+
+
+@task('files.unlink')
+def unlink_files(payload: dict) -> None:
+    """Удаляет файлы удалённых записей, см. UnlinkQueue.unlink"""
+    UnlinkQueue.unlink([tuple(row) for row in payload['images']], purge_blobs=DBManager().purge_blobs)
+
+
+@task('images.revalidate')
+def revalidate_image(payload: dict) -> None:
+    """Заново определяет MIME-тип файла изображения и исправляет его в БД"""
+    # Пакет handlers сам импортирует этот модуль, поэтому импорт здесь
+    from app.handlers.FileHandler import FileHandler
+
+    filename = payload['filename']
+    db = DBManager()
+    row = db.get_image_file(filename)
+    if row is None:
+        return
+    mime_type, blob_hash = row
+    storage = get_storage()
+    key = BlobStore.key_for(blob_hash) if blob_hash else filename
+    if blob_hash and storage.stat(key) is None:
+        # Файл ещё не перенесён в BlobStore (см. app.storage.migrate)
+        key = filename
+    try:
+        detected = FileHandler.detect_mime(storage.read(key, 0, FileHandler.MAGIC_HEADER_SIZE))
+    except FileNotFoundError:
+        logger.warning(f'File of image {filename} is missing')
+        return
+    if detected not in settings.ALLOWED_MIME_TYPES:
+        logger.warning(f'Image {filename} has disallowed type {detected}')
+    if detected != mime_type:
+        db.set_mime_type(filename, detected)
@@ -0,0 +1,72 @@
+"""
+Запуск воркеров фоновых задач отдельно от HTTP-сервера.
+
+Запуск:
+    python -m app.jobs.worker [--threads 4] [--kind thumbnails.generate ...] [--once]
+    python -m app.jobs.worker --stats
+    python -m app.jobs.worker --retry-failed [--kind images.revalidate]
+    python -m app.jobs.worker --enqueue images.revalidate '{"filename": "<uuid>.jpg"}'
+"""
+
+import argparse
+import json
+import signal
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from app.db import DBManager
+from app.jobs.JobQueue import JobQueue
+from app.jobs.JobWorker import JobWorker
+from app.jobs.tasks import TASKS
+from config.logger_setup import setup_logger
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Воркеры фоновых задач (таблица jobs)')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='количество потоков (по умолчанию JOBS_WORKER_THREADS)')
+    parser.add_argument('--kind', action='append', choices=sorted(TASKS),
+                        help='выполнять только задачи этого типа (можно указать несколько раз)')
+    parser.add_argument('--once', action='store_true',
+                        help='выполнить готовые задачи и завершиться (например, из cron)')
+    parser.add_argument('--stats', action='store_true',
+                        help='показать количество задач по типам и статусам')
+    parser.add_argument('--retry-failed', action='store_true',
+                        help='вернуть в очередь задачи со статусом failed')
+    parser.add_argument('--enqueue', nargs='+', metavar=('KIND', 'PAYLOAD'),
+                        help='поставить задачу в очередь: тип и JSON с параметрами')
+    args = parser.parse_args()
+
+    load_dotenv()
+    setup_logger()
+    DBManager().init_tables()
+    queue = JobQueue()
+
+    try:
+        if args.stats:
+            print(json.dumps(queue.stats(), indent=2))
+        elif args.retry_failed:
+            for kind in args.kind or [None]:
+                queue.retry_failed(kind)
+        elif args.enqueue:
+            kind = args.enqueue[0]
+            if kind not in TASKS:
+                parser.error(f'unknown job kind {kind!r}')
+            payload = json.loads(args.enqueue[1]) if len(args.enqueue) > 1 else {}
+            logger.info(f'Enqueued job {queue.enqueue(kind, payload)} ({kind})')
+        else:
+            worker = JobWorker(threads=args.threads, kinds=args.kind)
+            # docker stop и Ctrl+C: дорабатываем текущие задачи и выходим
+            signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+            signal.signal(signal.SIGINT, lambda signum, frame: worker.stop())
+            if args.once:
+                logger.info(f'Processed {worker.run_once()} jobs')
+            else:
+                worker.run()
+    finally:
+        DBManager().close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+
+from loguru import logger
+
+from app.media.resize import render_stored_thumbnail, render_thumbnail
+from app.utils.singleton import SingletonMeta
+from config import settings
+
+
+class ThumbnailService(metaclass=SingletonMeta):
+    """
+    Уменьшенные копии изображений с кэшем на диске.
+
+    Копия ширины W для файла NAME хранится в THUMBS_PATH/W/NAME и
+    создаётся один раз: ширины из THUMBNAIL_SIZES — сразу после загрузки,
+    остальные (в пределах THUMBNAIL_MIN_WIDTH..THUMBNAIL_MAX_WIDTH) — при
+    первом запросе. Такие ширины округляются вверх до кратной
+    THUMBNAIL_WIDTH_STEP, чтобы у одной картинки было немного копий.
+    Уменьшение выполняется в пуле процессов, чтобы не занимать GIL потоков
+    сервера.
+
+    Одновременные запросы одной и той же копии не запускают работу
+    повторно: все ждут одну задачу из self._pending (single-flight).
+
+    Методы:
+        path_for(filename, width): путь к копии в кэше.
+        snap_width(width): ширина копии для запрошенной ширины или None.
+        widths(): все ширины, копии которых могут быть в кэше.
+        submit(filename, width, source): Future с путём к готовой копии.
+        (source — ключ оригинала в хранилище, см. submit)
+        get(filename, width, source, timeout): путь к готовой копии (ждёт генерацию).
+        generate_defaults(filename, source): ставит в очередь ширины из THUMBNAIL_SIZES.
+        delete(filename): удаляет все копии файла.
+    """
+
+    def __init__(self, root: str = None, workers: int = None):
+        self.root = root or settings.THUMBS_PATH
+        self.workers = max(1, workers or settings.THUMBNAIL_WORKERS)
+        self._executor = None
+        self._pid = None
+        self._pending = {}  # (ширина, имя файла) -> Future
+        self._lock = threading.RLock()  # add_done_callback может вызвать _finish сразу, под блокировкой
+
+    @staticmethod
+    def snap_width(width: int) -> int | None:
+        """
+        Ширина копии, которая отдаётся на запрос ширины width: сама width
+        для ширин из THUMBNAIL_SIZES, иначе ближайшая кратная
+        THUMBNAIL_WIDTH_STEP не меньше width (но не больше THUMBNAIL_MAX_WIDTH).
+        None — ширина вне допустимого диапазона.
+        """
+        if width in settings.THUMBNAIL_SIZES:
+            return width
+        if not settings.THUMBNAIL_MIN_WIDTH <= width <= settings.THUMBNAIL_MAX_WIDTH:
+            return None
+        step = settings.THUMBNAIL_WIDTH_STEP
+        return min(-(-width // step) * step, settings.THUMBNAIL_MAX_WIDTH)
+
+    @staticmethod
+    def widths() -> list[int]:
+        step = settings.THUMBNAIL_WIDTH_STEP
+        snapped = range(step, settings.THUMBNAIL_MAX_WIDTH + 1, step)
+        return sorted({*settings.THUMBNAIL_SIZES, *snapped, settings.THUMBNAIL_MAX_WIDTH})
+
+    def path_for(self, filename: str, width: int) -> str:
+        return os.path.join(self.root, str(width), os.path.basename(filename))
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Пул не переживает fork(): в воркерах prefork создаём свой
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            self._pid = os.getpid()
+            self._pending = {}
+        return self._executor
+
+    def submit(self, filename: str, width: int, source: str = None) -> Future:
+        """
+        Возвращает Future, который завершится путём к копии ширины width.
+
+        source — ключ оригинала в хранилище (app.storage.get_storage), если
+        он не совпадает с filename (STORAGE_MODE=cas). Оригинал с локального
+        диска процесс пула читает по пути, из удалённого хранилища — сам
+        скачивает в память. Если копия уже есть на диске, Future уже завершён.
+        """
+        # Пакет storage сам импортирует app.media (UnlinkQueue), поэтому импорт здесь
+        from app.storage.Storage import get_storage
+
+        filename = os.path.basename(filename)
+        dest = self.path_for(filename, width)
+        if os.path.isfile(dest):
+            done = Future()
+            done.set_result(dest)
+            return done
+
+        key = (width, filename)
+        with self._lock:
+            executor = self._get_executor()
+            future = self._pending.get(key)
+            if future is None:
+                source = source or filename
+                # Задачи thumbnails.generate, поставленные до появления хранилищ, содержат путь
+                path = source if os.path.isabs(source) else get_storage().local_path(source)
+                if path is not None:
+                    future = executor.submit(render_thumbnail, path, dest, width, settings.THUMBNAIL_QUALITY)
+                else:
+                    future = executor.submit(render_stored_thumbnail, source, dest, width, settings.THUMBNAIL_QUALITY)
+                self._pending[key] = future
+                future.add_done_callback(lambda f: self._finish(key, f))
+        return future
+
+    def _finish(self, key: tuple, future: Future) -> None:
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f'Cannot create thumbnail {key[0]}px for {key[1]}: {future.exception()}')
+
+    def get(self, filename: str, width: int, source: str = None, timeout: float = None) -> str:
+        """
+        Возвращает путь к копии ширины width, при необходимости дожидаясь её создания.
+
+        Исключения:
+            TimeoutError: копия не готова за timeout секунд
+            Exception: ошибка Pillow при обработке исходного файла
+        """
+        timeout = settings.THUMBNAIL_TIMEOUT if timeout is None else timeout
+        return self.submit(filename, width, source).result(timeout)
+
+    def generate_defaults(self, filename: str, source: str = None) -> None:
+        """Ставит в очередь копии всех ширин из THUMBNAIL_SIZES, не дожидаясь их"""
+        for width in settings.THUMBNAIL_SIZES:
+            self.submit(filename, width, source)
+
+    def delete(self, filename: str) -> None:
+        """Удаляет все копии файла (вызывается при удалении оригинала)"""
+        filename = os.path.basename(filename)
+        # Дожидаемся копий, которые ещё создаются, иначе они появятся после удаления
+        with self._lock:
+            pending = [f for (_, name), f in self._pending.items() if name == filename]
+        if pending:
+            wait(pending, timeout=settings.THUMBNAIL_TIMEOUT)
+
+        # Копии других ширин (созданные до округления) убирает app.storage.reconcile
+        for width in self.widths():
+            try:
+                os.remove(self.path_for(filename, width))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f'Cannot delete thumbnail {width}/{filename}: {e}')
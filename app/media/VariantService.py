@@ -0,0 +1,168 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+
+from loguru import logger
+from PIL import Image
+
+from app.media.resize import render_stored_variant, render_variant
+from app.utils.singleton import SingletonMeta
+from config import settings
+
+
+class VariantService(metaclass=SingletonMeta):
+    """
+    Копии изображений в WebP/AVIF для клиентов, которые их принимают.
+
+    Копия файла NAME в формате FMT с качеством Q хранится в
+    VARIANTS_PATH/FMT-Q/NAME.FMT: смена качества в VARIANT_QUALITY не отдаёт
+    старые копии. Копия создаётся в пуле процессов при первом запросе; пока
+    её нет, клиенту отдаётся оригинал (lookup не ждёт перекодирования).
+    Одновременные запросы одной копии не запускают работу повторно
+    (single-flight, как в ThumbnailService).
+
+    Методы:
+        applies_to(mime_type): перекодируются ли картинки этого типа.
+        negotiate(accept): лучший формат из заголовка Accept или None.
+        lookup(filename, image_format, size, source): путь к готовой копии или None.
+        submit(filename, image_format, source): Future с путём к копии.
+        delete(filename): удаляет все копии файла.
+    """
+
+    CONTENT_TYPES = {'webp': 'image/webp', 'avif': 'image/avif'}
+
+    def __init__(self, root: str = None, workers: int = None):
+        self.root = root or settings.VARIANTS_PATH
+        self.workers = max(1, workers or settings.VARIANT_WORKERS)
+        # Форматы, которые умеет сохранять установленный Pillow (AVIF — с 11.3)
+        Image.init()
+        self.formats = tuple(f for f in settings.VARIANT_FORMATS
+                             if f in self.CONTENT_TYPES and f.upper() in Image.SAVE)
+        self._executor = None
+        self._pid = None
+        self._pending = {}  # (формат, имя файла) -> Future
+        self._lock = threading.RLock()
+
+    def applies_to(self, mime_type: str) -> bool:
+        return settings.VARIANTS_ENABLED and bool(self.formats) and mime_type in settings.VARIANT_SOURCE_TYPES
+
+    def negotiate(self, accept: str | None) -> str | None:
+        """
+        Выбирает формат копии по заголовку Accept: первый из self.formats,
+        который клиент назвал явно и без q=0. image/* и */* не учитываются —
+        их присылают и клиенты, не понимающие WebP.
+        """
+        if not accept:
+            return None
+        accepted = set()
+        for item in accept.split(','):
+            media_type, *params = item.split(';')
+            if not any(self._is_zero_quality(param) for param in params):
+                accepted.add(media_type.strip().lower())
+        for image_format in self.formats:
+            if self.CONTENT_TYPES[image_format] in accepted:
+                return image_format
+        return None
+
+    @staticmethod
+    def _is_zero_quality(param: str) -> bool:
+        """q=0 в параметрах Accept — клиент явно отказывается от типа"""
+        name, _, value = param.partition('=')
+        if name.strip().lower() != 'q':
+            return False
+        try:
+            return float(value) == 0
+        except ValueError:
+            return False
+
+    def relative_path(self, filename: str, image_format: str) -> str:
+        quality = settings.VARIANT_QUALITY[image_format]
+        return f'{image_format}-{quality}/{os.path.basename(filename)}.{image_format}'
+
+    def path_for(self, filename: str, image_format: str) -> str:
+        return os.path.join(self.root, self.relative_path(filename, image_format))
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Пул не переживает fork(): в воркерах prefork создаём свой
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            self._pid = os.getpid()
+            self._pending = {}
+        return self._executor
+
+    def lookup(self, filename: str, image_format: str, size: int, source: str = None) -> tuple[str | None, bool]:
+        """
+        Ищет готовую копию, не дожидаясь перекодирования.
+
+        Возвращает пару (путь, pending): путь — копия, которую можно отдать,
+        или None, если отдавать нужно оригинал; pending — копия ещё
+        создаётся (её создание ставится в пул при первом промахе). Копия,
+        которая вышла не меньше оригинала size, не отдаётся.
+        """
+        path = self.path_for(filename, image_format)
+        try:
+            variant_size = os.stat(path).st_size
+        except FileNotFoundError:
+            self.submit(filename, image_format, source)
+            return None, True
+        return (path if variant_size < size else None), False
+
+    def submit(self, filename: str, image_format: str, source: str = None) -> Future:
+        """
+        Возвращает Future, который завершится путём к копии в формате image_format.
+
+        source — ключ оригинала в хранилище, см. ThumbnailService.submit.
+        """
+        # Пакет storage сам импортирует app.media (UnlinkQueue), поэтому импорт здесь
+        from app.storage.Storage import get_storage
+
+        filename = os.path.basename(filename)
+        dest = self.path_for(filename, image_format)
+        quality = settings.VARIANT_QUALITY[image_format]
+        key = (image_format, filename)
+        with self._lock:
+            executor = self._get_executor()
+            future = self._pending.get(key)
+            if future is None:
+                source = source or filename
+                path = get_storage().local_path(source)
+                if path is not None:
+                    future = executor.submit(render_variant, path, dest, image_format, quality)
+                else:
+                    future = executor.submit(render_stored_variant, source, dest, image_format, quality)
+                self._pending[key] = future
+                future.add_done_callback(lambda f: self._finish(key, f))
+        return future
+
+    def _finish(self, key: tuple, future: Future) -> None:
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f'Cannot create {key[0]} variant of {key[1]}: {future.exception()}')
+
+    def delete(self, filename: str) -> None:
+        """Удаляет все копии файла (вызывается при удалении оригинала)"""
+        filename = os.path.basename(filename)
+        with self._lock:
+            pending = [f for (_, name), f in self._pending.items() if name == filename]
+        if pending:
+            wait(pending, timeout=settings.THUMBNAIL_TIMEOUT)
+
+        if not os.path.isdir(self.root):
+            return
+        for entry in os.scandir(self.root):
+            if not entry.is_dir():
+                continue
+            # Каталоги копий называются <формат>-<качество>
+            image_format = entry.name.partition('-')[0]
+            try:
+                os.remove(os.path.join(entry.path, f'{filename}.{image_format}'))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f'Cannot delete variant {entry.name}/{filename}: {e}')
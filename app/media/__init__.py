@@ -0,0 +1,8 @@
+"""
+Пакет media - обработка изображений (уменьшенные копии, копии в WebP/AVIF).
+"""
+
+from app.media.ThumbnailService import ThumbnailService
+from app.media.VariantService import VariantService
+
+__all__ = ['ThumbnailService', 'VariantService']
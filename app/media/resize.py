@@ -0,0 +1,92 @@
+"""
+Уменьшение изображений и перекодирование в WebP/AVIF.
+
+Функции этого модуля выполняются в отдельных процессах пулов ThumbnailService
+и VariantService, поэтому модуль импортирует только Pillow и ничего из
+приложения (хранилище — только render_stored_* и только при вызове).
+"""
+
+import io
+import os
+
+from PIL import Image, ImageOps
+
+
+def render_thumbnail(source, dest: str, width: int, quality: int = 85) -> str:
+    """
+    Сохраняет копию source (путь или файловый объект) шириной не больше
+    width с сохранением пропорций.
+
+    Картинка поворачивается по EXIF, формат сохраняется исходный (для
+    анимированных GIF берётся первый кадр). Файл пишется во временный и
+    переименовывается, поэтому читатели никогда не видят его недописанным.
+
+    Возвращает:
+        str: путь dest
+    """
+    with Image.open(source) as image:
+        image_format = image.format
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((width, width * 100), Image.Resampling.LANCZOS)
+
+        save_options = {}
+        if image_format == 'JPEG':
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            save_options = {'quality': quality, 'optimize': True, 'progressive': True}
+        elif image_format == 'PNG':
+            save_options = {'optimize': True}
+
+        _save(image, dest, image_format, save_options)
+    return dest
+
+
+def render_stored_thumbnail(key: str, dest: str, width: int, quality: int = 85) -> str:
+    """Как render_thumbnail, но оригинал скачивается из хранилища (S3Storage) в память процесса пула"""
+    from app.storage.Storage import get_storage
+
+    return render_thumbnail(io.BytesIO(get_storage().read(key)), dest, width, quality)
+
+
+def render_variant(source, dest: str, image_format: str, quality: int) -> str:
+    """
+    Сохраняет source (путь или файловый объект) в формате image_format
+    ('webp' или 'avif') без изменения размеров.
+
+    Картинка поворачивается по EXIF; прозрачность сохраняется, анимация
+    (APNG) — тоже, кадр за кадром. Файл пишется так же, как в
+    render_thumbnail: через временный и переименование.
+
+    Возвращает:
+        str: путь dest
+    """
+    with Image.open(source) as image:
+        # Кадры анимации кодировщик переводит в RGB(A) сам; convert() оставил бы только первый
+        animated = getattr(image, 'is_animated', False)
+        if not animated:
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ('RGB', 'RGBA'):
+                transparent = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+                image = image.convert('RGBA' if transparent else 'RGB')
+        _save(image, dest, image_format.upper(), {'quality': quality, 'save_all': animated})
+    return dest
+
+
+def render_stored_variant(key: str, dest: str, image_format: str, quality: int) -> str:
+    """Как render_variant, но оригинал скачивается из хранилища (S3Storage) в память процесса пула"""
+    from app.storage.Storage import get_storage
+
+    return render_variant(io.BytesIO(get_storage().read(key)), dest, image_format, quality)
+
+
+def _save(image: Image.Image, dest: str, image_format: str, save_options: dict) -> None:
+    """Пишет картинку во временный файл рядом с dest и переименовывает его в dest"""
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    directory, name = os.path.split(dest)
+    tmp_path = os.path.join(directory, f'.tmp-{os.getpid()}-{name}')
+    try:
+        image.save(tmp_path, format=image_format, **save_options)
+        os.replace(tmp_path, dest)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -1,60 +1,112 @@
+import inspect
 import re
+import threading
 from loguru import logger
 from app.utils.singleton import SingletonMeta
 
+
+class Route:
+    """
+    Зарегистрированный маршрут.
+
+    Сигнатура обработчика разбирается один раз при регистрации: call()
+    передаёт обработчику только те параметры пути, которые он принимает
+    (или все, если он принимает **kwargs).
+
+    Атрибуты:
+        method (str): HTTP-метод
+        path (str): шаблон пути, например '/images/<filename>'
+        handler (callable): функция-обработчик
+    """
+    __slots__ = ('method', 'path', 'handler', '_accepts_all', '_accepted')
+
+    def __init__(self, method: str, path: str, handler: callable):
+        self.method = method
+        self.path = path
+        self.handler = handler
+
+        try:
+            parameters = list(inspect.signature(handler).parameters.values())[1:]
+        except (TypeError, ValueError):
+            # Сигнатуру не удалось получить — передаём все параметры
+            parameters = [inspect.Parameter('kwargs', inspect.Parameter.VAR_KEYWORD)]
+        self._accepts_all = any(p.kind == p.VAR_KEYWORD for p in parameters)
+        self._accepted = frozenset(
+            p.name for p in parameters
+            if p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY)
+        )
+
+    def call(self, handler_instance, params: dict):
+        """Вызывает обработчик с подходящими ему параметрами пути"""
+        if self._accepts_all:
+            return self.handler(handler_instance, **params)
+        return self.handler(handler_instance, **{k: v for k, v in params.items() if k in self._accepted})
+
+
+class RouteMatch:
+    """
+    Результат поиска маршрута.
+
+    Атрибуты:
+        route (Route | None): найденный маршрут или None
+        params (dict): параметры из пути
+        allowed (frozenset): методы, доступные для этого пути (для 405 и заголовка Allow)
+    """
+    __slots__ = ('route', 'params', 'allowed')
+
+    def __init__(self, route: Route | None, params: dict, allowed: frozenset):
+        self.route = route
+        self.params = params
+        self.allowed = allowed
+
+
+class _Node:
+    """Узел дерева сегментов пути"""
+    __slots__ = ('children', 'patterns', 'param', 'catch_all', 'routes', 'allowed')
+
+    def __init__(self):
+        self.children = {}    # точный сегмент -> _Node
+        self.patterns = []    # [(regex, _Node)] для сегментов вида 'file-<id>.png'
+        self.param = None     # (имя, _Node) для сегмента '<name>'
+        self.catch_all = None  # (имя, _Node) для '<path:name>' — остаток пути целиком
+        self.routes = {}      # метод -> Route
+        self.allowed = frozenset()
+
+
 class Router(metaclass=SingletonMeta):
     """
     Класс Router реализует маршрутизатор (router) для обработки HTTP-запросов.
-    
+
     Работает по принципу:
     - Принимает HTTP-метод и путь (например, 'GET', '/users/<id>')
-    - Преобразует путь в регулярное выражение
-    - Хранит соответствие между методом, путем и функцией-обработчиком
-    - Позволяет найти подходящий обработчик по методу и пути
+    - Пути без параметров хранятся в словаре: поиск за O(1)
+    - Пути с параметрами раскладываются по сегментам в дерево: поиск
+      идёт по сегментам запроса, а не перебором всех регулярных выражений
+    - Для каждого пути заранее известен набор методов — из него строится
+      ответ 405 и заголовок Allow
 
     Этот класс использует паттерн Singleton — создаётся один-единственный экземпляр.
 
-    Атрибуты:
-        routes (dict): Словарь с ключами HTTP-методов ('GET', 'POST' и т.п.), 
-                       значениями являются словари с паттернами (regex) и обработчиками.
+    Таблица маршрутов обновляется по принципу copy-on-write: add_route собирает
+    новые структуры под блокировкой и подменяет старые одной операцией, поэтому
+    match из рабочих потоков никогда не видит таблицу в процессе изменения.
 
     Методы:
         add_route(method, path, handler): Добавляет новый маршрут в маршрутизатор.
+        match(method, path): Ищет маршрут и возвращает RouteMatch.
         resolve(method, path): Ищет подходящий обработчик по методу и пути.
-        convert_path_to_regex(path): Преобразует путь с параметрами (например, '/user/<id>')
-                                     в регулярное выражение.
     """
-    
-    def __init__(self):
-        self.routes = {
-            'GET': {},
-            'POST': {},
-            'HEAD': {},
-            'PUT': {},
-            'PATCH': {},
-            'DELETE': {}
-        }
 
-    @staticmethod
-    def convert_path_to_regex(path: str):
-        """
-        Преобразует путь с параметрами (например, /users/<id>) в регулярное выражение.
+    METHODS = ('GET', 'POST', 'HEAD', 'PUT', 'PATCH', 'DELETE')
 
-        Аргументы:
-            path (str): путь, возможно с параметрами в угловых скобках
+    def __init__(self):
+        self._static = {}   # путь -> _Node (используются только routes и allowed)
+        self._root = _Node()
+        self._lock = threading.Lock()
 
-        Возвращает:
-            str: регулярное выражение для поиска совпадений
-        """
-        # Специальный случай для <path:path> - захват всего пути
-        if '<path:path>' in path:
-            base_path = path.split('<path:path>')[0]
-            # Создаем регулярное выражение для захвата всего пути после указанного префикса
-            return f'^{base_path}(?P<path>.+)$'
-            
-        # Обычные параметры в угловых скобках
-        regex = re.sub(r'<(\w+)>', r'(?P<\1>[^/]+)', path)
-        return f'^{regex}$'
+    @staticmethod
+    def _is_static(path: str) -> bool:
+        return '<' not in path
 
     def add_route(self, method: str, path: str, handler: callable) -> None:
         """
@@ -62,17 +114,57 @@ class Router(metaclass=SingletonMeta):
 
         Аргументы:
             method (str): HTTP-метод (GET, POST и т.д.)
-            path (str): путь маршрута (возможно, с параметрами в виде <param>)
+            path (str): путь маршрута (возможно, с параметрами в виде <param>
+                        или <path:param> для остатка пути)
             handler (callable): функция-обработчик, вызываемая при совпадении
         """
-        regex_pattern = self.convert_path_to_regex(path)
-        pattern = re.compile(regex_pattern)
+        if method not in self.METHODS:
+            raise ValueError(f'Unsupported HTTP method: {method}')
+        route = Route(method, path, handler)
+
+        with self._lock:
+            if self._is_static(path):
+                static = dict(self._static)
+                node = _copy_node(static.get(path) or _Node())
+                static[path] = node
+                _add_to_node(node, route)
+                self._static = static
+            else:
+                self._root = _insert(self._root, _split(path), route)
 
-        self.routes[method][pattern] = handler
         # Выводим только имя функции, а не всю функцию
         handler_name = handler.__name__ if hasattr(handler, '__name__') else str(handler)
         logger.info(f'Added route: {method} {path} -> {handler_name}')
 
+    def match(self, method: str, path: str) -> RouteMatch:
+        """
+        Ищет маршрут по HTTP-методу и пути.
+
+        Аргументы:
+            method (str): HTTP-метод запроса
+            path (str): путь запроса (параметры запроса после '?' отбрасываются)
+
+        Возвращает:
+            RouteMatch: route=None и пустой allowed — 404,
+                        route=None и непустой allowed — 405.
+        """
+        path = path.split('?', 1)[0]
+
+        static = self._static.get(path)
+        if static is not None and method in static.routes:
+            return RouteMatch(static.routes[method], {}, static.allowed)
+
+        segments = _split(path)
+        found = _search(self._root, segments, 0, {}, method)
+        if found is not None:
+            node, params = found
+            return RouteMatch(node.routes[method], params, node.allowed)
+
+        # Метод не подошёл — собираем методы всех совпавших путей для 405
+        allowed = set(static.allowed) if static is not None else set()
+        _collect_allowed(self._root, segments, 0, allowed)
+        return RouteMatch(None, {}, frozenset(allowed))
+
     def resolve(self, method: str, path: str) -> tuple[callable, dict] | tuple[None, str]:
         """
         Ищет подходящий обработчик по HTTP-методу и пути.
@@ -82,30 +174,114 @@ class Router(metaclass=SingletonMeta):
             path (str): путь запроса (например, '/users/123')
 
         Возвращает:
-            (handler, параметры): если маршрут найден
             tuple[callable, dict]: если найден маршрут — кортеж из обработчика и словаря параметров пути.
             tuple[None, str]: если маршрут не найден — кортеж из None и строки ошибки:
                             '404 Not Found' или '405 Method Not Allowed'.
         """
-        # Убираем параметры запроса (query params), если они есть
-        path_without_query = path.split('?')[0]
-
-        if method not in self.routes:
+        result = self.match(method, path)
+        if result.route is not None:
+            return result.route.handler, result.params
+        if result.allowed:
             return None, '405 Method Not Allowed'
-        
-        # Сначала ищем статические точные совпадения
-        for pattern, handler in self.routes[method].items():
-            match = pattern.match(path_without_query)
-            if match:
-                return handler, match.groupdict()
-    
-        # Если не нашли — проверим, может такой путь есть в других методах (405)
-        for other_method, patterns in self.routes.items():
-            if other_method == method:
-                continue
-            for pattern in patterns:
-                if pattern.match(path_without_query):
-                    return None, '405 Method Not Allowed'
-        
-        # Если нигде не нашли — 404
-        return None, '404 Not Found'
\ No newline at end of file
+        return None, '404 Not Found'
+
+
+def _split(path: str) -> list[str]:
+    return path[1:].split('/') if path.startswith('/') else path.split('/')
+
+
+def _copy_node(node: _Node) -> _Node:
+    copy = _Node()
+    copy.children = dict(node.children)
+    copy.patterns = list(node.patterns)
+    copy.param = node.param
+    copy.catch_all = node.catch_all
+    copy.routes = dict(node.routes)
+    copy.allowed = node.allowed
+    return copy
+
+
+def _add_to_node(node: _Node, route: Route) -> None:
+    node.routes[route.method] = route
+    node.allowed = frozenset(node.routes)
+
+
+_PARAM = re.compile(r'^<(\w+)>$')
+_CATCH_ALL = re.compile(r'^<path:(\w+)>$')
+
+
+def _insert(node: _Node, segments: list[str], route: Route) -> _Node:
+    """Возвращает копию node с добавленным маршрутом (исходный узел не меняется)"""
+    node = _copy_node(node)
+    if not segments:
+        _add_to_node(node, route)
+        return node
+
+    segment, rest = segments[0], segments[1:]
+    catch_all = _CATCH_ALL.match(segment)
+    param = _PARAM.match(segment)
+
+    if catch_all:
+        if rest:
+            raise ValueError(f'<path:...> must be the last segment: {route.path}')
+        name = catch_all.group(1)
+        child = node.catch_all[1] if node.catch_all else _Node()
+        node.catch_all = (name, _insert(child, [], route))
+    elif param:
+        name = param.group(1)
+        if node.param and node.param[0] != name:
+            raise ValueError(f'Conflicting parameter names <{node.param[0]}> and <{name}> in {route.path}')
+        child = node.param[1] if node.param else _Node()
+        node.param = (name, _insert(child, rest, route))
+    elif '<' in segment:
+        regex = re.compile('^' + re.sub(r'<(\w+)>', r'(?P<\1>.+?)', segment) + '$')
+        for i, (existing, child) in enumerate(node.patterns):
+            if existing.pattern == regex.pattern:
+                node.patterns[i] = (existing, _insert(child, rest, route))
+                break
+        else:
+            node.patterns.append((regex, _insert(_Node(), rest, route)))
+    else:
+        node.children[segment] = _insert(node.children.get(segment) or _Node(), rest, route)
+    return node
+
+
+def _candidates(node: _Node, segments: list[str], index: int):
+    """
+    Перебирает варианты продолжения пути в порядке приоритета:
+    точный сегмент, сегмент-шаблон, параметр, остаток пути.
+    """
+    segment = segments[index]
+    child = node.children.get(segment)
+    if child is not None:
+        yield child, index + 1, None
+    for regex, child in node.patterns:
+        found = regex.match(segment)
+        if found:
+            yield child, index + 1, found.groupdict()
+    if node.param and segment:
+        name, child = node.param
+        yield child, index + 1, {name: segment}
+    if node.catch_all:
+        rest = '/'.join(segments[index:])
+        if rest:
+            name, child = node.catch_all
+            yield child, len(segments), {name: rest}
+
+
+def _search(node: _Node, segments: list[str], index: int, params: dict, method: str):
+    if index == len(segments):
+        return (node, params) if method in node.routes else None
+    for child, next_index, captured in _candidates(node, segments, index):
+        found = _search(child, segments, next_index, {**params, **captured} if captured else params, method)
+        if found is not None:
+            return found
+    return None
+
+
+def _collect_allowed(node: _Node, segments: list[str], index: int, allowed: set) -> None:
+    if index == len(segments):
+        allowed.update(node.allowed)
+        return
+    for child, next_index, _ in _candidates(node, segments, index):
+        _collect_allowed(child, segments, next_index, allowed)
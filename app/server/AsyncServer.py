@@ -0,0 +1,209 @@
+import asyncio
+import inspect
+import logging
+import os
+import signal
+import weakref
+
+from aiohttp import web
+from aiohttp.abc import AbstractAccessLogger
+from loguru import logger
+
+from app.db.AsyncDBManager import AsyncDBManager
+from app.router import Router
+from app.server.ServerRunner import run_prefork
+from app.utils import metrics, profiling
+from app.utils.access_log import AccessLog
+from app.utils.compression import compress_dynamic, dynamic_encoding
+from config import settings
+
+
+class _AccessLogger(AbstractAccessLogger):
+    """
+    Учитывает запрос в метриках (app.utils.metrics) и журнале доступа (AccessLog).
+
+    aiohttp вызывает log() после отправки ответа, поэтому здесь известны
+    полное время запроса и число отправленных байт, в том числе для
+    FileResponse.
+    """
+
+    def log(self, request: web.BaseRequest, response: web.StreamResponse, time: float) -> None:
+        route = request.get('route')
+        request_bytes = request.content_length or 0
+        metrics.observe_request(request.method, route, response.status, time,
+                                request_bytes, response.body_length)
+        protocol = f'HTTP/{request.version.major}.{request.version.minor}'
+        AccessLog().record(request.method, request.path_qs, protocol, route, response.status, time,
+                           request_bytes, response.body_length, request.remote, request.headers)
+
+
+class AsyncServer:
+    """
+    Асинхронный бэкенд сервера на aiohttp.
+
+    Все запросы попадают в один обработчик aiohttp, который ищет маршрут
+    в том же Router, что и синхронный сервер, и вызывает метод
+    AsyncImageHostingHandler. Для режима prefork каждый воркер запускает
+    собственный цикл событий и слушает порт с reuse_port.
+
+    Аргументы:
+        handler_class: класс асинхронного обработчика запросов
+        address (tuple): адрес и порт для прослушивания
+        mode (str): режим работы сервера (single, threaded, prefork)
+        workers (int): количество процессов для режима prefork
+    """
+
+    # С какого размера тело ответа сжимается не в цикле событий, а в потоке
+    COMPRESS_IN_THREAD_SIZE = 64 * 1024
+
+    def __init__(self, handler_class,
+                 address: tuple = settings.SERVER_ADDRESS,
+                 mode: str = settings.SERVER_MODE,
+                 workers: int = settings.SERVER_WORKERS):
+        self.handler_class = handler_class
+        self.address = address
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.router = Router()
+        # Сколько запросов обслужено на каждом соединении, см. _limit_keepalive
+        self._requests_served = weakref.WeakKeyDictionary()
+
+    def run(self) -> None:
+        """Запускает сервер и блокируется до остановки"""
+        # Таблицы создаём один раз, до запуска воркеров
+        asyncio.run(self._init_db())
+        if self.mode == 'prefork':
+            run_prefork(lambda: asyncio.run(self._serve(reuse_port=True)), self.workers)
+        else:
+            asyncio.run(self._serve(reuse_port=False))
+
+    @staticmethod
+    async def _init_db() -> None:
+        db = AsyncDBManager()
+        await db.connect()
+        try:
+            await db.init_tables()
+        finally:
+            await db.close()
+
+    def build_app(self) -> web.Application:
+        app = web.Application(client_max_size=settings.ALLOWED_LENGTH * 2)
+        app.router.add_route('*', '/{tail:.*}', self.dispatch)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    @staticmethod
+    async def _on_startup(app: web.Application) -> None:
+        await AsyncDBManager().connect()
+
+    @staticmethod
+    async def _on_cleanup(app: web.Application) -> None:
+        await AsyncDBManager().close()
+
+    async def dispatch(self, request: web.Request) -> web.StreamResponse:
+        """Находит маршрут в Router и вызывает соответствующий метод обработчика"""
+        trace = profiling.begin(request.method, request.path_qs, request.headers)
+        if trace is None:
+            return self._limit_keepalive(request, await self._compress(request, await self._call(request)))
+        status = 500
+        try:
+            response = await self._compress(request, await self._call(request))
+            status = response.status
+            return self._limit_keepalive(request, response)
+        finally:
+            profiling.end(trace, request.get('route'), status)
+
+    def _limit_keepalive(self, request: web.Request, response: web.StreamResponse) -> web.StreamResponse:
+        """
+        Закрывает соединение после SERVER_KEEPALIVE_MAX_REQUESTS запросов, как синхронный сервер.
+
+        Простой между запросами ограничивает сам aiohttp (keepalive_timeout),
+        а непрочитанное тело запроса он дочитывает или закрывает соединение.
+        """
+        transport = request.transport
+        if transport is None:
+            return response
+        served = self._requests_served.get(transport, 0) + 1
+        self._requests_served[transport] = served
+        if settings.SERVER_KEEPALIVE_TIMEOUT <= 0 or served >= settings.SERVER_KEEPALIVE_MAX_REQUESTS:
+            response.force_close()
+        return response
+
+    async def _compress(self, request: web.Request, response: web.StreamResponse) -> web.StreamResponse:
+        """
+        Сжимает тело ответа из памяти по Accept-Encoding, как send_body синхронного сервера.
+
+        Файлы (FileResponse) и статика с ETag (у неё свои заранее сжатые
+        варианты) не трогаются. Большое тело сжимается в потоке, чтобы не
+        останавливать цикл событий.
+        """
+        if type(response) is not web.Response or not isinstance(response.body, bytes) or 'ETag' in response.headers:
+            return response
+        body = response.body
+        encoding = dynamic_encoding(request.headers.get('Accept-Encoding'), response.content_type,
+                                    response.status, response.headers, len(body))
+        if encoding:
+            if len(body) >= self.COMPRESS_IN_THREAD_SIZE:
+                response.body = await asyncio.to_thread(compress_dynamic, body, encoding)
+            else:
+                response.body = compress_dynamic(body, encoding)
+        return response
+
+    async def _call(self, request: web.Request) -> web.StreamResponse:
+        response = await self._dispatch(request)
+        # Заголовки по умолчанию — у всех ответов, в том числе 404, 405 и 500
+        response.headers.setdefault('Server', self.handler_class.server_version)
+        response.headers.setdefault('Access-Control-Allow-Origin', '*')
+        # Как и в синхронном сервере: без политики от маршрута ответ считается динамическим
+        response.headers.setdefault('Cache-Control', settings.DEFAULT_CACHE_CONTROL)
+        return response
+
+    async def _dispatch(self, request: web.Request) -> web.StreamResponse:
+        handler_instance = self.handler_class(request)
+        try:
+            # Путь без декодирования, как в синхронном сервере: иначе %2F
+            # в имени файла разбивал бы сегмент, а %3F обрезал бы путь
+            match = self.router.match(request.method, request.rel_url.raw_path)
+
+            if match.route is None:
+                if match.allowed:
+                    response = await handler_instance.handle_error(405, 'Method Not Allowed')
+                    response.headers['Allow'] = ', '.join(sorted(match.allowed))
+                    return response
+                return await handler_instance.handle_error(404, 'Not Found')
+
+            # Шаблон маршрута для метрик и журнала доступа, см. _AccessLogger
+            request['route'] = match.route.path
+            response = match.route.call(handler_instance, match.params)
+            if inspect.isawaitable(response):
+                response = await response
+            return response
+        except Exception as e:
+            return await handler_instance.handle_error(500, f'Internal Server Error: {str(e)}')
+
+    async def _serve(self, reuse_port: bool) -> None:
+        # Вместо журнала доступа aiohttp — метрики и AccessLog (см. _AccessLogger)
+        if metrics.enabled() or settings.ACCESS_LOG_ENABLED:
+            runner = web.AppRunner(self.build_app(), access_log_class=_AccessLogger,
+                                   access_log=logging.getLogger('aiohttp.access'),
+                                   keepalive_timeout=settings.SERVER_KEEPALIVE_TIMEOUT)
+        else:
+            runner = web.AppRunner(self.build_app(), access_log=None,
+                                   keepalive_timeout=settings.SERVER_KEEPALIVE_TIMEOUT)
+        await runner.setup()
+        site = web.TCPSite(runner, self.address[0], self.address[1], reuse_port=reuse_port)
+        await site.start()
+        logger.info(f"Serving at http://{self.address[0]}:{self.address[1]} "
+                    f"(backend: async, mode: {self.mode}, pid: {os.getpid()})")
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        try:
+            await stop.wait()
+        finally:
+            logger.info(f'Server stopped (pid: {os.getpid()})')
+            await runner.cleanup()
+            await asyncio.to_thread(AccessLog().flush, 5)
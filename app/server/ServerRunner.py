@@ -0,0 +1,171 @@
+import os
+import signal
+import socket
+import time
+from http.server import HTTPServer, ThreadingHTTPServer
+
+from loguru import logger
+
+from app.utils.access_log import AccessLog
+from config import settings
+
+
+class ThreadingImageServer(ThreadingHTTPServer):
+    """
+    HTTP-сервер, обрабатывающий каждый запрос в отдельном потоке.
+
+    Медленная загрузка большого файла больше не блокирует остальные запросы:
+    пока один поток читает тело запроса, другие отдают галерею и картинки.
+    """
+    daemon_threads = True
+    request_queue_size = settings.SERVER_REQUEST_QUEUE_SIZE
+
+
+class ReusePortHTTPServer(ThreadingImageServer):
+    """
+    Многопоточный сервер, который открывает порт с опцией SO_REUSEPORT.
+
+    Несколько процессов могут слушать один и тот же адрес, а ядро
+    распределяет входящие соединения между ними.
+    """
+
+    def server_bind(self):
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+class ServerRunner:
+    """
+    Запускает HTTP-сервер в одном из режимов из settings.SERVER_MODE.
+
+    Режимы:
+        single   — HTTPServer, запросы обрабатываются по одному
+        threaded — ThreadingHTTPServer, поток на запрос
+        prefork  — SERVER_WORKERS процессов с общим портом через SO_REUSEPORT
+
+    Аргументы:
+        handler_class: класс-обработчик запросов
+        address (tuple): адрес и порт для прослушивания
+        mode (str): режим работы сервера
+        workers (int): количество процессов для режима prefork
+    """
+    MODES = ('single', 'threaded', 'prefork')
+
+    def __init__(self, handler_class,
+                 address: tuple = settings.SERVER_ADDRESS,
+                 mode: str = settings.SERVER_MODE,
+                 workers: int = settings.SERVER_WORKERS):
+        if mode not in self.MODES:
+            raise ValueError(f'Unknown server mode: {mode}. Expected one of {self.MODES}')
+        self.handler_class = handler_class
+        self.address = address
+        self.mode = mode
+        self.workers = max(1, workers)
+
+    def run(self) -> None:
+        """Запускает сервер в выбранном режиме и блокируется до остановки"""
+        if self.mode == 'prefork':
+            run_prefork(self._serve_worker, self.workers)
+            return
+
+        signal.signal(signal.SIGTERM, _raise_system_exit)
+        if self.mode == 'threaded':
+            self._serve(ThreadingImageServer(self.address, self.handler_class))
+        else:
+            self._serve(HTTPServer(self.address, self.handler_class))
+
+    def _serve_worker(self) -> None:
+        self._serve(ReusePortHTTPServer(self.address, self.handler_class))
+
+    def _serve(self, httpd: HTTPServer) -> None:
+        try:
+            logger.info(f"Serving at http://{self.address[0]}:{self.address[1]} "
+                        f"(mode: {self.mode}, pid: {os.getpid()})")
+            httpd.serve_forever()
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            logger.info(f'Server stopped (pid: {os.getpid()})')
+            httpd.server_close()
+            # Воркер prefork завершается через os._exit — дописываем журнал доступа сами
+            AccessLog().flush(timeout=5)
+
+
+def run_prefork(target, workers: int) -> None:
+    """
+    Запускает target в workers дочерних процессах и следит за ними.
+
+    Родительский процесс не обслуживает запросы: он перезапускает
+    упавших воркеров, по SIGTERM/SIGINT останавливает всех, а SIGHUP
+    пересылает воркерам (в них остаётся обработчик SIGHUP, который был
+    установлен до вызова run_prefork).
+
+    Аргументы:
+        target (callable): функция, которую выполняет каждый воркер
+        workers (int): количество воркеров
+    """
+    children = {}
+    stopping = False
+    child_sighup = signal.getsignal(signal.SIGHUP)
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            # Дочерний процесс: SIGTERM завершает serve_forever через SystemExit
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, _raise_system_exit)
+            signal.signal(signal.SIGHUP, child_sighup)
+            code = 0
+            try:
+                target()
+            except BaseException as e:
+                logger.exception(f'Worker {os.getpid()} crashed: {e}')
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = slot
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def forward_sighup(signum, frame):
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGHUP)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGHUP, forward_sighup)
+
+    for slot in range(workers):
+        spawn(slot)
+    logger.info(f'Started {workers} worker processes: {sorted(children)}')
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is None or stopping:
+            continue
+        logger.warning(f'Worker {pid} exited with status {status}, restarting')
+        # Небольшая пауза, чтобы не перезапускать воркер в бесконечном цикле
+        time.sleep(1)
+        spawn(slot)
+
+    logger.info('All workers stopped')
+
+
+def _raise_system_exit(signum, frame):
+    raise SystemExit(0)
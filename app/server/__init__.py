@@ -0,0 +1,7 @@
+"""
+Пакет server - запуск HTTP-сервера в разных режимах.
+"""
+
+from app.server.ServerRunner import ServerRunner, ThreadingImageServer, ReusePortHTTPServer
+
+__all__ = ['ServerRunner', 'ThreadingImageServer', 'ReusePortHTTPServer']
@@ -0,0 +1,71 @@
+import hashlib
+import os
+
+from loguru import logger
+
+from app.storage.Storage import get_storage
+from app.utils.singleton import SingletonMeta
+from config import settings
+
+
+class BlobStore(metaclass=SingletonMeta):
+    """
+    Хранилище файлов по хэшу содержимого (STORAGE_MODE=cas).
+
+    Файл с SHA-256 'abcdef...' хранится под ключом ab/cd/abcdef... (в
+    LocalStorage — IMAGES_PATH/ab/cd/abcdef...): в каждой директории не
+    больше нескольких сотен записей даже при миллионах файлов.
+    Одинаковые загрузки хранятся один раз; сколько записей images ссылается
+    на файл, учитывает таблица blobs (см. DBManager.add_image и
+    DBManager._release_blob).
+
+    Аргументы:
+        root (str): корневая директория для path_for (по умолчанию IMAGES_PATH)
+    """
+
+    HASH_ALGORITHM = 'sha256'
+    READ_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, root: str = None):
+        self.root = root or settings.IMAGES_PATH
+
+    @staticmethod
+    def key_for(blob_hash: str) -> str:
+        """Ключ файла в хранилище (get_storage)"""
+        return f'{blob_hash[:2]}/{blob_hash[2:4]}/{blob_hash}'
+
+    def path_for(self, blob_hash: str) -> str:
+        """Путь к файлу в локальном каталоге (для миграции и сверки, STORAGE_BACKEND=local)"""
+        return os.path.join(self.root, blob_hash[:2], blob_hash[2:4], blob_hash)
+
+    def put(self, source_path: str, blob_hash: str, content_type: str = None) -> bool:
+        """
+        Сохраняет файл source_path в хранилище под ключом blob_hash.
+
+        Вызывается после того, как запись в blobs закоммичена. Если такой
+        файл уже есть, source_path не трогается. Исходный файл, если он
+        остался на месте (см. Storage.put_file), удаляет вызывающий.
+
+        Возвращает:
+            bool: True, если файл сохранён, False — если такой уже был
+        """
+        storage = get_storage()
+        key = self.key_for(blob_hash)
+        if storage.stat(key) is not None:
+            return False
+        storage.put_file(key, source_path, content_type)
+        return True
+
+    def unlink(self, blob_hash: str) -> None:
+        """Удаляет файл; передаётся в DBManager.delete_image как release_blob"""
+        if not get_storage().delete(self.key_for(blob_hash)):
+            logger.warning(f'Blob {blob_hash} is already missing')
+
+    @classmethod
+    def hash_file(cls, path: str) -> str:
+        """SHA-256 файла на диске (для миграции; при загрузке хэш считает парсер)"""
+        hasher = hashlib.new(cls.HASH_ALGORITHM)
+        with open(path, 'rb') as f:
+            while chunk := f.read(cls.READ_CHUNK_SIZE):
+                hasher.update(chunk)
+        return hasher.hexdigest()
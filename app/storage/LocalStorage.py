@@ -0,0 +1,98 @@
+import errno
+import io
+import os
+import shutil
+from stat import S_ISREG
+
+from app.storage.Storage import Storage, StoredObject
+from app.utils import profiling
+from config import settings
+
+
+class _LimitedReader(io.RawIOBase):
+    """Чтение не больше length байт из открытого файла (диапазон Range)"""
+
+    def __init__(self, f, length: int):
+        self.f = f
+        self.remaining = length
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size=-1) -> bytes:
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        try:
+            self.f.close()
+        finally:
+            super().close()
+
+
+class LocalStorage(Storage):
+    """
+    Хранилище в каталоге на локальном диске (STORAGE_BACKEND=local).
+
+    Объект с ключом KEY — файл root/KEY. Временные файлы загрузки пишутся
+    в тот же каталог, поэтому put_file только переименовывает файл.
+
+    Аргументы:
+        root (str): корневой каталог (по умолчанию IMAGES_PATH)
+    """
+
+    def __init__(self, root: str = None):
+        self.root = root or settings.IMAGES_PATH
+        self.spool_dir = self.root
+
+    def local_path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if os.path.isabs(key) or not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f'Invalid storage key: {key!r}')
+        return path
+
+    def put_file(self, key: str, source_path: str, content_type: str = None) -> None:
+        path = self.local_path(key)
+        with profiling.phase('store'):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                os.replace(source_path, path)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                # Исходный файл на другой файловой системе: копируем рядом и переименовываем
+                tmp_path = os.path.join(os.path.dirname(path), f'.tmp-{os.getpid()}-{os.path.basename(path)}')
+                shutil.copyfile(source_path, tmp_path)
+                os.replace(tmp_path, path)
+
+    def stat(self, key: str) -> StoredObject | None:
+        path = self.local_path(key)
+        try:
+            stat = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        if not S_ISREG(stat.st_mode):
+            return None
+        # Тот же формат, что и AdvancedHTTPRequestHandler.make_etag
+        return StoredObject(key, stat.st_size, stat.st_mtime, f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"', path)
+
+    def open(self, key: str, start: int = 0, length: int = None):
+        f = open(self.local_path(key), 'rb')
+        if start:
+            f.seek(start)
+        return f if length is None else _LimitedReader(f, length)
+
+    def delete(self, key: str) -> bool:
+        try:
+            os.remove(self.local_path(key))
+            return True
+        except FileNotFoundError:
+            return False
@@ -0,0 +1,118 @@
+import io
+import os
+import threading
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+except ImportError:  # boto3 — необязательная зависимость, нужна только для STORAGE_BACKEND=s3
+    boto3 = None
+
+from app.storage.Storage import Storage, StoredObject
+from app.utils import profiling
+from config import settings
+
+
+class S3Storage(Storage):
+    """
+    Хранилище в S3-совместимом бакете (STORAGE_BACKEND=s3): AWS S3, MinIO,
+    а для проверок без сети — moto (S3_ENDPOINT_URL указывает на него).
+
+    - Загрузка: файл больше S3_MULTIPART_THRESHOLD отправляется multipart,
+      частями по S3_MULTIPART_CHUNK_SIZE в S3_UPLOAD_CONCURRENCY потоков.
+    - Чтение: GetObject с заголовком Range, тело читается потоком.
+    - Клиент один на процесс, у него пул из S3_MAX_POOL_CONNECTIONS
+      HTTP-соединений; клиент потокобезопасен, а после fork() (воркеры
+      prefork) создаётся заново.
+
+    Временные файлы загрузки пишутся в S3_SPOOL_PATH и удаляются после
+    отправки в бакет.
+
+    Аргументы:
+        bucket (str): бакет (по умолчанию S3_BUCKET)
+        prefix (str): префикс ключей в бакете (по умолчанию S3_PREFIX)
+    """
+
+    NOT_FOUND_CODES = ('404', 'NoSuchKey', 'NotFound')
+
+    def __init__(self, bucket: str = None, prefix: str = None):
+        if boto3 is None:
+            raise RuntimeError('STORAGE_BACKEND=s3 requires the boto3 package')
+        self.bucket = bucket or settings.S3_BUCKET
+        self.prefix = settings.S3_PREFIX if prefix is None else prefix
+        self.spool_dir = settings.S3_SPOOL_PATH
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=settings.S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=settings.S3_MULTIPART_CHUNK_SIZE,
+            max_concurrency=settings.S3_UPLOAD_CONCURRENCY,
+            use_threads=True
+        )
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Пул соединений клиента не переживает fork(): в воркерах prefork создаём свой
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    config = Config(
+                        max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                        retries={'max_attempts': 3, 'mode': 'standard'},
+                        # MinIO и moto обычно доступны по адресу без поддоменов бакетов
+                        s3={'addressing_style': 'path'} if settings.S3_ENDPOINT_URL else None
+                    )
+                    self._client = boto3.session.Session().client(
+                        's3',
+                        endpoint_url=settings.S3_ENDPOINT_URL,
+                        region_name=settings.S3_REGION,
+                        aws_access_key_id=settings.S3_ACCESS_KEY_ID,
+                        aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+                        config=config
+                    )
+                    self._pid = os.getpid()
+        return self._client
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    def put_file(self, key: str, source_path: str, content_type: str = None) -> None:
+        with profiling.phase('store'):
+            self.client.upload_file(
+                source_path, self.bucket, self._key(key),
+                ExtraArgs={'ContentType': content_type} if content_type else None,
+                Config=self.transfer_config
+            )
+
+    def stat(self, key: str) -> StoredObject | None:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in self.NOT_FOUND_CODES:
+                return None
+            raise
+        return StoredObject(key, head['ContentLength'], head['LastModified'].timestamp(), head['ETag'])
+
+    def open(self, key: str, start: int = 0, length: int = None):
+        if length == 0:
+            return io.BytesIO()
+        options = {}
+        if start or length is not None:
+            end = '' if length is None else start + length - 1
+            options['Range'] = f'bytes={start}-{end}'
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(key), **options)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in self.NOT_FOUND_CODES:
+                raise FileNotFoundError(f'Object {key} not found in bucket {self.bucket}') from e
+            raise
+        return response['Body']
+
+    def delete(self, key: str) -> bool:
+        # DeleteObject не сообщает, был ли объект, — отсутствие не ошибка
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+        return True
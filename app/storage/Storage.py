@@ -0,0 +1,108 @@
+import threading
+from contextlib import closing
+
+from config import settings
+
+
+class StoredObject:
+    """
+    Сведения об объекте хранилища.
+
+    Атрибуты:
+        key (str): ключ объекта
+        size (int): размер в байтах
+        mtime (float): время изменения (unix time)
+        etag (str): ETag в кавычках, меняется вместе с содержимым
+        path (str | None): путь к файлу на локальном диске (LocalStorage),
+            для удалённого хранилища None
+    """
+    __slots__ = ('key', 'size', 'mtime', 'etag', 'path')
+
+    def __init__(self, key: str, size: int, mtime: float, etag: str, path: str = None):
+        self.key = key
+        self.size = size
+        self.mtime = mtime
+        self.etag = etag
+        self.path = path
+
+
+class Storage:
+    """
+    Хранилище файлов изображений.
+
+    Ключ — относительный путь: имя файла (STORAGE_MODE=flat) или
+    ab/cd/<sha256> (BlobStore). Реализации: LocalStorage (каталог
+    IMAGES_PATH) и S3Storage (S3-совместимое хранилище); какая используется,
+    задаёт STORAGE_BACKEND, см. get_storage.
+
+    Атрибуты:
+        spool_dir (str): каталог для временных файлов загрузки. Для
+            LocalStorage это сам IMAGES_PATH: put_file тогда переносит файл,
+            а не копирует.
+    """
+
+    spool_dir: str = None
+
+    def put_file(self, key: str, source_path: str, content_type: str = None) -> None:
+        """
+        Сохраняет файл source_path под ключом key.
+
+        Исходный файл может быть перенесён (LocalStorage) или остаться на
+        месте (S3Storage) — вызывающий удаляет его, если он остался.
+        """
+        raise NotImplementedError
+
+    def stat(self, key: str) -> StoredObject | None:
+        """Сведения об объекте или None, если его нет"""
+        raise NotImplementedError
+
+    def open(self, key: str, start: int = 0, length: int = None):
+        """
+        Открывает объект для чтения с позиции start, не больше length байт
+        (None — до конца).
+
+        Возвращает объект с методами read(size) и close(): данные читаются
+        потоком, а не целиком в память.
+
+        Исключения:
+            FileNotFoundError: объекта нет
+        """
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        """Удаляет объект; отсутствие объекта не ошибка. False — объекта уже не было (если это известно)"""
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> str | None:
+        """Путь к файлу на локальном диске (для sendfile и Pillow) или None"""
+        return None
+
+    def read(self, key: str, start: int = 0, length: int = None) -> bytes:
+        """Читает объект или его часть целиком в память"""
+        with closing(self.open(key, start, length)) as body:
+            return body.read()
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> Storage:
+    """
+    Хранилище, выбранное в STORAGE_BACKEND:
+        local — LocalStorage (по умолчанию)
+        s3    — S3Storage, нужен пакет boto3
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if settings.STORAGE_BACKEND == 's3':
+                    from app.storage.S3Storage import S3Storage
+                    _storage = S3Storage()
+                elif settings.STORAGE_BACKEND == 'local':
+                    from app.storage.LocalStorage import LocalStorage
+                    _storage = LocalStorage()
+                else:
+                    raise ValueError(f'Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND}')
+    return _storage
@@ -0,0 +1,103 @@
+import os
+import queue
+import threading
+from typing import Callable
+
+from loguru import logger
+
+from app.media import ThumbnailService, VariantService
+from app.storage.BlobStore import BlobStore
+from app.storage.Storage import get_storage
+from app.utils.singleton import SingletonMeta
+from config import settings
+
+
+class UnlinkQueue(metaclass=SingletonMeta):
+    """
+    Фоновое удаление файлов изображений после пакетного удаления записей.
+
+    Обработчик удаляет записи из БД, ставит их в очередь и сразу отвечает
+    клиенту; файлы, уменьшенные копии и файлы BlobStore без ссылок удаляет
+    отдельный поток. Если процесс завершится раньше, чем очередь опустеет,
+    оставшиеся файлы станут лишними — записи о них уже удалены, на работу
+    сервиса это не влияет.
+
+    Методы:
+        submit(images, purge_blobs): ставит удалённые записи в очередь.
+        join(timeout): ждёт, пока очередь опустеет.
+        unlink(images, purge_blobs): удаляет файлы сразу (используется и
+            задачей files.unlink в app.jobs).
+    """
+
+    def __init__(self):
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self) -> queue.Queue:
+        # Поток не переживает fork(): в воркерах prefork запускаем свой
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, args=(self._queue,),
+                                                name='unlink-queue', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+            return self._queue
+
+    def submit(self, images: list[tuple], purge_blobs: Callable = None) -> None:
+        """
+        Ставит в очередь файлы удалённых изображений.
+
+        Аргументы:
+            images: (id, filename, blob_hash) из DBManager.delete_images
+            purge_blobs: функция purge_blobs(hashes, release_blob) для файлов
+                BlobStore (DBManager.purge_blobs или её аналог для asyncpg)
+        """
+        if images:
+            self._ensure_worker().put((images, purge_blobs))
+
+    def join(self, timeout: float = None) -> bool:
+        """Ждёт обработки всех поставленных задач. Возвращает False по таймауту"""
+        if self._queue is None or self._pid != os.getpid():
+            return True
+        done = threading.Event()
+        self._queue.put((None, done.set))
+        return done.wait(timeout)
+
+    def _run(self, tasks: queue.Queue) -> None:
+        while True:
+            images, purge_blobs = tasks.get()
+            if images is None:
+                purge_blobs()  # метка join()
+                continue
+            try:
+                self.unlink(images, purge_blobs)
+            except Exception as e:
+                logger.error(f'Error unlinking files of {len(images)} deleted images: {e}')
+
+    @staticmethod
+    def unlink(images: list[tuple], purge_blobs: Callable = None) -> None:
+        """
+        Удаляет файлы, уменьшенные копии, копии в WebP/AVIF и файлы BlobStore без ссылок для
+        удалённых записей. Повторный вызов для тех же записей безопасен.
+        """
+        hashes = set()
+        for _, filename, blob_hash in images:
+            if blob_hash is not None:
+                hashes.add(blob_hash)
+            else:
+                try:
+                    get_storage().delete(filename)
+                except Exception as e:
+                    logger.error(f'Cannot delete file {filename}: {e}')
+            ThumbnailService().delete(filename)
+            VariantService().delete(filename)
+
+        if hashes and purge_blobs is not None:
+            hashes = sorted(hashes)
+            for start in range(0, len(hashes), settings.UNLINK_BATCH_SIZE):
+                purge_blobs(hashes[start:start + settings.UNLINK_BATCH_SIZE], release_blob=BlobStore().unlink)
+
+        logger.info(f'Unlinked files of {len(images)} deleted images')
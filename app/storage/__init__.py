@@ -0,0 +1,9 @@
+"""
+Пакет storage - хранение файлов изображений.
+"""
+
+from app.storage.Storage import Storage, StoredObject, get_storage
+from app.storage.BlobStore import BlobStore
+from app.storage.UnlinkQueue import UnlinkQueue
+
+__all__ = ['Storage', 'StoredObject', 'get_storage', 'BlobStore', 'UnlinkQueue']
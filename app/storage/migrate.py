@@ -0,0 +1,131 @@
+"""
+Перенос изображений, сохранённых под своим именем (STORAGE_MODE=flat), в BlobStore.
+
+Для каждой записи images без blob_hash:
+1. считается SHA-256 файла IMAGES_PATH/<filename>;
+2. в одной транзакции увеличивается счётчик ссылок в blobs и записывается
+   images.blob_hash;
+3. после коммита файл переносится в IMAGES_PATH/ab/cd/<hash>, а если файл
+   с таким содержимым уже есть — удаляется.
+
+Пока файл не перенесён, сервер находит его по старому пути, поэтому
+миграцию можно выполнять на работающем сервисе. Повторный запуск
+продолжает с необработанных записей.
+
+Работает только с файлами на локальном диске (STORAGE_BACKEND=local).
+
+Запуск:
+    python -m app.storage.migrate [--dry-run] [--batch-size 500]
+"""
+
+import argparse
+import os
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from app.db import DBManager
+from app.storage.BlobStore import BlobStore
+from config import settings
+from config.logger_setup import setup_logger
+
+
+def migrate(batch_size: int = 500, dry_run: bool = False) -> dict:
+    """
+    Переносит файлы в BlobStore.
+
+    Возвращает:
+        dict: migrated — перенесено, deduplicated — удалено как дубликаты,
+              missing — записи без файла, bytes_saved — освобождено байт
+    """
+    db = DBManager()
+    store = BlobStore()
+    stats = {'migrated': 0, 'deduplicated': 0, 'missing': 0, 'bytes_saved': 0}
+    seen = set()  # хэши, уже учтённые в режиме --dry-run
+    last_id = 0
+
+    while True:
+        with db.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT id, filename FROM images WHERE blob_hash IS NULL AND id > %s ORDER BY id LIMIT %s",
+                    (last_id, batch_size)
+                )
+                rows = cursor.fetchall()
+        if not rows:
+            break
+
+        for image_id, filename in rows:
+            last_id = image_id
+            path = os.path.join(settings.IMAGES_PATH, filename)
+            if not os.path.isfile(path):
+                logger.warning(f'File for image {image_id} ({filename}) is missing, skipped')
+                stats['missing'] += 1
+                continue
+
+            size = os.path.getsize(path)
+            blob_hash = store.hash_file(path)
+
+            if dry_run:
+                if blob_hash in seen or os.path.exists(store.path_for(blob_hash)):
+                    stats['deduplicated'] += 1
+                    stats['bytes_saved'] += size
+                else:
+                    stats['migrated'] += 1
+                seen.add(blob_hash)
+                continue
+
+            if not _link_image(db, image_id, blob_hash, size):
+                # Запись удалили или перенесли параллельно
+                continue
+            if store.put(path, blob_hash):
+                stats['migrated'] += 1
+            else:
+                os.remove(path)
+                stats['deduplicated'] += 1
+                stats['bytes_saved'] += size
+
+        logger.info(f'Migrated up to id {last_id}: {stats}')
+
+    return stats
+
+
+def _link_image(db: DBManager, image_id: int, blob_hash: str, size: int) -> bool:
+    """Записывает blob_hash изображения и увеличивает счётчик ссылок одной транзакцией"""
+    with db.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO blobs (hash, size, ref_count) VALUES (%s, %s, 1) "
+                "ON CONFLICT (hash) DO UPDATE SET ref_count = blobs.ref_count + 1",
+                (blob_hash, size)
+            )
+            cursor.execute(
+                "UPDATE images SET blob_hash = %s WHERE id = %s AND blob_hash IS NULL",
+                (blob_hash, image_id)
+            )
+            if cursor.rowcount == 0:
+                conn.rollback()
+                return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Перенос изображений в хранилище по хэшу содержимого')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='только посчитать, сколько файлов будет перенесено и сколько места освободится')
+    parser.add_argument('--batch-size', type=int, default=500,
+                        help='сколько записей читать из БД за один запрос')
+    args = parser.parse_args()
+    if settings.STORAGE_BACKEND != 'local':
+        parser.error(f'only STORAGE_BACKEND=local is supported, got {settings.STORAGE_BACKEND}')
+
+    load_dotenv()
+    setup_logger()
+
+    stats = migrate(batch_size=args.batch_size, dry_run=args.dry_run)
+    logger.info(f"{'Dry run' if args.dry_run else 'Migration'} finished: {stats}")
+    DBManager().close()
+
+
+if __name__ == '__main__':
+    main()
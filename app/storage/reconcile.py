@@ -0,0 +1,554 @@
+"""
+Сверка файлов на диске с БД и сборка мусора.
+
+Загрузка пишет файл до вставки записи, удаление убирает файл отдельно от
+записи, поэтому после сбоя между этими шагами остаются лишние файлы или
+записи без файлов. Команда находит:
+
+- лишние файлы в IMAGES_PATH (в том числе брошенные временные .upload-*);
+- записи images без файла (при STORAGE_MODE=flat);
+- лишние файлы в BlobStore и строки blobs без файла или без ссылок;
+- уменьшенные копии удалённых изображений в THUMBS_PATH;
+- копии удалённых изображений в WebP/AVIF в VARIANTS_PATH.
+
+Списки файлов и записей не загружаются в память целиком. Имена файлов
+читаются os.scandir и сортируются внешней сортировкой (кусками по
+RECONCILE_SORT_CHUNK_SIZE во временные файлы), записи читаются из БД
+именованным (серверным) курсором в порядке COLLATE "C" — в том же порядке,
+в каком Python сравнивает строки. Обе последовательности сливаются за один
+проход, как в сортировке слиянием.
+
+Лишние файлы переносятся в QUARANTINE_PATH/<дата-время>/ (или удаляются с
+--remove), записи без файлов только перечисляются (удаляются с
+--delete-dangling). Файлы и записи моложе RECONCILE_GRACE_PERIOD не
+трогаются, а перед каждым действием найденное ещё раз проверяется в БД,
+поэтому команду можно запускать на работающем сервисе.
+
+Сверяются только файлы на локальном диске (STORAGE_BACKEND=local): для
+S3 лишние объекты удобнее убирать правилами жизненного цикла бакета.
+
+Запуск:
+    python -m app.storage.reconcile [--dry-run] [--remove] [--delete-dangling]
+                                    [--grace-period 3600] [--batch-size 1000]
+"""
+
+import argparse
+import heapq
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Iterable, Iterator
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from app.db import DBManager
+from app.storage.BlobStore import BlobStore
+from app.storage.UnlinkQueue import UnlinkQueue
+from config import settings
+from config.logger_setup import setup_logger
+
+_HASH_RE = re.compile(r'[0-9a-f]{64}')
+_PREFIX_RE = re.compile(r'[0-9a-f]{2}')
+_END = object()
+
+# Сколько примеров каждого вида показывать в отчёте
+SAMPLE_SIZE = 10
+
+
+def external_sort(names: Iterable[str], chunk_size: int = None) -> Iterator[str]:
+    """
+    Возвращает имена в порядке возрастания, держа в памяти не больше chunk_size имён.
+
+    Каждые chunk_size имён сортируются и записываются во временный файл,
+    затем файлы сливаются heapq.merge. Имена с переводом строки не
+    поддерживаются (вызывающий их отбрасывает).
+    """
+    chunk_size = chunk_size or settings.RECONCILE_SORT_CHUNK_SIZE
+    runs = []
+    chunk = []
+    try:
+        for name in names:
+            chunk.append(name)
+            if len(chunk) >= chunk_size:
+                runs.append(_spill(sorted(chunk)))
+                chunk = []
+        if not runs:
+            yield from sorted(chunk)
+            return
+        if chunk:
+            runs.append(_spill(sorted(chunk)))
+            chunk = []
+        yield from heapq.merge(*((line[:-1] for line in run) for run in runs))
+    finally:
+        for run in runs:
+            run.close()
+
+
+def _spill(names: list[str]):
+    run = tempfile.TemporaryFile('w+', encoding='utf-8', errors='surrogateescape')
+    for name in names:
+        run.write(name)
+        run.write('\n')
+    run.seek(0)
+    return run
+
+
+def diff_sorted(left: Iterable, right: Iterable,
+                left_key: Callable = lambda item: item,
+                right_key: Callable = lambda item: item,
+                include_matches: bool = False) -> Iterator[tuple]:
+    """
+    Сравнивает две отсортированные последовательности за один проход.
+
+    Выдаёт (элемент, None) для ключей, которые есть только слева, и
+    (None, элемент) — только справа; с include_matches ещё и пары
+    (левый, правый) для совпавших ключей. Слева ключи могут повторяться
+    (одно имя в нескольких директориях), справа должны быть уникальны.
+
+    Исключения:
+        RuntimeError: последовательность не отсортирована — продолжать
+            нельзя, иначе существующие файлы окажутся «лишними»
+    """
+    right = iter(right)
+    r, r_key, matched = _next_sorted(right, right_key, None, strict=True)
+    prev_key = None
+    for item in left:
+        key = left_key(item)
+        if prev_key is not None and key < prev_key:
+            raise RuntimeError(f'Unsorted input: {key!r} after {prev_key!r}')
+        prev_key = key
+        while r is not _END and r_key < key:
+            if not matched:
+                yield None, r
+            r, r_key, matched = _next_sorted(right, right_key, r_key, strict=True)
+        if r is not _END and r_key == key:
+            matched = True
+            if include_matches:
+                yield item, r
+        else:
+            yield item, None
+    while r is not _END:
+        if not matched:
+            yield None, r
+        r, r_key, matched = _next_sorted(right, right_key, r_key, strict=True)
+
+
+def _next_sorted(iterator: Iterator, key: Callable, prev_key, strict: bool) -> tuple:
+    item = next(iterator, _END)
+    if item is _END:
+        return _END, None, False
+    item_key = key(item)
+    if prev_key is not None and (item_key <= prev_key if strict else item_key < prev_key):
+        raise RuntimeError(f'Unsorted input: {item_key!r} after {prev_key!r}')
+    return item, item_key, False
+
+
+class Batch:
+    """Накапливает элементы и передаёт их handler пачками по size"""
+
+    def __init__(self, handler: Callable[[list], None], size: int):
+        self.handler = handler
+        self.size = size
+        self.items = []
+
+    def add(self, item) -> None:
+        self.items.append(item)
+        if len(self.items) >= self.size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.items:
+            items, self.items = self.items, []
+            self.handler(items)
+
+
+class Reconciler:
+    """
+    Сверка IMAGES_PATH, BlobStore, THUMBS_PATH и VARIANTS_PATH с таблицами images и blobs.
+
+    Аргументы:
+        dry_run (bool): только отчёт, ничего не менять
+        remove (bool): удалять лишние файлы, а не переносить в карантин
+        delete_dangling (bool): удалять записи images, у которых нет файла
+        grace_period (int): сколько секунд не трогать новые файлы и записи
+        batch_size (int): размер пачки для запросов к БД
+    """
+
+    def __init__(self, dry_run: bool = False, remove: bool = False, delete_dangling: bool = False,
+                 grace_period: int = None, batch_size: int = 1000):
+        self.db = DBManager()
+        self.store = BlobStore()
+        self.dry_run = dry_run
+        self.remove = remove
+        self.delete_dangling = delete_dangling
+        grace_period = settings.RECONCILE_GRACE_PERIOD if grace_period is None else grace_period
+        self.cutoff = time.time() - grace_period
+        self.batch_size = batch_size
+        self.quarantine_dir = os.path.join(settings.QUARANTINE_PATH, datetime.now().strftime('%Y%m%d-%H%M%S'))
+        self.stats = {
+            'orphan_files': 0, 'orphan_bytes': 0,
+            'dangling_rows': 0,
+            'orphan_blobs': 0, 'orphan_blob_bytes': 0,
+            'dangling_blobs': 0, 'unreferenced_blobs': 0,
+            'orphan_thumbnails': 0, 'orphan_variants': 0,
+            'skipped_recent': 0, 'skipped_names': 0,
+        }
+        self.samples = {}
+
+    def run(self) -> dict:
+        self.reconcile_images()
+        self.reconcile_blobs()
+        self.reconcile_thumbnails()
+        self.reconcile_variants()
+        for kind, names in self.samples.items():
+            logger.info(f'{kind} (first {len(names)}): {", ".join(names)}')
+        return self.stats
+
+    # --- images и IMAGES_PATH -------------------------------------------------
+
+    def reconcile_images(self) -> None:
+        """Файлы верхнего уровня IMAGES_PATH против images.filename"""
+        orphans = Batch(self._handle_orphan_files, self.batch_size)
+        dangling = Batch(self._handle_dangling_rows, self.batch_size)
+        rows = self._stream(
+            'SELECT filename, id, blob_hash, upload_time FROM images ORDER BY filename COLLATE "C"',
+            'reconcile_images'
+        )
+        disk = external_sort(self._scan_files(settings.IMAGES_PATH))
+        for name, row in diff_sorted(disk, rows, right_key=lambda row: row[0]):
+            if row is None:
+                if self._is_old(os.path.join(settings.IMAGES_PATH, name)):
+                    orphans.add(name)
+            elif row[2] is None:
+                # Файл записи без blob_hash должен лежать в IMAGES_PATH под своим именем
+                if row[3] is not None and row[3].timestamp() > self.cutoff:
+                    self.stats['skipped_recent'] += 1
+                else:
+                    dangling.add(row)
+        orphans.flush()
+        dangling.flush()
+        logger.info(f'Images checked: {self.stats}')
+
+    def _handle_orphan_files(self, names: list[str]) -> None:
+        known = self._existing('SELECT filename FROM images WHERE filename = ANY(%s)', names)
+        for name in names:
+            if name in known:
+                continue
+            path = os.path.join(settings.IMAGES_PATH, name)
+            if self._dispose(path, os.path.join('images', name), 'orphan_files', 'orphan_bytes'):
+                self._sample('orphan files', name)
+
+    def _handle_dangling_rows(self, rows: list[tuple]) -> None:
+        rows = [row for row in rows if not os.path.exists(os.path.join(settings.IMAGES_PATH, row[0]))]
+        self.stats['dangling_rows'] += len(rows)
+        for row in rows:
+            self._sample('dangling rows', row[0])
+        if rows and self.delete_dangling and not self.dry_run:
+            self._delete_rows([row[1] for row in rows])
+
+    # --- blobs и BlobStore ----------------------------------------------------
+
+    def reconcile_blobs(self) -> None:
+        """Файлы IMAGES_PATH/ab/cd/<hash> против таблицы blobs"""
+        orphans = Batch(self._handle_orphan_blobs, self.batch_size)
+        dangling = Batch(self._handle_dangling_blobs, self.batch_size)
+        unreferenced = Batch(self._purge_unreferenced, self.batch_size)
+        rows = self._stream(
+            'SELECT hash, ref_count, created_at FROM blobs ORDER BY hash COLLATE "C"',
+            'reconcile_blobs'
+        )
+        for blob_hash, row in diff_sorted(self._scan_blobs(), rows, right_key=lambda row: row[0],
+                                          include_matches=True):
+            if row is None:
+                if self._is_old(self.store.path_for(blob_hash)):
+                    orphans.add(blob_hash)
+            elif row[1] <= 0:
+                # Строка без ссылок: файл не успели удалить (например, UnlinkQueue не доработала)
+                unreferenced.add(row[0])
+            elif blob_hash is None:
+                if row[2] is not None and row[2].timestamp() > self.cutoff:
+                    self.stats['skipped_recent'] += 1
+                else:
+                    dangling.add(row[0])
+        orphans.flush()
+        dangling.flush()
+        unreferenced.flush()
+        logger.info(f'Blobs checked: {self.stats}')
+
+    def _scan_blobs(self) -> Iterator[str]:
+        """
+        Хэши файлов BlobStore по возрастанию.
+
+        Директории ab/cd обходятся по порядку, и в каждой файлов немного,
+        поэтому внешняя сортировка не нужна. Посторонние файлы в этих
+        директориях сразу считаются лишними.
+        """
+        root = self.store.root
+        for first in self._sorted_dirs(root):
+            for second in self._sorted_dirs(os.path.join(root, first)):
+                directory = os.path.join(root, first, second)
+                prefix = first + second
+                for name in sorted(self._scan_files(directory)):
+                    if _HASH_RE.fullmatch(name) and name.startswith(prefix):
+                        yield name
+                        continue
+                    path = os.path.join(directory, name)
+                    if self._is_old(path):
+                        self._dispose(path, os.path.join('images', first, second, name),
+                                      'orphan_blobs', 'orphan_blob_bytes')
+
+    @staticmethod
+    def _sorted_dirs(path: str) -> list[str]:
+        try:
+            with os.scandir(path) as entries:
+                return sorted(entry.name for entry in entries
+                              if _PREFIX_RE.fullmatch(entry.name) and entry.is_dir(follow_symlinks=False))
+        except FileNotFoundError:
+            return []
+
+    def _handle_orphan_blobs(self, hashes: list[str]) -> None:
+        known = self._existing('SELECT hash FROM blobs WHERE hash = ANY(%s::char(64)[])', hashes)
+        for blob_hash in hashes:
+            if blob_hash in known:
+                continue
+            path = self.store.path_for(blob_hash)
+            relative = os.path.join('images', os.path.relpath(path, self.store.root))
+            if self._dispose(path, relative, 'orphan_blobs', 'orphan_blob_bytes'):
+                self._sample('orphan blobs', blob_hash)
+
+    def _handle_dangling_blobs(self, hashes: list[str]) -> None:
+        hashes = [h for h in hashes if not os.path.exists(self.store.path_for(h))]
+        if not hashes:
+            return
+        self.stats['dangling_blobs'] += len(hashes)
+        for blob_hash in hashes:
+            self._sample('dangling blobs', blob_hash)
+        if not self.delete_dangling or self.dry_run:
+            return
+        rows = self._images_by_blob(hashes)
+        # Файл, который ещё не перенесён в BlobStore (app.storage.migrate), лежит под своим именем
+        ids = [image_id for image_id, filename in rows
+               if not os.path.exists(os.path.join(settings.IMAGES_PATH, filename))]
+        self._delete_rows(ids)
+
+    def _images_by_blob(self, hashes: list[str]) -> list[tuple]:
+        """(id, filename) изображений, ссылающихся на файлы hashes"""
+        with self.db.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT id, filename FROM images WHERE blob_hash = ANY(%s::char(64)[])", (hashes,))
+                return cursor.fetchall()
+
+    def _purge_unreferenced(self, hashes: list[str]) -> None:
+        if self.dry_run:
+            self.stats['unreferenced_blobs'] += len(hashes)
+            return
+        released = self.db.purge_blobs(hashes, release_blob=self._release_blob)
+        self.stats['unreferenced_blobs'] += len(released)
+
+    def _release_blob(self, blob_hash: str) -> None:
+        # Вызывается внутри транзакции purge_blobs, см. DBManager._release_blob
+        path = self.store.path_for(blob_hash)
+        if os.path.exists(path):
+            self._dispose(path, os.path.join('images', os.path.relpath(path, self.store.root)))
+
+    # --- THUMBS_PATH ----------------------------------------------------------
+
+    def reconcile_thumbnails(self) -> None:
+        """
+        Уменьшенные копии против images.filename.
+
+        Копии всех ширин сливаются в один поток (имя, ширина), поэтому
+        таблица images читается один раз. Лишние копии удаляются без
+        карантина: их всегда можно создать заново.
+        """
+        if not os.path.isdir(settings.THUMBS_PATH):
+            return
+        with os.scandir(settings.THUMBS_PATH) as entries:
+            widths = sorted(entry.name for entry in entries
+                            if entry.name.isdigit() and entry.is_dir(follow_symlinks=False))
+        streams = [self._scan_thumbnails(width) for width in widths]
+        orphans = Batch(self._handle_orphan_thumbnails, self.batch_size)
+        rows = self._stream('SELECT filename FROM images ORDER BY filename COLLATE "C"', 'reconcile_thumbs')
+        for thumb, _ in diff_sorted(heapq.merge(*streams), rows,
+                                    left_key=lambda thumb: thumb[0], right_key=lambda row: row[0]):
+            if thumb is not None and self._is_old(os.path.join(settings.THUMBS_PATH, thumb[1], thumb[0])):
+                orphans.add(thumb)
+        orphans.flush()
+        logger.info(f'Thumbnails checked: {self.stats}')
+
+    def _scan_thumbnails(self, width: str) -> Iterator[tuple]:
+        for name in external_sort(self._scan_files(os.path.join(settings.THUMBS_PATH, width))):
+            yield name, width
+
+    def _handle_orphan_thumbnails(self, thumbs: list[tuple]) -> None:
+        known = self._existing('SELECT filename FROM images WHERE filename = ANY(%s)',
+                               list({name for name, _ in thumbs}))
+        for name, width in thumbs:
+            if name in known:
+                continue
+            self.stats['orphan_thumbnails'] += 1
+            self._sample('orphan thumbnails', f'{width}/{name}')
+            if not self.dry_run:
+                try:
+                    os.remove(os.path.join(settings.THUMBS_PATH, width, name))
+                except FileNotFoundError:
+                    pass
+
+    # --- VARIANTS_PATH ---------------------------------------------------------
+
+    def reconcile_variants(self) -> None:
+        """
+        Копии в WebP/AVIF против images.filename.
+
+        Копия NAME лежит в VARIANTS_PATH/<формат>-<качество>/NAME.<формат>;
+        каталоги сливаются в один поток (имя, каталог, файл), как у
+        reconcile_thumbnails. Лишние копии удаляются без карантина.
+        """
+        if not os.path.isdir(settings.VARIANTS_PATH):
+            return
+        with os.scandir(settings.VARIANTS_PATH) as entries:
+            directories = sorted(entry.name for entry in entries
+                                 if '-' in entry.name and entry.is_dir(follow_symlinks=False))
+        streams = [self._scan_variants(directory) for directory in directories]
+        orphans = Batch(self._handle_orphan_variants, self.batch_size)
+        rows = self._stream('SELECT filename FROM images ORDER BY filename COLLATE "C"', 'reconcile_variants')
+        for variant, _ in diff_sorted(heapq.merge(*streams), rows,
+                                      left_key=lambda variant: variant[0], right_key=lambda row: row[0]):
+            if variant is not None and self._is_old(os.path.join(settings.VARIANTS_PATH, variant[1], variant[2])):
+                orphans.add(variant)
+        orphans.flush()
+        logger.info(f'Variants checked: {self.stats}')
+
+    def _scan_variants(self, directory: str) -> Iterator[tuple]:
+        # Сортируются имена изображений без суффикса .<формат>: с ним порядок
+        # может не совпасть с порядком images.filename
+        suffix = '.' + directory.partition('-')[0]
+        names = (name[:-len(suffix)] for name in self._scan_files(os.path.join(settings.VARIANTS_PATH, directory))
+                 if name.endswith(suffix))
+        for name in external_sort(names):
+            yield name, directory, name + suffix
+
+    def _handle_orphan_variants(self, variants: list[tuple]) -> None:
+        known = self._existing('SELECT filename FROM images WHERE filename = ANY(%s)',
+                               list({name for name, _, _ in variants}))
+        for name, directory, file_name in variants:
+            if name in known:
+                continue
+            self.stats['orphan_variants'] += 1
+            self._sample('orphan variants', f'{directory}/{file_name}')
+            if not self.dry_run:
+                try:
+                    os.remove(os.path.join(settings.VARIANTS_PATH, directory, file_name))
+                except FileNotFoundError:
+                    pass
+
+    # --- общее ----------------------------------------------------------------
+
+    def _stream(self, query: str, name: str) -> Iterator[tuple]:
+        """Читает результат запроса серверным курсором по batch_size строк"""
+        with self.db.connection() as conn:
+            with conn.cursor(name=name) as cursor:
+                cursor.itersize = self.batch_size
+                cursor.execute(query)
+                yield from cursor
+
+    def _existing(self, query: str, keys: list[str]) -> set[str]:
+        """Какие из keys есть в БД сейчас (повторная проверка перед действием)"""
+        with self.db.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, (keys,))
+                return {row[0] for row in cursor.fetchall()}
+
+    def _scan_files(self, directory: str) -> Iterator[str]:
+        """Имена обычных файлов директории (os.scandir не читает директорию целиком)"""
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    if '\n' in entry.name:
+                        logger.warning(f'Skipped file with newline in name: {entry.path!r}')
+                        self.stats['skipped_names'] += 1
+                        continue
+                    yield entry.name
+        except FileNotFoundError:
+            return
+
+    def _is_old(self, path: str) -> bool:
+        """Файл старше grace period; недавние файлы могут принадлежать идущей загрузке"""
+        try:
+            mtime = os.lstat(path).st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime > self.cutoff:
+            self.stats['skipped_recent'] += 1
+            return False
+        return True
+
+    def _dispose(self, path: str, relative: str, count_key: str = None, bytes_key: str = None) -> bool:
+        """Переносит файл в карантин (или удаляет с --remove). Возвращает False, если файла уже нет"""
+        try:
+            size = os.lstat(path).st_size
+            if not self.dry_run:
+                if self.remove:
+                    os.remove(path)
+                else:
+                    destination = os.path.join(self.quarantine_dir, relative)
+                    os.makedirs(os.path.dirname(destination), exist_ok=True)
+                    shutil.move(path, destination)
+        except FileNotFoundError:
+            return False
+        if count_key:
+            self.stats[count_key] += 1
+        if bytes_key:
+            self.stats[bytes_key] += size
+        return True
+
+    def _delete_rows(self, ids: list[int]) -> None:
+        if not ids:
+            return
+        deleted = self.db.delete_images(ids)
+        UnlinkQueue.unlink(deleted, purge_blobs=self.db.purge_blobs)
+        logger.info(f'Deleted {len(deleted)} images without files')
+
+    def _sample(self, kind: str, name: str) -> None:
+        names = self.samples.setdefault(kind, [])
+        if len(names) < SAMPLE_SIZE:
+            names.append(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сверка файлов изображений с БД и удаление лишнего')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='только отчёт: что будет перенесено в карантин или удалено')
+    parser.add_argument('--remove', action='store_true',
+                        help='удалять лишние файлы, а не переносить в QUARANTINE_PATH')
+    parser.add_argument('--delete-dangling', action='store_true',
+                        help='удалять записи об изображениях, у которых нет файла')
+    parser.add_argument('--grace-period', type=int, default=None,
+                        help='не трогать файлы и записи моложе стольких секунд '
+                             '(по умолчанию RECONCILE_GRACE_PERIOD)')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='сколько строк читать из БД за раз и проверять одним запросом')
+    args = parser.parse_args()
+    if settings.STORAGE_BACKEND != 'local':
+        parser.error(f'only STORAGE_BACKEND=local is supported, got {settings.STORAGE_BACKEND}')
+
+    load_dotenv()
+    setup_logger()
+
+    reconciler = Reconciler(dry_run=args.dry_run, remove=args.remove, delete_dangling=args.delete_dangling,
+                            grace_period=args.grace_period, batch_size=args.batch_size)
+    stats = reconciler.run()
+    logger.info(f"{'Dry run' if args.dry_run else 'Reconciliation'} finished: {stats}")
+    if not args.dry_run and not args.remove and (stats['orphan_files'] or stats['orphan_blobs']):
+        logger.info(f'Orphan files moved to {reconciler.quarantine_dir}')
+    DBManager().close()
+
+
+if __name__ == '__main__':
+    main()
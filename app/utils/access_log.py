@@ -0,0 +1,237 @@
+"""
+Журнал доступа: одна строка на запрос, запись в фоновом потоке.
+
+Обработчик только кладёт кортеж с полями запроса в очередь; строки
+форматирует и пишет пачками отдельный поток, поэтому запрос не ждёт
+ни форматирования, ни диска. Если очередь переполнена, записи
+отбрасываются (их количество пишется в основной журнал).
+"""
+
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from loguru import logger
+
+from app.utils.profiling import mask_token
+from app.utils.singleton import SingletonMeta
+from config import settings
+
+
+def parse_sample_rates(value: str) -> dict[str, float]:
+    """
+    Разбирает ACCESS_LOG_SAMPLE_RATES.
+
+    'GET /images/<filename>=0.1, GET /thumbs/<size>/<filename>=0.05'
+    -> {'GET /images/<filename>': 0.1, 'GET /thumbs/<size>/<filename>': 0.05}
+    """
+    rates = {}
+    for item in value.split(','):
+        route, _, rate = item.strip().rpartition('=')
+        if route:
+            rates[route.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class AccessLog(metaclass=SingletonMeta):
+    """
+    Журнал доступа с очередью и фоновой записью.
+
+    Для каждого маршрута ('GET /images/<filename>') можно задать долю
+    запросов, которые попадают в журнал (ACCESS_LOG_SAMPLE_RATES); ответы
+    с ошибкой (4xx, 5xx) пишутся всегда. В строке указывается sample_rate,
+    чтобы по журналу можно было оценить полное количество запросов.
+
+    Формат (ACCESS_LOG_FORMAT):
+        json     — объект JSON на строку
+        combined — формат combined nginx/Apache и время запроса в мс
+
+    Методы:
+        record(...): ставит запрос в очередь (вызывается обработчиком).
+        flush(timeout): ждёт, пока очередь будет записана.
+    """
+
+    def __init__(self):
+        self.enabled = settings.ACCESS_LOG_ENABLED
+        self.sample_rates = parse_sample_rates(settings.ACCESS_LOG_SAMPLE_RATES)
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._dropped = 0
+
+    def record(self, method: str, target: str, protocol: str, route: str | None, status: int,
+               duration: float, request_bytes: int, response_bytes: int, remote_addr: str, headers) -> None:
+        """
+        Ставит запрос в очередь журнала.
+
+        Аргументы:
+            method (str): HTTP-метод
+            target (str): путь запроса с параметрами (токен ?_profile= маскируется)
+            protocol (str): версия протокола, например 'HTTP/1.1'
+            route (str): шаблон маршрута или None, если маршрут не найден
+            status (int): код ответа
+            duration (float): время обработки, сек
+            request_bytes (int): размер тела запроса
+            response_bytes (int): отправлено байт вместе с заголовками
+            remote_addr (str): адрес клиента
+            headers: заголовки запроса (нужен только get)
+        """
+        if not self.enabled:
+            return
+        rate = self.sample_rates.get(f'{method} {route}', 1.0) if route else 1.0
+        if rate < 1.0 and status < 400 and random.random() >= rate:
+            return
+        entry = (time.time(), os.getpid(), remote_addr, headers.get('X-Forwarded-For'), method, mask_token(target),
+                 protocol, route, status, duration, request_bytes, response_bytes,
+                 headers.get('Referer'), headers.get('User-Agent'), rate)
+        try:
+            self._ensure_worker().put_nowait(entry)
+        except queue.Full:
+            self._dropped += 1
+
+    def flush(self, timeout: float = None) -> bool:
+        """Ждёт, пока записи из очереди будут записаны. Возвращает False по таймауту"""
+        if self._queue is None or self._pid != os.getpid():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def _ensure_worker(self) -> queue.Queue:
+        # Поток не переживает fork(): в воркерах prefork запускаем свой
+        if self._pid == os.getpid():
+            return self._queue
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=settings.ACCESS_LOG_QUEUE_SIZE)
+                self._thread = threading.Thread(target=self._run, args=(self._queue,),
+                                                name='access-log', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+            return self._queue
+
+    def _run(self, entries: queue.Queue) -> None:
+        writer = _LogWriter(settings.ACCESS_LOG_FILE)
+        format_line = _FORMATTERS.get(settings.ACCESS_LOG_FORMAT, _format_json)
+        while True:
+            # Ждём первую запись, затем собираем пачку до ACCESS_LOG_BATCH_SIZE записей
+            # или ACCESS_LOG_FLUSH_INTERVAL секунд и пишем её в файл за один раз
+            batch = [entries.get()]
+            deadline = time.monotonic() + settings.ACCESS_LOG_FLUSH_INTERVAL
+            while len(batch) < settings.ACCESS_LOG_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(entries.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                if isinstance(batch[-1], threading.Event):
+                    break
+
+            lines = []
+            markers = []
+            for entry in batch:
+                if isinstance(entry, threading.Event):
+                    markers.append(entry)  # метка flush()
+                else:
+                    lines.append(format_line(entry))
+            if self._dropped:
+                dropped, self._dropped = self._dropped, 0
+                logger.warning(f'Access log queue is full, {dropped} records dropped')
+            try:
+                writer.write(''.join(lines))
+            except Exception as e:
+                logger.error(f'Cannot write access log: {e}')
+            for marker in markers:
+                marker.set()
+
+
+class _LogWriter:
+    """
+    Дописывает строки в файл журнала или в stdout ('-').
+
+    Если файл переименовали или удалили (logrotate), он открывается
+    заново — как logging.handlers.WatchedFileHandler.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._inode = None
+
+    def write(self, data: str) -> None:
+        if not data:
+            return
+        if self.path == '-':
+            sys.stdout.write(data)
+            sys.stdout.flush()
+            return
+        self._reopen_if_rotated()
+        self._file.write(data)
+        self._file.flush()
+
+    def _reopen_if_rotated(self) -> None:
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            inode = None
+        if self._file is not None and inode == self._inode:
+            return
+        if self._file is not None:
+            self._file.close()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._inode = os.fstat(self._file.fileno()).st_ino
+
+
+def _format_json(entry: tuple) -> str:
+    (timestamp, pid, remote_addr, forwarded_for, method, target, protocol, route, status, duration,
+     request_bytes, response_bytes, referer, user_agent, rate) = entry
+    record = {
+        'time': datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec='milliseconds'),
+        'pid': pid,
+        'remote_addr': remote_addr,
+        'method': method,
+        'path': target,
+        'protocol': protocol,
+        'route': route,
+        'status': status,
+        'duration_ms': round(duration * 1000, 3),
+        'request_bytes': request_bytes,
+        'response_bytes': response_bytes,
+    }
+    if forwarded_for:
+        record['forwarded_for'] = forwarded_for
+    if referer:
+        record['referer'] = referer
+    if user_agent:
+        record['user_agent'] = user_agent
+    if rate < 1.0:
+        record['sample_rate'] = rate
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def _format_combined(entry: tuple) -> str:
+    (timestamp, _, remote_addr, _, method, target, protocol, _, status, duration,
+     _, response_bytes, referer, user_agent, _) = entry
+    when = datetime.fromtimestamp(timestamp).astimezone().strftime('%d/%b/%Y:%H:%M:%S %z')
+    return (f'{remote_addr} - - [{when}] "{_quote(f"{method} {target} {protocol}")}" {status} '
+            f'{response_bytes or "-"} "{_quote(referer)}" "{_quote(user_agent)}" {duration * 1000:.1f}\n')
+
+
+def _quote(value: str | None) -> str:
+    # Как nginx: кавычки внутри поля экранируются, пустое поле — '-'
+    return value.replace('\\', '\\\\').replace('"', '\\"') if value else '-'
+
+
+_FORMATTERS = {'json': _format_json, 'combined': _format_combined}
@@ -0,0 +1,54 @@
+"""
+Разбор запроса пакетного удаления (POST /api/images/delete).
+
+Тело запроса — JSON вида {"ids": [1, 2], "filenames": ["a.jpg"]};
+любой из списков можно не указывать.
+"""
+
+import json
+
+from config import settings
+
+
+def parse_delete_request(body: bytes) -> tuple[list[int], list[str]]:
+    """
+    Разбирает тело запроса пакетного удаления.
+
+    Возвращает:
+        tuple: (ids, filenames) без повторов
+
+    Исключения:
+        ValueError: тело не JSON, неверные типы, пустой запрос или слишком
+            много элементов
+    """
+    try:
+        payload = json.loads(body)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError('Request body must be JSON') from e
+    if not isinstance(payload, dict):
+        raise ValueError('Request body must be a JSON object')
+
+    ids = payload.get('ids') or []
+    filenames = payload.get('filenames') or []
+    if not isinstance(ids, list) or not isinstance(filenames, list):
+        raise ValueError('"ids" and "filenames" must be lists')
+
+    parsed_ids = set()
+    for image_id in ids:
+        if isinstance(image_id, str) and image_id.isdigit():
+            image_id = int(image_id)
+        if type(image_id) is not int or not 0 < image_id < 2 ** 31:
+            raise ValueError(f'Invalid image id: {image_id!r}')
+        parsed_ids.add(image_id)
+
+    parsed_filenames = set()
+    for filename in filenames:
+        if not isinstance(filename, str) or not filename or '/' in filename or len(filename) > 255:
+            raise ValueError(f'Invalid filename: {filename!r}')
+        parsed_filenames.add(filename)
+
+    if not parsed_ids and not parsed_filenames:
+        raise ValueError('Nothing to delete: pass "ids" or "filenames"')
+    if len(parsed_ids) + len(parsed_filenames) > settings.DELETE_BATCH_MAX_ITEMS:
+        raise ValueError(f'Too many items in request (max {settings.DELETE_BATCH_MAX_ITEMS})')
+    return sorted(parsed_ids), sorted(parsed_filenames)
@@ -0,0 +1,145 @@
+"""
+Сжатие ответов и выбор кодировки по заголовку Accept-Encoding.
+
+Статические файлы сжимаются один раз максимальным уровнем (compress),
+динамические ответы — на каждый запрос быстрым уровнем из
+COMPRESSION_LEVELS (compress_dynamic).
+"""
+
+import gzip
+
+try:
+    import brotli
+except ImportError:  # brotli — необязательная зависимость
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard — необязательная зависимость
+    zstandard = None
+
+from config import settings
+
+
+# Кодировки в порядке предпочтения сервера: для статики важнее степень сжатия,
+# для динамических ответов — скорость
+SUPPORTED_ENCODINGS = tuple(encoding for encoding, available in
+                            (('br', brotli), ('zstd', zstandard), ('gzip', True)) if available)
+DYNAMIC_ENCODINGS = tuple(encoding for encoding, available in
+                          (('zstd', zstandard), ('br', brotli), ('gzip', True)) if available)
+
+# Сжимаем только текстовые форматы: картинки уже сжаты
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+
+def is_compressible(content_type: str | None) -> bool:
+    return bool(content_type) and content_type.lower().startswith(COMPRESSIBLE_TYPES)
+
+
+def parse_accept_encoding(header: str | None) -> dict[str, float]:
+    """
+    Разбирает заголовок Accept-Encoding.
+
+    Возвращает:
+        dict: кодировка -> вес q (например, {'gzip': 1.0, 'br': 0.5})
+    """
+    result = {}
+    if not header:
+        return result
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        result[coding] = q
+    return result
+
+
+def negotiate_encoding(header: str | None, available) -> str | None:
+    """
+    Выбирает кодировку из available, которую принимает клиент.
+
+    Аргументы:
+        header (str): значение заголовка Accept-Encoding
+        available: доступные кодировки в порядке предпочтения сервера
+
+    Возвращает:
+        str | None: выбранная кодировка или None (отдать без сжатия)
+    """
+    accepted = parse_accept_encoding(header)
+    if not accepted:
+        return None
+    wildcard = accepted.get('*', 0.0)
+    best, best_q = None, 0.0
+    for coding in available:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Сжимает data целиком указанной кодировкой с максимальным уровнем (для статики)"""
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(data, quality=11)
+    if encoding == 'zstd' and zstandard is not None:
+        return zstandard.ZstdCompressor(level=19).compress(data)
+    raise ValueError(f'Unsupported encoding: {encoding}')
+
+
+def dynamic_encoding(accept_encoding: str | None, content_type: str | None, status: int,
+                     headers, size: int) -> str | None:
+    """
+    Выбирает сжатие динамического ответа по Accept-Encoding.
+
+    Сжимаются только текстовые типы (is_compressible) размером не меньше
+    COMPRESSION_MIN_SIZE и без своего Content-Encoding. Таким ответам в
+    headers добавляется Vary: Accept-Encoding, даже если клиент сжатие не
+    принимает, — иначе кэш отдаст сжатую копию клиенту, который её не
+    поймёт; при выбранном сжатии добавляется и Content-Encoding.
+
+    Аргументы:
+        accept_encoding (str): заголовок Accept-Encoding запроса
+        content_type (str): MIME-тип ответа
+        status (int): код ответа
+        headers: заголовки ответа (dict или CIMultiDict aiohttp), дополняются на месте
+        size (int): длина несжатого тела
+
+    Возвращает:
+        str | None: кодировка или None, если ответ отправляется как есть
+    """
+    if (not settings.COMPRESSION_ENABLED or not is_compressible(content_type)
+            or status in (204, 304)
+            or size < settings.COMPRESSION_MIN_SIZE
+            or any(header.lower() == 'content-encoding' for header in headers)):
+        return None
+    vary = next((header for header in headers if header.lower() == 'vary'), None)
+    if vary is None:
+        headers['Vary'] = 'Accept-Encoding'
+    elif 'accept-encoding' not in headers[vary].lower():
+        headers[vary] = f'{headers[vary]}, Accept-Encoding'
+    encoding = negotiate_encoding(accept_encoding, DYNAMIC_ENCODINGS)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return encoding
+
+
+def compress_dynamic(data: bytes, encoding: str) -> bytes:
+    """Сжимает data целиком быстрым уровнем из COMPRESSION_LEVELS (для динамических ответов)"""
+    level = settings.COMPRESSION_LEVELS[encoding]
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(data, quality=level)
+    if encoding == 'zstd' and zstandard is not None:
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    raise ValueError(f'Unsupported encoding: {encoding}')
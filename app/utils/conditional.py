@@ -0,0 +1,23 @@
+"""
+Проверки условных заголовков HTTP, общие для синхронного и асинхронного бэкендов.
+"""
+
+from email.utils import parsedate_to_datetime
+
+
+def if_range_matches(if_range: str, mtime: float, last_modified: str, etag: str) -> bool:
+    """
+    Совпадает ли If-Range с текущей версией файла (RFC 9110, раздел 13.1.5).
+
+    ETag сравнивается строго — слабые ETag не подходят; дата — точным
+    совпадением с Last-Modified или не раньше времени изменения файла.
+    Если не совпадает, Range игнорируется и файл отдаётся целиком.
+    """
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    if if_range == last_modified:
+        return True
+    try:
+        return parsedate_to_datetime(if_range).timestamp() >= int(mtime)
+    except (TypeError, ValueError):
+        return False
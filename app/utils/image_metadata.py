@@ -0,0 +1,111 @@
+"""
+Кэш сведений о файлах изображений в памяти процесса.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate
+
+from app.utils.singleton import SingletonMeta
+from config import settings
+
+
+class ImageMetadata:
+    """
+    Сведения о файле изображения, нужные для ответа без обращения к хранилищу и libmagic.
+
+    Атрибуты:
+        filename (str): имя файла
+        key (str): ключ файла в хранилище (app.storage.get_storage)
+        path (str | None): путь к файлу на локальном диске, None — файл
+            в удалённом хранилище (S3Storage)
+        size (int): размер в байтах
+        mime_type (str): MIME-тип
+        mtime (float): время изменения файла
+        last_modified (str): mtime в формате HTTP-даты
+        etag (str): ETag файла (для LocalStorage — в том же формате, что и
+            AdvancedHTTPRequestHandler.make_etag)
+        blob_hash (str | None): хэш содержимого, если файл хранится в BlobStore
+        checked_at (float): когда запись последний раз сверялась с БД (time.monotonic)
+    """
+    __slots__ = ('filename', 'key', 'path', 'size', 'mime_type', 'mtime', 'last_modified', 'etag', 'blob_hash',
+                 'checked_at')
+
+    def __init__(self, filename: str, stored, mime_type: str, blob_hash: str = None):
+        """stored — StoredObject из Storage.stat"""
+        self.filename = filename
+        self.key = stored.key
+        self.path = stored.path
+        self.blob_hash = blob_hash
+        self.size = stored.size
+        self.mime_type = mime_type
+        self.mtime = stored.mtime
+        self.last_modified = formatdate(stored.mtime, usegmt=True)
+        self.etag = stored.etag
+        self.checked_at = time.monotonic()
+
+
+class ImageMetadataCache(metaclass=SingletonMeta):
+    """
+    LRU-кэш имя файла -> ImageMetadata ограниченного размера.
+
+    Заполняется при загрузке и при первом обращении к файлу, очищается при
+    удалении. Имена файлов уникальны (UUID), а содержимое не меняется, но
+    кэш свой у каждого процесса, а evict вызывает только процесс, удаливший
+    изображение. В остальных файл может оставаться на диске (общий файл
+    BlobStore, отложенное удаление UnlinkQueue и files.unlink), поэтому
+    запись старше IMAGE_METADATA_CACHE_TTL секунд обработчик перед отдачей
+    сверяет с таблицей images (is_fresh, touch).
+
+    Аргументы:
+        max_size (int): максимальное количество записей
+    """
+
+    def __init__(self, max_size: int = None):
+        self.max_size = settings.IMAGE_METADATA_CACHE_SIZE if max_size is None else max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, filename: str) -> ImageMetadata | None:
+        with self._lock:
+            meta = self._entries.get(filename)
+            if meta is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(filename)
+            self.hits += 1
+            return meta
+
+    def put(self, meta: ImageMetadata) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[meta.filename] = meta
+            self._entries.move_to_end(meta.filename)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def is_fresh(meta: ImageMetadata) -> bool:
+        """Сверялась ли запись с БД не раньше IMAGE_METADATA_CACHE_TTL секунд назад"""
+        return time.monotonic() - meta.checked_at < settings.IMAGE_METADATA_CACHE_TTL
+
+    @staticmethod
+    def touch(meta: ImageMetadata) -> None:
+        """Отмечает, что запись об изображении в БД только что проверена"""
+        meta.checked_at = time.monotonic()
+
+    def evict(self, filename: str) -> None:
+        with self._lock:
+            self._entries.pop(filename, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses}
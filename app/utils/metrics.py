@@ -0,0 +1,183 @@
+"""
+Метрики Prometheus: запросы по маршрутам, время запросов к БД, загрузки.
+
+Значения пишутся в режиме нескольких процессов prometheus_client: каждый
+воркер prefork ведёт свои файлы в METRICS_MULTIPROC_DIR, а GET /metrics
+в любом воркере суммирует файлы всех процессов. Без пакета
+prometheus_client (или с METRICS_ENABLED=false) все функции модуля
+ничего не делают.
+"""
+
+import glob
+import inspect
+import os
+import threading
+import time
+from functools import wraps
+
+from app.utils import profiling
+from config import settings
+
+if settings.METRICS_ENABLED:
+    # Каталог нужно задать до импорта prometheus_client: по нему выбирается способ хранения значений
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', settings.METRICS_MULTIPROC_DIR)
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+    try:
+        import prometheus_client
+        from prometheus_client import multiprocess
+    except ImportError:  # prometheus_client — необязательная зависимость
+        prometheus_client = None
+else:
+    prometheus_client = None
+
+
+# Границы корзин гистограмм
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+UPLOAD_SIZE_BUCKETS = tuple(2 ** power * 1024 for power in range(4, 14))  # 16KB ... 8MB
+VALIDATION_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+# Метка route для запросов, не попавших ни в один маршрут (404/405)
+UNMATCHED_ROUTE = 'unmatched'
+
+
+class _NullMetric:
+    """Заглушка метрики, когда prometheus_client недоступен"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def observe(self, value: float) -> None:
+        pass
+
+
+def _metric(kind: str, name: str, documentation: str, labels: tuple, **kwargs):
+    if prometheus_client is None:
+        return _NullMetric()
+    return getattr(prometheus_client, kind)(name, documentation, labels, **kwargs)
+
+
+# У всех метрик есть метки: без них prometheus_client создаёт файл значений
+# сразу при импорте, ещё до очистки каталога в clear_multiprocess_dir()
+HTTP_REQUESTS = _metric('Counter', 'http_requests_total', 'HTTP requests',
+                        ('method', 'route', 'status'))
+HTTP_REQUEST_DURATION = _metric('Histogram', 'http_request_duration_seconds', 'HTTP request latency',
+                                ('method', 'route'), buckets=LATENCY_BUCKETS)
+HTTP_REQUEST_BYTES = _metric('Counter', 'http_request_bytes_total', 'Request body bytes (Content-Length)',
+                             ('method', 'route'))
+HTTP_RESPONSE_BYTES = _metric('Counter', 'http_response_bytes_total', 'Response bytes including headers',
+                              ('method', 'route'))
+DB_QUERY_DURATION = _metric('Histogram', 'db_query_duration_seconds', 'Database statement execution time',
+                            ('query',), buckets=DB_QUERY_BUCKETS)
+DB_QUERY_ERRORS = _metric('Counter', 'db_query_errors_total', 'Failed database statements', ('query',))
+UPLOAD_SIZE = _metric('Histogram', 'upload_size_bytes', 'Size of uploaded files',
+                      ('endpoint',), buckets=UPLOAD_SIZE_BUCKETS)
+UPLOAD_VALIDATION_DURATION = _metric('Histogram', 'upload_validation_duration_seconds',
+                                     'libmagic MIME type detection time',
+                                     ('source',), buckets=VALIDATION_BUCKETS)
+
+# Имя запроса DBManager, который сейчас выполняется в потоке (см. db_query)
+_current_query = threading.local()
+
+
+def enabled() -> bool:
+    return prometheus_client is not None
+
+
+def clear_multiprocess_dir() -> None:
+    """
+    Очищает каталог значений перед запуском сервера.
+
+    Вызывается в главном процессе до запуска воркеров: иначе в /metrics
+    попадут счётчики процессов прошлого запуска.
+    """
+    if prometheus_client is None:
+        return
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    os.makedirs(path, exist_ok=True)
+    for file in glob.glob(os.path.join(path, '*.db')):
+        os.remove(file)
+
+
+def render() -> tuple[bytes, str]:
+    """
+    Текст для GET /metrics.
+
+    Возвращает:
+        tuple: (тело ответа, Content-Type)
+    """
+    registry = prometheus_client.CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def observe_request(method: str, route: str | None, status: int, duration: float,
+                    request_bytes: int, response_bytes: int) -> None:
+    """Учитывает обработанный HTTP-запрос. route — шаблон маршрута, а не путь, чтобы не плодить метки"""
+    if prometheus_client is None:
+        return
+    route = route or UNMATCHED_ROUTE
+    HTTP_REQUESTS.labels(method, route, str(status)).inc()
+    HTTP_REQUEST_DURATION.labels(method, route).observe(duration)
+    if request_bytes:
+        HTTP_REQUEST_BYTES.labels(method, route).inc(request_bytes)
+    if response_bytes:
+        HTTP_RESPONSE_BYTES.labels(method, route).inc(response_bytes)
+
+
+def observe_query(duration: float, failed: bool = False) -> None:
+    """Учитывает выполненный запрос к БД под именем текущего метода DBManager"""
+    query = getattr(_current_query, 'name', None) or 'other'
+    DB_QUERY_DURATION.labels(query).observe(duration)
+    if failed:
+        DB_QUERY_ERRORS.labels(query).inc()
+
+
+def db_query(name: str):
+    """
+    Декоратор метода менеджера БД: его запросы попадают в метрики под именем name.
+
+    Для DBManager время каждого запроса измеряет курсор (см.
+    app.db.DBManager.TimedCursor), а декоратор только задаёт имя — ожидание
+    соединения из пула в метрику не попадает. Для асинхронных методов
+    измеряется весь вызов.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                failed = False
+                try:
+                    with profiling.phase('db'):
+                        return await func(*args, **kwargs)
+                except Exception:
+                    failed = True
+                    raise
+                finally:
+                    DB_QUERY_DURATION.labels(name).observe(time.perf_counter() - started)
+                    if failed:
+                        DB_QUERY_ERRORS.labels(name).inc()
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            previous = getattr(_current_query, 'name', None)
+            _current_query.name = name
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _current_query.name = previous
+        return wrapper
+    return decorator
+
+
+def observe_upload(endpoint: str, size: int) -> None:
+    UPLOAD_SIZE.labels(endpoint).observe(size)
+
+
+def observe_validation(source: str, duration: float) -> None:
+    UPLOAD_VALIDATION_DURATION.labels(source).observe(duration)
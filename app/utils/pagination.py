@@ -0,0 +1,40 @@
+"""
+Курсоры для постраничной выдачи списка изображений.
+
+Курсор указывает на последнюю отданную запись — пару (upload_time, id).
+Следующая страница начинается строго после неё, поэтому запрос к БД идёт
+по индексу (upload_time DESC, id DESC) и не зависит от глубины страницы,
+в отличие от OFFSET. Для клиента курсор — непрозрачная строка.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+
+
+def encode_cursor(upload_time: datetime, image_id: int) -> str:
+    """Кодирует позицию (upload_time, id) в строку для параметра cursor"""
+    raw = json.dumps([upload_time.isoformat(), image_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(value: str) -> tuple[datetime, int]:
+    """
+    Разбирает курсор, полученный от клиента.
+
+    Возвращает:
+        tuple: (upload_time, id) последней отданной записи
+
+    Исключения:
+        ValueError: курсор повреждён или подделан
+    """
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+        upload_time, image_id = json.loads(raw)
+        upload_time = datetime.fromisoformat(upload_time)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValueError(f'Invalid cursor: {value!r}') from e
+    if type(image_id) is not int:
+        raise ValueError(f'Invalid cursor: {value!r}')
+    return upload_time, image_id
@@ -0,0 +1,331 @@
+"""
+Профилирование отдельных запросов и журнал медленных запросов.
+
+Запрос профилируется, если в нём передан PROFILE_TOKEN (заголовок
+X-Profile или параметр ?_profile=) или он попал в выборку
+PROFILE_SAMPLE_RATE. Результат пишется в PROFILE_PATH/<метод>_<маршрут>/:
+.pstats для PROFILE_MODE=cprofile (открывается pstats или snakeviz),
+.collapsed для PROFILE_MODE=sampling (свёрнутые стеки для flamegraph.pl
+и speedscope).
+
+Код, который стоит разглядеть отдельно, помечается фазами:
+
+    with profiling.phase('db'):
+        ...
+
+Фазы считаются без вложенности: пока идёт вложенная фаза, время внешней
+не идёт, так что сумма фаз не превышает время запроса. Если запрос
+длился дольше SLOW_REQUEST_THRESHOLD, его фазы пишутся в журнал.
+
+Если ни токен, ни выборка, ни порог не заданы, begin() сразу возвращает
+None, а phase() — пустой контекстный менеджер.
+"""
+
+import contextvars
+import cProfile
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from loguru import logger
+
+from config import settings
+
+# Включена ли хоть одна из возможностей модуля
+ACTIVE = bool(settings.PROFILE_TOKEN or settings.PROFILE_SAMPLE_RATE > 0 or settings.SLOW_REQUEST_THRESHOLD > 0)
+
+# Заголовок и параметр запроса с PROFILE_TOKEN
+PROFILE_HEADER = 'X-Profile'
+PROFILE_QUERY_PARAM = '_profile'
+
+# Трассировка текущего запроса; у каждого потока и каждой задачи asyncio своя
+_current_trace = contextvars.ContextVar('request_trace', default=None)
+
+# Потоки, в которых сейчас работает cProfile: второй профилировщик в том же потоке
+# (например, параллельные корутины асинхронного бэкенда) заменил бы первый
+_cprofile_threads = set()
+_cprofile_lock = threading.Lock()
+
+
+class RequestTrace:
+    """
+    Сведения об одном запросе: фазы и, если запрос профилируется, профилировщик.
+
+    Атрибуты:
+        method (str): HTTP-метод
+        target (str): путь запроса с параметрами
+        started (float): время начала по time.perf_counter
+        phases (dict): имя фазы -> [время в секундах, количество]
+        profiler: cProfile.Profile, StackSampler или None
+    """
+    __slots__ = ('method', 'target', 'started', 'phases', 'profiler', '_stacks', '_token')
+
+    def __init__(self, method: str, target: str):
+        self.method = method
+        self.target = target
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.profiler = None
+        # Незакрытые фазы по потокам: [имя, время начала текущего отрезка]
+        self._stacks = {}
+        self._token = None
+
+    def enter(self, name: str) -> None:
+        now = time.perf_counter()
+        stack = self._stacks.setdefault(threading.get_ident(), [])
+        if stack:
+            # Внешняя фаза стоит, пока идёт вложенная
+            self._charge(stack[-1], now)
+        stack.append([name, now])
+        self._count(name)
+
+    def exit(self) -> None:
+        now = time.perf_counter()
+        stack = self._stacks.get(threading.get_ident())
+        if not stack:
+            return
+        self._charge(stack.pop(), now)
+        if stack:
+            stack[-1][1] = now
+
+    def _charge(self, frame: list, now: float) -> None:
+        self.phases[frame[0]][0] += now - frame[1]
+
+    def _count(self, name: str) -> None:
+        entry = self.phases.get(name)
+        if entry is None:
+            self.phases[name] = [0.0, 1]
+        else:
+            entry[1] += 1
+
+    def breakdown(self, total: float) -> str:
+        """Фазы для журнала: 'read=12.0ms parse=3.1ms db=40.2ms/3 other=1.5ms'"""
+        parts = []
+        for name, (seconds, count) in sorted(self.phases.items(), key=lambda item: -item[1][0]):
+            parts.append(f'{name}={seconds * 1000:.1f}ms' + (f'/{count}' if count > 1 else ''))
+        other = total - sum(seconds for seconds, _ in self.phases.values())
+        parts.append(f'other={max(other, 0.0) * 1000:.1f}ms')
+        return ' '.join(parts)
+
+
+class StackSampler:
+    """
+    Сэмплирующий профилировщик одного потока.
+
+    Общий для процесса фоновый поток раз в PROFILE_SAMPLE_INTERVAL секунд
+    снимает стеки профилируемых потоков через sys._current_frames() и
+    считает одинаковые стеки. Профилируемый поток ничего не делает,
+    поэтому накладные расходы не зависят от количества вызовов в нём.
+    """
+
+    _targets = {}  # id потока -> StackSampler
+    _lock = threading.Lock()
+    _thread = None
+
+    def __init__(self, thread_id: int):
+        self.thread_id = thread_id
+        self.stacks = Counter()
+
+    def start(self) -> None:
+        with StackSampler._lock:
+            StackSampler._targets[self.thread_id] = self
+            thread = StackSampler._thread
+            if thread is None or not thread.is_alive():
+                # После fork() поток из родителя не переходит — запускаем заново
+                thread = threading.Thread(target=StackSampler._run, name='stack-sampler', daemon=True)
+                StackSampler._thread = thread
+                thread.start()
+
+    def stop(self) -> None:
+        with StackSampler._lock:
+            if StackSampler._targets.get(self.thread_id) is self:
+                del StackSampler._targets[self.thread_id]
+
+    def dump(self, path: str) -> None:
+        """Пишет стеки в свёрнутом формате: 'корень;...;вершина количество'"""
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+    @staticmethod
+    def _run() -> None:
+        while True:
+            time.sleep(settings.PROFILE_SAMPLE_INTERVAL)
+            with StackSampler._lock:
+                targets = list(StackSampler._targets.values())
+            if not targets:
+                continue
+            frames = sys._current_frames()
+            for sampler in targets:
+                frame = frames.get(sampler.thread_id)
+                if frame is not None:
+                    sampler.stacks[StackSampler._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_qualname}")
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+
+class _NullPhase:
+    """Фаза, когда запрос не трассируется"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class _Phase:
+    __slots__ = ('trace', 'name')
+
+    def __init__(self, trace: RequestTrace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.trace.enter(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace.exit()
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+def phase(name: str):
+    """Контекстный менеджер фазы текущего запроса (read, parse, write, validate, db, store, ...)"""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NULL_PHASE
+    return _Phase(trace, name)
+
+
+def mask_token(target: str) -> str:
+    """Заменяет значение ?_profile= в пути запроса на *** — токен не должен попадать в журналы"""
+    if f'{PROFILE_QUERY_PARAM}=' not in target:
+        return target
+    return re.sub(rf'([?&]{PROFILE_QUERY_PARAM}=)[^&]*', r'\1***', target)
+
+
+def begin(method: str, target: str, headers) -> RequestTrace | None:
+    """
+    Начинает трассировку запроса.
+
+    Аргументы:
+        method (str): HTTP-метод
+        target (str): путь запроса с параметрами
+        headers: заголовки запроса (нужен только get)
+
+    Возвращает:
+        RequestTrace или None, если модуль выключен
+    """
+    if not ACTIVE:
+        return None
+    profile = _should_profile(target, headers)
+    trace = RequestTrace(method, mask_token(target))
+    if profile:
+        trace.profiler = _start_profiler()
+    trace._token = _current_trace.set(trace)
+    return trace
+
+
+def end(trace: RequestTrace | None, route: str | None, status: int) -> None:
+    """
+    Завершает трассировку: сохраняет профиль и пишет медленный запрос в журнал.
+
+    Аргументы:
+        trace: результат begin()
+        route (str): шаблон маршрута или None, если маршрут не найден
+        status (int): код ответа
+    """
+    if trace is None:
+        return
+    total = time.perf_counter() - trace.started
+    try:
+        _current_trace.reset(trace._token)
+    except ValueError:
+        # end() вызван в другом контексте, чем begin() — переменную сбросит выход из контекста
+        pass
+    profile_path = None
+    if trace.profiler is not None:
+        profile_path = _save_profile(trace, route)
+    if settings.SLOW_REQUEST_THRESHOLD > 0 and total >= settings.SLOW_REQUEST_THRESHOLD:
+        logger.warning(f'Slow request {trace.method} {trace.target} ({route or "unmatched"}) '
+                       f'{status} in {total * 1000:.1f}ms: {trace.breakdown(total)}'
+                       + (f', profile: {profile_path}' if profile_path else ''))
+
+
+def _should_profile(target: str, headers) -> bool:
+    token = settings.PROFILE_TOKEN
+    if token:
+        given = headers.get(PROFILE_HEADER)
+        if given is None and f'{PROFILE_QUERY_PARAM}=' in target:
+            match = re.search(rf'[?&]{PROFILE_QUERY_PARAM}=([^&]*)', target)
+            given = match.group(1) if match else None
+        if given is not None and hmac.compare_digest(given.encode(), token.encode()):
+            return True
+    return settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+
+
+def _start_profiler():
+    if settings.PROFILE_MODE == 'sampling':
+        sampler = StackSampler(threading.get_ident())
+        sampler.start()
+        return sampler
+
+    thread_id = threading.get_ident()
+    with _cprofile_lock:
+        if thread_id in _cprofile_threads:
+            logger.info('Request is not profiled: cProfile is already running in this thread')
+            return None
+        _cprofile_threads.add(thread_id)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _save_profile(trace: RequestTrace, route: str | None) -> str | None:
+    profiler = trace.profiler
+    if isinstance(profiler, StackSampler):
+        profiler.stop()
+        extension = 'collapsed'
+    else:
+        profiler.disable()
+        with _cprofile_lock:
+            _cprofile_threads.discard(threading.get_ident())
+        extension = 'pstats'
+
+    directory = os.path.join(settings.PROFILE_PATH, _route_slug(trace.method, route))
+    path = os.path.join(directory, f'{datetime.now():%Y%m%d-%H%M%S-%f}-{os.getpid()}.{extension}')
+    try:
+        os.makedirs(directory, exist_ok=True)
+        if extension == 'collapsed':
+            profiler.dump(path)
+        else:
+            profiler.dump_stats(path)
+    except OSError as e:
+        logger.error(f'Cannot save profile {path}: {e}')
+        return None
+    logger.info(f'Profile of {trace.method} {trace.target} saved to {path}')
+    return path
+
+
+def _route_slug(method: str, route: str | None) -> str:
+    """GET /api/images/<filename> -> GET_api_images_filename"""
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', route or 'unmatched').strip('_') or 'root'
+    return f'{method}_{slug}'
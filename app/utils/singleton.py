@@ -1,3 +1,6 @@
+import threading
+
+
 class SingletonMeta(type):
     """
     Метакласс SingletonMeta реализует паттерн Singleton.
@@ -5,6 +8,9 @@ class SingletonMeta(type):
     Он гарантирует, что от любого класса, использующего этот метакласс,
     будет создан только один экземпляр.
 
+    Создание экземпляра защищено блокировкой, поэтому при многопоточном
+    сервере два потока не смогут одновременно создать два разных объекта.
+
     Использование:
         class MyClass(metaclass=SingletonMeta):
             pass
@@ -16,11 +22,17 @@ class SingletonMeta(type):
     Атрибуты:
         _instances (dict): Словарь для хранения единственного экземпляра
         каждого класса, использующего этот метакласс.
+        _lock (threading.RLock): Блокировка на время создания экземпляра.
     """
     _instances = {}
+    _lock = threading.RLock()
 
     def __call__(cls, *args, **kwargs):
         if cls not in cls._instances:
-            instance = super().__call__(*args, **kwargs)
-            cls._instances[cls] = instance
-        return cls._instances[cls] 
\ No newline at end of file
+            with cls._lock:
+                # Повторная проверка: пока мы ждали блокировку,
+                # экземпляр мог создать другой поток
+                if cls not in cls._instances:
+                    instance = super().__call__(*args, **kwargs)
+                    cls._instances[cls] = instance
+        return cls._instances[cls]
@@ -0,0 +1,168 @@
+"""
+Кэш статических файлов в памяти.
+"""
+
+import hashlib
+import mimetypes
+import os
+import signal
+import threading
+from email.utils import formatdate
+
+from loguru import logger
+
+from app.utils.compression import SUPPORTED_ENCODINGS, compress, is_compressible
+from app.utils.singleton import SingletonMeta
+from config import settings
+
+
+# Типы, которые задавал serve_static_file до появления кэша
+CONTENT_TYPES = {
+    '.html': 'text/html',
+    '.js': 'application/javascript',
+    '.css': 'text/css',
+    '.ico': 'image/x-icon',
+}
+
+# Файлы меньше этого размера не сжимаем — выигрыш меньше заголовков
+MIN_COMPRESS_SIZE = 256
+
+
+class StaticAsset:
+    """
+    Статический файл, загруженный в память.
+
+    Атрибуты:
+        name (str): путь относительно STATIC_PATH
+        body (bytes): содержимое файла
+        content_type (str): MIME-тип
+        etag (str): ETag по хэшу содержимого
+        mtime (float): время изменения файла
+        last_modified (str): mtime в формате HTTP-даты
+        encodings (dict): кодировка -> заранее сжатое содержимое
+    """
+
+    def __init__(self, name: str, body: bytes, content_type: str, mtime: float):
+        self.name = name
+        self.body = body
+        self.content_type = content_type
+        self.mtime = mtime
+        self.last_modified = formatdate(mtime, usegmt=True)
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self.encodings = {}
+
+        if is_compressible(content_type) and len(body) >= MIN_COMPRESS_SIZE:
+            for encoding in SUPPORTED_ENCODINGS:
+                compressed = compress(body, encoding)
+                if len(compressed) < len(body):
+                    self.encodings[encoding] = compressed
+
+    def etag_for(self, encoding: str | None) -> str:
+        """ETag конкретного представления: сжатые варианты — это другие байты"""
+        if encoding is None:
+            return self.etag
+        return f'{self.etag[:-1]}-{encoding}"'
+
+
+class StaticAssetCache(metaclass=SingletonMeta):
+    """
+    Таблица статических файлов из STATIC_PATH в памяти.
+
+    Файлы читаются и сжимаются (gzip, brotli, zstd) один раз при запуске, поэтому
+    запрос к статике — это поиск в словаре и запись в сокет. Таблица
+    перезагружается по SIGHUP и при изменении файлов: фоновый поток раз в
+    STATIC_CACHE_CHECK_INTERVAL секунд сверяет mtime и размеры файлов.
+    Новая таблица собирается целиком и подменяет старую одной операцией.
+
+    Аргументы:
+        root (str): директория со статическими файлами
+    """
+
+    def __init__(self, root: str = None):
+        self.root = root or settings.STATIC_PATH
+        self._assets = {}
+        self._signature = None
+        self._lock = threading.RLock()
+        self._watcher = None
+        self._fork_hook_installed = False
+        self.reload()
+
+    def get(self, name: str) -> StaticAsset | None:
+        """Возвращает файл по пути относительно STATIC_PATH или None"""
+        return self._assets.get(name)
+
+    def reload(self) -> None:
+        """Перечитывает все файлы из STATIC_PATH"""
+        with self._lock:
+            assets = {}
+            signature = set()
+            for name, path, stat in self._scan():
+                signature.add((name, stat.st_mtime_ns, stat.st_size))
+                try:
+                    with open(path, 'rb') as f:
+                        body = f.read()
+                except OSError as e:
+                    logger.error(f'Cannot load static file {path}: {e}')
+                    continue
+                ext = os.path.splitext(name)[1].lower()
+                content_type = CONTENT_TYPES.get(ext) or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+                assets[name] = StaticAsset(name, body, content_type, stat.st_mtime)
+            self._assets = assets
+            self._signature = frozenset(signature)
+        logger.info(f'Static assets loaded from {self.root}: {sorted(assets)}')
+
+    def _scan(self):
+        """Перебирает файлы STATIC_PATH: (имя, путь, stat)"""
+        if not os.path.isdir(self.root):
+            logger.warning(f'STATIC_PATH {self.root} does not exist')
+            return
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for filename in filenames:
+                if filename.startswith('.'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                yield name, path, stat
+
+    def _current_signature(self) -> frozenset:
+        return frozenset((name, stat.st_mtime_ns, stat.st_size) for name, _, stat in self._scan())
+
+    def start_watcher(self, interval: float = None) -> None:
+        """
+        Запускает фоновый поток, который перезагружает таблицу при изменении файлов.
+
+        После fork() поток перезапускается в дочернем процессе автоматически.
+        """
+        interval = settings.STATIC_CACHE_CHECK_INTERVAL if interval is None else interval
+        if interval <= 0 or (self._watcher and self._watcher.is_alive()):
+            return
+
+        def watch():
+            stop = threading.Event()
+            while not stop.wait(interval):
+                try:
+                    if self._current_signature() != self._signature:
+                        logger.info('Static files changed, reloading')
+                        self.reload()
+                except Exception as e:
+                    logger.error(f'Static assets watcher error: {e}')
+
+        self._watcher = threading.Thread(target=watch, name='static-assets-watcher', daemon=True)
+        self._watcher.start()
+        if not self._fork_hook_installed:
+            os.register_at_fork(after_in_child=lambda: self._restart_watcher(interval))
+            self._fork_hook_installed = True
+
+    def _restart_watcher(self, interval: float) -> None:
+        self._watcher = None
+        self._lock = threading.RLock()
+        self.start_watcher(interval)
+
+    def install_sighup(self) -> None:
+        """Перезагружать таблицу по сигналу SIGHUP"""
+        signal.signal(signal.SIGHUP, lambda signum, frame: self.reload())
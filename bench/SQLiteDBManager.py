@@ -0,0 +1,287 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from loguru import logger
+
+from app.utils import profiling
+from app.utils.metrics import db_query
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    filename TEXT NOT NULL UNIQUE,
+    original_name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    file_type TEXT NOT NULL,
+    upload_time TIMESTAMP NOT NULL,
+    mime_type TEXT,
+    blob_hash TEXT REFERENCES blobs(hash)
+);
+CREATE INDEX IF NOT EXISTS idx_images_upload_time_id ON images(upload_time DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_images_blob_hash ON images(blob_hash);
+"""
+
+# upload_time хранится строкой ISO с микросекундами: так строки сравниваются
+# в том же порядке, что и время, и курсор (upload_time, id) работает как в PostgreSQL
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' ', timespec='microseconds'))
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode()))
+
+
+class SQLiteDBManager:
+    """
+    Замена DBManager на SQLite для нагрузочных тестов (python -m bench).
+
+    Повторяет методы DBManager, которые вызывают обработчики запросов,
+    поэтому сервер работает без PostgreSQL. База — один файл, так что
+    воркеры prefork видят одни и те же записи. Очередь задач (connection()
+    для app.jobs) не поддерживается: сервер в тестах запускается с
+    JOBS_ENABLED=false.
+
+    У каждого потока своё соединение; после fork() воркер открывает новые.
+
+    Аргументы:
+        path (str): путь к файлу базы
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=10000')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Транзакция записи: BEGIN IMMEDIATE сразу берёт блокировку, без взаимоблокировок при повышении"""
+        conn = self._conn()
+        with profiling.phase('db'):
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn.cursor()
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+    def _query(self, query: str, params: tuple = ()) -> list[tuple]:
+        with profiling.phase('db'):
+            return self._conn().execute(query, params).fetchall()
+
+    def close(self) -> None:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def pool_stats(self) -> dict:
+        return {'backend': 'sqlite', 'path': self.path}
+
+    def init_tables(self) -> None:
+        self._conn().executescript(SCHEMA)
+        logger.info(f'SQLite tables initialized in {self.path}')
+
+    @db_query('get_images')
+    def get_images(self, page: int = 1, per_page: int = 10, after: tuple = None) -> list[tuple]:
+        if after is not None:
+            return self._query("""
+                SELECT id, filename, original_name, size, file_type, upload_time
+                FROM images
+                WHERE (upload_time, id) < (?, ?)
+                ORDER BY upload_time DESC, id DESC
+                LIMIT ?
+            """, (after[0], after[1], per_page))
+        return self._query("""
+            SELECT id, filename, original_name, size, file_type, upload_time
+            FROM images
+            ORDER BY upload_time DESC, id DESC
+            LIMIT ? OFFSET ?
+        """, (per_page, (page - 1) * per_page))
+
+    @db_query('count_images')
+    def count_images(self) -> int:
+        return self._query("SELECT COUNT(*) FROM images")[0][0]
+
+    @db_query('get_filename_by_id')
+    def get_filename_by_id(self, image_id) -> str | None:
+        rows = self._query("SELECT filename FROM images WHERE id = ?", (image_id,))
+        return rows[0][0] if rows else None
+
+    @db_query('add_image')
+    def add_image(self, filename: str, original_name: str, length: int, ext: str,
+                  mime_type: str = None, blob_hash: str = None) -> None:
+        self.add_images([(filename, original_name, length, ext, mime_type, blob_hash)])
+
+    @db_query('add_images')
+    def add_images(self, images: list[tuple]) -> None:
+        if not images:
+            return
+        now = datetime.now()
+        with self._transaction() as cursor:
+            for _, _, size, _, _, blob_hash in images:
+                if blob_hash is not None:
+                    cursor.execute(
+                        "INSERT INTO blobs (hash, size, ref_count) VALUES (?, ?, 1) "
+                        "ON CONFLICT (hash) DO UPDATE SET ref_count = ref_count + 1",
+                        (blob_hash, size)
+                    )
+            cursor.executemany(
+                "INSERT INTO images (filename, original_name, size, file_type, mime_type, blob_hash, upload_time) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [row + (now,) for row in images]
+            )
+
+    @db_query('get_image_file')
+    def get_image_file(self, filename: str) -> tuple[str | None, str | None] | None:
+        rows = self._query("SELECT mime_type, blob_hash FROM images WHERE filename = ?", (filename,))
+        return rows[0] if rows else None
+
+    @db_query('set_mime_type')
+    def set_mime_type(self, filename: str, mime_type: str) -> None:
+        with self._transaction() as cursor:
+            cursor.execute("UPDATE images SET mime_type = ? WHERE filename = ? AND mime_type IS NULL",
+                           (mime_type, filename))
+
+    @db_query('delete_image')
+    def delete_image(self, filename: str, release_blob: callable = None) -> None:
+        self._delete_one("filename = ?", filename, release_blob)
+
+    @db_query('delete_image_by_id')
+    def delete_image_by_id(self, image_id, release_blob: callable = None) -> None:
+        self._delete_one("id = ?", image_id, release_blob)
+
+    @db_query('delete_images')
+    def delete_images(self, ids: list[int] = (), filenames: list[str] = (),
+                      on_deleted: callable = None) -> list[tuple]:
+        deleted = []
+        with self._transaction() as cursor:
+            for column, keys in (('id', list(ids)), ('filename', list(filenames))):
+                # Не больше 500 параметров в запросе: у SQLite ограничено их число
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    cursor.execute(
+                        f"DELETE FROM images WHERE {column} IN ({', '.join('?' * len(chunk))}) "
+                        "RETURNING id, filename, blob_hash",
+                        chunk
+                    )
+                    deleted.extend(cursor.fetchall())
+            for _, _, blob_hash in deleted:
+                if blob_hash is not None:
+                    cursor.execute("UPDATE blobs SET ref_count = ref_count - 1 WHERE hash = ?", (blob_hash,))
+            if deleted and on_deleted is not None:
+                on_deleted(cursor, deleted)
+        return deleted
+
+    @db_query('purge_blobs')
+    def purge_blobs(self, hashes: list[str], release_blob: callable = None) -> list[str]:
+        released = []
+        with self._transaction() as cursor:
+            for blob_hash in hashes:
+                cursor.execute("DELETE FROM blobs WHERE hash = ? AND ref_count <= 0 RETURNING hash", (blob_hash,))
+                if cursor.fetchone():
+                    released.append(blob_hash)
+                    if release_blob is not None:
+                        release_blob(blob_hash)
+        return released
+
+    def _delete_one(self, condition: str, key, release_blob: callable = None) -> None:
+        with self._transaction() as cursor:
+            cursor.execute(f"DELETE FROM images WHERE {condition} RETURNING blob_hash", (key,))
+            row = cursor.fetchone()
+            if not row or not row[0]:
+                return
+            cursor.execute("UPDATE blobs SET ref_count = ref_count - 1 WHERE hash = ? RETURNING ref_count", (row[0],))
+            ref_count = cursor.fetchone()
+            if ref_count and ref_count[0] <= 0:
+                cursor.execute("DELETE FROM blobs WHERE hash = ?", (row[0],))
+                if release_blob is not None:
+                    release_blob(row[0])
+
+
+class AsyncSQLiteDBManager:
+    """
+    Замена AsyncDBManager поверх SQLiteDBManager.
+
+    Методы вызывают SQLiteDBManager прямо в потоке цикла событий: запрос
+    к SQLite занимает микросекунды, а перенос в поток стоил бы дороже.
+    """
+
+    def __init__(self, path: str):
+        self.db = SQLiteDBManager(path)
+
+    async def connect(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        self.db.close()
+
+    def pool_stats(self) -> dict:
+        return self.db.pool_stats()
+
+    async def init_tables(self) -> None:
+        self.db.init_tables()
+
+    async def get_images(self, page: int = 1, per_page: int = 10, after: tuple = None) -> list[tuple]:
+        return self.db.get_images(page, per_page, after)
+
+    async def count_images(self) -> int:
+        return self.db.count_images()
+
+    async def get_filename_by_id(self, image_id: int) -> str | None:
+        return self.db.get_filename_by_id(image_id)
+
+    async def add_image(self, filename: str, original_name: str, length: int, ext: str,
+                        mime_type: str = None, blob_hash: str = None) -> None:
+        self.db.add_image(filename, original_name, length, ext, mime_type, blob_hash)
+
+    async def add_images(self, images: list[tuple]) -> None:
+        self.db.add_images(images)
+
+    async def get_image_file(self, filename: str) -> tuple[str | None, str | None] | None:
+        return self.db.get_image_file(filename)
+
+    async def set_mime_type(self, filename: str, mime_type: str) -> None:
+        self.db.set_mime_type(filename, mime_type)
+
+    async def delete_image(self, filename: str, release_blob: callable = None) -> None:
+        self.db.delete_image(filename, release_blob)
+
+    async def delete_image_by_id(self, image_id: int, release_blob: callable = None) -> None:
+        self.db.delete_image_by_id(image_id, release_blob)
+
+    async def delete_images(self, ids: list[int] = (), filenames: list[str] = (),
+                            on_deleted: callable = None) -> list[tuple]:
+        # on_deleted — корутина для очереди задач, которой здесь нет (JOBS_ENABLED=false)
+        return self.db.delete_images(ids, filenames)
+
+    async def purge_blobs(self, hashes: list[str], release_blob: callable = None) -> list[str]:
+        return self.db.purge_blobs(hashes, release_blob)
+
+
+def install(path: str) -> None:
+    """Подменяет DBManager и AsyncDBManager на SQLite-версии: первый вызов DBManager() вернёт замену"""
+    from app.db.DBManager import DBManager
+    from app.utils.singleton import SingletonMeta
+
+    SingletonMeta._instances[DBManager] = SQLiteDBManager(path)
+    try:
+        from app.db.AsyncDBManager import AsyncDBManager
+    except ImportError:  # asyncpg нужен только асинхронному бэкенду
+        return
+    SingletonMeta._instances[AsyncDBManager] = AsyncSQLiteDBManager(path)
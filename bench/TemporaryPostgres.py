@@ -0,0 +1,94 @@
+import glob
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+
+from loguru import logger
+
+
+class TemporaryPostgres:
+    """
+    Временный экземпляр PostgreSQL для нагрузочных тестов.
+
+    initdb создаёт кластер во временной директории, pg_ctl запускает его
+    на свободном порту (только 127.0.0.1, без пароля), после stop()
+    директория удаляется. Нужны серверные программы PostgreSQL: они ищутся
+    в PATH и в /usr/lib/postgresql/*/bin.
+
+    Использование:
+        with TemporaryPostgres() as pg:
+            env.update(pg.env())
+    """
+
+    USER = 'bench'
+    DBNAME = 'image_hosting'
+
+    def __init__(self):
+        self.bin_dir = self.find_bin_dir()
+        if self.bin_dir is None:
+            raise RuntimeError('PostgreSQL server binaries (initdb, pg_ctl) not found')
+        self.port = None
+        self.directory = None
+
+    @staticmethod
+    def find_bin_dir() -> str | None:
+        """Директория с initdb и pg_ctl или None"""
+        initdb = shutil.which('initdb')
+        if initdb:
+            return os.path.dirname(initdb)
+        candidates = sorted(glob.glob('/usr/lib/postgresql/*/bin/initdb'), reverse=True)
+        return os.path.dirname(candidates[0]) if candidates else None
+
+    def start(self) -> None:
+        self.directory = tempfile.mkdtemp(prefix='bench-pg-')
+        data = os.path.join(self.directory, 'data')
+        self.port = _free_port()
+        self._run('initdb', '-D', data, '-U', self.USER, '--auth=trust', '--no-sync', '-E', 'UTF8')
+        # fsync выключен: база одноразовая, а тест должен мерить сервер, а не диск
+        options = (f'-p {self.port} -k {self.directory} -c listen_addresses=127.0.0.1 '
+                   f'-c fsync=off -c synchronous_commit=off -c full_page_writes=off')
+        self._run('pg_ctl', '-D', data, '-l', os.path.join(self.directory, 'postgres.log'),
+                  '-o', options, '-w', 'start')
+        self._run('createdb', '-h', '127.0.0.1', '-p', str(self.port), '-U', self.USER, self.DBNAME)
+        logger.info(f'Temporary PostgreSQL started on port {self.port} in {self.directory}')
+
+    def stop(self) -> None:
+        if self.directory is None:
+            return
+        try:
+            self._run('pg_ctl', '-D', os.path.join(self.directory, 'data'), '-m', 'immediate', '-w', 'stop')
+        finally:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+
+    def env(self) -> dict:
+        """Переменные окружения для config/settings.py"""
+        return {
+            'DB_HOST': '127.0.0.1',
+            'DB_PORT': str(self.port),
+            'DB_USER': self.USER,
+            'DB_PASSWORD': '',
+            'DB_NAME': self.DBNAME,
+        }
+
+    def _run(self, program: str, *args) -> None:
+        result = subprocess.run([os.path.join(self.bin_dir, program), *args],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f'{program} failed with code {result.returncode}: {result.stderr.strip()}')
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
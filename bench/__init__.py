@@ -0,0 +1,3 @@
+"""
+Нагрузочный тест сервера (python -m bench), см. bench/__main__.py.
+"""
@@ -0,0 +1,210 @@
+"""
+Нагрузочный тест сервера: python -m bench
+
+Для каждого режима (бэкенд:режим, например sync:prefork) запускается
+отдельный сервер в чистом временном каталоге. В него загружается
+--images изображений, затем --concurrency клиентов --duration секунд
+выполняют смесь операций --mix (см. bench/workload.py). Для каждого
+режима выводятся RPS, задержки p50/p95/p99 и пиковая память сервера со
+всеми воркерами; отчёт сохраняется в bench/results/<время>-<коммит>.json.
+
+База данных (--db):
+    sqlite   — SQLiteDBManager вместо PostgreSQL, ничего не нужно ставить
+    postgres — временный PostgreSQL (TemporaryPostgres), нужны initdb и pg_ctl
+
+Примеры:
+    python -m bench
+    python -m bench --modes sync:threaded,async:single --concurrency 32 --duration 30
+    python -m bench --compare bench/results/20240101-120000-abcdef1234.json
+"""
+
+import argparse
+import http.client
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench import results, workload
+from bench.memory import PeakMemory
+from bench.TemporaryPostgres import TemporaryPostgres
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BACKENDS = ('sync', 'async')
+MODES = ('single', 'threaded', 'prefork')
+DEFAULT_MODES = 'sync:threaded,sync:prefork,async:single,async:prefork'
+DEFAULT_MIX = 'get=70,list=15,upload=10,delete=5'
+
+STARTUP_TIMEOUT = 60
+SHUTDOWN_TIMEOUT = 15
+
+
+def parse_modes(value: str) -> list[tuple[str, str]]:
+    """'sync:threaded,async:single' -> [('sync', 'threaded'), ('async', 'single')]"""
+    modes = []
+    for item in value.split(','):
+        backend, _, mode = item.strip().partition(':')
+        if backend not in BACKENDS or mode not in MODES:
+            raise argparse.ArgumentTypeError(f'Invalid mode {item!r}, expected <{"|".join(BACKENDS)}>:<{"|".join(MODES)}>')
+        modes.append((backend, mode))
+    return modes
+
+
+def run_mode(backend: str, mode: str, args, samples: list[dict]) -> dict:
+    """Запускает сервер в режиме backend:mode, наполняет его и выполняет нагрузку"""
+    run_dir = tempfile.mkdtemp(prefix=f'bench-{backend}-{mode}-')
+    postgres = None
+    server = None
+    try:
+        env = dict(os.environ,
+                   PYTHONPATH=ROOT,
+                   JOBS_ENABLED='false',
+                   PROMETHEUS_MULTIPROC_DIR=os.path.join(run_dir, 'metrics'),
+                   ACCESS_LOG_FILE=os.path.join(run_dir, 'logs', 'access.log'),
+                   PROFILE_PATH=os.path.join(run_dir, 'profiles'))
+        command = [sys.executable, '-m', 'bench.server', '--backend', backend, '--mode', mode,
+                   '--workers', str(args.workers), '--port', str(_free_port()), '--data-dir', run_dir]
+        if args.db == 'postgres':
+            postgres = TemporaryPostgres()
+            postgres.start()
+            env.update(postgres.env())
+        else:
+            command += ['--sqlite', os.path.join(run_dir, 'db.sqlite')]
+        port = int(command[command.index('--port') + 1])
+
+        with open(os.path.join(run_dir, 'server.log'), 'wb') as log:
+            server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+        _wait_ready(server, port, os.path.join(run_dir, 'server.log'))
+
+        print(f'{backend}:{mode}: seeding {args.images} images', flush=True)
+        filenames = workload.seed_images('127.0.0.1', port, samples, args.images)
+
+        print(f'{backend}:{mode}: {args.concurrency} clients, {args.warmup}s warmup + {args.duration}s', flush=True)
+        memory = PeakMemory(server.pid)
+        memory.start()
+        try:
+            client_results = workload.run_clients(
+                '127.0.0.1', port, concurrency=args.concurrency, processes=args.client_processes,
+                duration=args.duration, warmup=args.warmup, mix=args.mix, filenames=filenames,
+                samples=samples, seed=args.seed)
+        finally:
+            memory.stop()
+
+        summary = results.summarize(client_results, args.duration)
+        return dict({'name': f'{backend}:{mode}', 'backend': backend, 'mode': mode,
+                     'workers': args.workers if mode == 'prefork' else 1}, **summary,
+                    peak_rss_mb=round(memory.peak_rss / 2 ** 20, 1),
+                    peak_pss_mb=None if memory.peak_pss is None else round(memory.peak_pss / 2 ** 20, 1))
+    finally:
+        if server is not None:
+            _stop(server)
+        if postgres is not None:
+            postgres.stop()
+        if args.keep:
+            print(f'{backend}:{mode}: files kept in {run_dir}', flush=True)
+        else:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def _wait_ready(server: subprocess.Popen, port: int, log_path: str) -> None:
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'Server exited with code {server.returncode}, see {log_path}')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/images?per_page=1')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return
+            conn.close()
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'Server did not start in {STARTUP_TIMEOUT}s, see {log_path}')
+
+
+def _stop(server: subprocess.Popen) -> None:
+    if server.poll() is not None:
+        return
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(SHUTDOWN_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        # Воркеры prefork — в той же группе процессов, что и главный
+        server.kill()
+        server.wait()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    cpu_count = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description='Нагрузочный тест сервера',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--modes', type=parse_modes, default=DEFAULT_MODES,
+                        help='режимы через запятую: бэкенд:режим')
+    parser.add_argument('--workers', type=int, default=cpu_count, help='воркеров в режиме prefork')
+    parser.add_argument('--db', choices=['sqlite', 'postgres'], default='sqlite',
+                        help='sqlite — SQLiteDBManager, postgres — временный PostgreSQL')
+    parser.add_argument('--images', type=int, default=200, help='изображений в начальном наполнении')
+    parser.add_argument('--concurrency', type=int, default=16, help='одновременных соединений')
+    parser.add_argument('--client-processes', type=int, default=max(1, cpu_count // 2),
+                        help='процессов, между которыми делятся клиенты')
+    parser.add_argument('--duration', type=float, default=20, help='длительность замера, сек')
+    parser.add_argument('--warmup', type=float, default=3, help='прогрев перед замером, сек')
+    parser.add_argument('--mix', type=workload.parse_mix, default=DEFAULT_MIX,
+                        help=f'веса операций ({", ".join(workload.OPERATIONS)})')
+    parser.add_argument('--seed', type=int, default=1, help='seed генератора запросов и изображений')
+    parser.add_argument('--output', help='файл отчёта (по умолчанию bench/results/<время>-<коммит>.json)')
+    parser.add_argument('--compare', help='отчёт прошлого запуска для сравнения')
+    parser.add_argument('--keep', action='store_true', help='не удалять каталоги серверов (журналы, база)')
+    args = parser.parse_args()
+
+    if args.db == 'postgres' and TemporaryPostgres.find_bin_dir() is None:
+        parser.error('--db postgres needs PostgreSQL server binaries (initdb, pg_ctl)')
+
+    samples_dir = tempfile.mkdtemp(prefix='bench-samples-')
+    try:
+        samples = workload.make_samples(samples_dir, args.seed)
+        report = results.environment()
+        report['config'] = {
+            'db': args.db,
+            'workers': args.workers,
+            'images': args.images,
+            'concurrency': args.concurrency,
+            'client_processes': args.client_processes,
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'mix': args.mix,
+            'seed': args.seed,
+            'sample_sizes': [sample['size'] for sample in samples],
+        }
+        report['runs'] = []
+        for backend, mode in args.modes:
+            try:
+                report['runs'].append(run_mode(backend, mode, args, samples))
+            except Exception as e:
+                print(f'{backend}:{mode}: failed: {e}', file=sys.stderr, flush=True)
+                report['runs'].append({'name': f'{backend}:{mode}', 'backend': backend, 'mode': mode,
+                                       'error': str(e)})
+    finally:
+        shutil.rmtree(samples_dir, ignore_errors=True)
+
+    path = results.save(report, args.output)
+    print()
+    print(results.format_table(report, results.load(args.compare) if args.compare else None))
+    print(f'\nReport saved to {path}')
+
+
+if __name__ == '__main__':
+    main()
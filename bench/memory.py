@@ -0,0 +1,84 @@
+"""
+Пиковая память сервера: процесс и все его потомки (воркеры prefork,
+пул миниатюр), по данным /proc.
+"""
+
+import os
+import threading
+
+
+class PeakMemory:
+    """
+    Фоновый поток, который раз в interval секунд суммирует память дерева
+    процессов с корнем pid и запоминает максимум.
+
+    RSS считает общие после fork() страницы в каждом воркере, поэтому сумма
+    RSS завышена; PSS делит общие страницы между процессами и ближе к
+    реальному расходу (None, если ядро не даёт /proc/<pid>/smaps_rollup).
+
+    Атрибуты:
+        peak_rss (int): максимум суммы RSS, байт
+        peak_pss (int | None): максимум суммы PSS, байт
+    """
+
+    def __init__(self, pid: int, interval: float = 0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_pss = 0 if os.path.exists('/proc/self/smaps_rollup') else None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='peak-memory', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def sample(self) -> None:
+        rss = 0
+        pss = 0
+        for pid in process_tree(self.pid):
+            # Процесс мог завершиться, пока мы обходили дерево
+            rss += _read_kb(f'/proc/{pid}/status', 'VmRSS:') or 0
+            if self.peak_pss is not None:
+                pss += _read_kb(f'/proc/{pid}/smaps_rollup', 'Pss:') or 0
+        self.peak_rss = max(self.peak_rss, rss * 1024)
+        if self.peak_pss is not None:
+            self.peak_pss = max(self.peak_pss, pss * 1024)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+
+def process_tree(root: int) -> list[int]:
+    """pid процесса root и всех его потомков"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # Имя процесса в скобках может содержать пробелы — поля считаем после ')'
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    tree = [root]
+    for pid in tree:
+        tree.extend(children.get(pid, ()))
+    return tree
+
+
+def _read_kb(path: str, field: str) -> int | None:
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
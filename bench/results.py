@@ -0,0 +1,170 @@
+"""
+Сводка результатов нагрузочного теста, сохранение в JSON и сравнение
+с прошлым запуском.
+
+Файл результата содержит коммит, машину и параметры запуска, чтобы было
+видно, сравнимы ли два файла: числа с разных машин или с разной нагрузкой
+сравнивать бессмысленно.
+"""
+
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Перцентиль по ближайшему рангу; values отсортированы"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(fraction * len(values) + 0.5) - 1))
+    return values[index]
+
+
+def latency_summary(values: list[float]) -> dict:
+    """Задержки в миллисекундах: p50, p95, p99, среднее и максимум"""
+    values = sorted(values)
+    return {
+        'p50': round(percentile(values, 0.50) * 1000, 3),
+        'p95': round(percentile(values, 0.95) * 1000, 3),
+        'p99': round(percentile(values, 0.99) * 1000, 3),
+        'mean': round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        'max': round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+def summarize(client_results: list[dict], duration: float) -> dict:
+    """Сводит результаты процессов-клиентов (см. workload.run_clients) по операциям и в целом"""
+    latencies = {}
+    statuses = {}
+    errors = {}
+    for result in client_results:
+        for operation, values in result['latencies'].items():
+            latencies.setdefault(operation, []).extend(values)
+        for operation, counts in result['statuses'].items():
+            merged = statuses.setdefault(operation, {})
+            for status, count in counts.items():
+                merged[str(status)] = merged.get(str(status), 0) + count
+        for operation, count in result['errors'].items():
+            errors[operation] = errors.get(operation, 0) + count
+
+    operations = {}
+    for operation in sorted(latencies):
+        values = latencies[operation]
+        operations[operation] = {
+            'requests': len(values),
+            'rps': round(len(values) / duration, 2),
+            'errors': errors.get(operation, 0),
+            'statuses': statuses.get(operation, {}),
+            'latency_ms': latency_summary(values),
+        }
+    everything = [value for values in latencies.values() for value in values]
+    return {
+        'requests': len(everything),
+        'rps': round(len(everything) / duration, 2),
+        'errors': sum(errors.values()),
+        'latency_ms': latency_summary(everything),
+        'operations': operations,
+    }
+
+
+def environment() -> dict:
+    """Коммит и машина, на которой выполнялся тест"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def git(*args) -> str | None:
+        try:
+            return subprocess.run(['git', *args], cwd=root, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    status = git('status', '--porcelain', '--untracked-files=no')
+    return {
+        'commit': git('rev-parse', 'HEAD'),
+        'commit_subject': git('log', '-1', '--format=%s'),
+        'dirty': bool(status) if status is not None else None,
+        'machine': {
+            'cpu_count': os.cpu_count(),
+            'cpu_model': _cpu_model(),
+            'memory_mb': _memory_mb(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+    }
+
+
+def save(report: dict, path: str = None) -> str:
+    """Сохраняет отчёт в bench/results/<время>-<коммит>.json (или в path) и возвращает путь"""
+    if path is None:
+        commit = (report.get('commit') or 'unknown')[:10] + ('-dirty' if report.get('dirty') else '')
+        path = os.path.join(RESULTS_DIR, f'{datetime.now():%Y%m%d-%H%M%S}-{commit}.json')
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def format_table(report: dict, baseline: dict = None) -> str:
+    """
+    Таблица по режимам: RPS, задержки, ошибки и пиковая память.
+
+    Если задан baseline (отчёт прошлого запуска), рядом с RPS и p99
+    пишется изменение в процентах для тех же режимов.
+    """
+    previous = {run['name']: run for run in (baseline or {}).get('runs', [])}
+    header = (f"{'mode':<16} {'rps':>14} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>16} "
+              f"{'errors':>7} {'rss MB':>8} {'pss MB':>8}")
+    lines = [header, '-' * len(header)]
+    for run in report['runs']:
+        if 'error' in run:
+            lines.append(f"{run['name']:<16} failed: {run['error']}")
+            continue
+        before = previous.get(run['name'])
+        rps = f"{run['rps']:.1f}" + (_change(run['rps'], before['rps']) if before and 'rps' in before else '')
+        p99 = f"{run['latency_ms']['p99']:.1f}" + (
+            _change(run['latency_ms']['p99'], before['latency_ms']['p99']) if before and 'latency_ms' in before else '')
+        pss = run.get('peak_pss_mb')
+        lines.append(f"{run['name']:<16} {rps:>14} {run['latency_ms']['p50']:>9.1f} {run['latency_ms']['p95']:>9.1f} "
+                     f"{p99:>16} {run['errors']:>7} {run['peak_rss_mb']:>8.1f} "
+                     f"{pss if pss is None else format(pss, '.1f'):>8}")
+        for operation, stats in run['operations'].items():
+            lines.append(f"  {operation:<14} {stats['rps']:>14.1f} {stats['latency_ms']['p50']:>9.1f} "
+                         f"{stats['latency_ms']['p95']:>9.1f} {stats['latency_ms']['p99']:>16.1f} {stats['errors']:>7}")
+    if baseline is not None:
+        if baseline.get('machine') != report.get('machine') or baseline.get('config') != report.get('config'):
+            lines.append('warning: baseline was measured on another machine or with other parameters')
+        lines.append(f"baseline: {(baseline.get('commit') or 'unknown')[:10]} {baseline.get('commit_subject') or ''}")
+    return '\n'.join(lines)
+
+
+def _change(value: float, before: float) -> str:
+    if not before:
+        return ''
+    return f' ({(value - before) / before * 100:+.0f}%)'
+
+
+def _cpu_model() -> str | None:
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or None
+
+
+def _memory_mb() -> int | None:
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError):
+        return None
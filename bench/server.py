@@ -0,0 +1,58 @@
+"""
+Запуск сервера для нагрузочного теста в отдельном каталоге.
+
+Файлы изображений, миниатюры, журналы и метрики пишутся в --data-dir,
+а не в пути Docker из config/settings.py. С --sqlite вместо PostgreSQL
+используется SQLiteDBManager; без него сервер подключается к базе из
+переменных окружения DB_* (см. TemporaryPostgres.env).
+
+Сервер запускает python -m bench, вручную он нужен только для отладки:
+    python -m bench.server --backend sync --mode prefork --workers 4 \\
+        --port 8090 --data-dir /tmp/bench --sqlite /tmp/bench/db.sqlite
+"""
+
+import argparse
+import os
+from pathlib import Path
+
+from config import settings
+
+
+def configure(data_dir: str, port: int) -> None:
+    """Переносит пути и адрес сервера в data_dir и на 127.0.0.1:port (до импорта app)"""
+    settings.SERVER_ADDRESS = ('127.0.0.1', port)
+    settings.IMAGES_PATH = os.path.join(data_dir, 'images')
+    settings.THUMBS_PATH = os.path.join(data_dir, 'thumbs')
+    settings.VARIANTS_PATH = os.path.join(data_dir, 'variants')
+    settings.STATIC_PATH = str(settings.STATIC_DIR)
+    for path in (settings.IMAGES_PATH, settings.THUMBS_PATH):
+        os.makedirs(path, exist_ok=True)
+
+    import config.logger_setup
+    config.logger_setup.LOGS_DIR = Path(data_dir) / 'logs'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сервер для нагрузочного теста')
+    parser.add_argument('--backend', choices=['sync', 'async'], default='sync')
+    parser.add_argument('--mode', choices=['single', 'threaded', 'prefork'], default='threaded')
+    parser.add_argument('--workers', type=int, default=settings.SERVER_WORKERS)
+    parser.add_argument('--port', type=int, required=True)
+    parser.add_argument('--data-dir', required=True)
+    parser.add_argument('--sqlite', help='файл базы SQLite вместо PostgreSQL')
+    args = parser.parse_args()
+
+    configure(args.data_dir, args.port)
+    if args.sqlite:
+        from bench.SQLiteDBManager import install
+        install(args.sqlite)
+
+    from app import app
+    if args.backend == 'async':
+        app.run_async(args.mode, args.workers)
+    else:
+        app.run(mode=args.mode, workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
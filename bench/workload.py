@@ -0,0 +1,258 @@
+"""
+Нагрузка для python -m bench: тестовые изображения, начальное наполнение
+и клиенты, которые выполняют смесь операций.
+
+Операции:
+    get    — GET /images/<имя> одного из изображений начального наполнения
+    thumb  — GET /thumbs/<ширина>/<имя>
+    list   — GET /api/images: первая страница, затем по next_cursor
+    upload — POST /api/images с одним файлом
+    delete — DELETE /api/images/<имя> файла, загруженного этим же клиентом
+             (если таких нет, выполняется upload)
+
+Все случайные выборы делаются генератором с заданным seed, поэтому
+последовательность запросов одинакова при каждом запуске.
+"""
+
+import http.client
+import io
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from PIL import Image
+
+OPERATIONS = ('get', 'thumb', 'list', 'upload', 'delete')
+
+# Тестовые изображения: формат, ширина, высота. Фотографии в JPEG разного
+# разрешения, снимки экрана в PNG и маленькие PNG-иконки
+SAMPLE_IMAGES = (
+    ('JPEG', 640, 480),
+    ('JPEG', 1280, 960),
+    ('JPEG', 1920, 1080),
+    ('JPEG', 1920, 1080),
+    ('JPEG', 3000, 2000),
+    ('PNG', 1280, 800),
+    ('PNG', 256, 256),
+    ('PNG', 64, 64),
+)
+
+# Страниц, которые клиент проходит по next_cursor, прежде чем начать сначала
+LIST_PAGES = 5
+LIST_PER_PAGE = 20
+THUMB_WIDTH = 320
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    """'get=70,list=15,upload=10,delete=5' -> {'get': 70, 'list': 15, 'upload': 10, 'delete': 5}"""
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.strip().partition('=')
+        if name not in OPERATIONS:
+            raise ValueError(f'Unknown operation {name!r}, expected one of {", ".join(OPERATIONS)}')
+        mix[name] = int(weight)
+    if not any(mix.values()):
+        raise ValueError('Workload mix is empty')
+    return mix
+
+
+def make_samples(directory: str, seed: int) -> list[dict]:
+    """
+    Создаёт тестовые изображения SAMPLE_IMAGES в directory.
+
+    Картинка — увеличенный случайный шум: сжимается примерно как
+    фотография, а не как однотонная заливка или чистый шум.
+
+    Возвращает:
+        list[dict]: {'path', 'name', 'content_type', 'size'}
+    """
+    rng = random.Random(seed)
+    samples = []
+    os.makedirs(directory, exist_ok=True)
+    for index, (image_format, width, height) in enumerate(SAMPLE_IMAGES):
+        noise = bytes(rng.getrandbits(8) for _ in range((width // 16) * (height // 16) * 3))
+        image = Image.frombytes('RGB', (width // 16, height // 16), noise).resize((width, height), Image.BICUBIC)
+        extension = 'jpg' if image_format == 'JPEG' else 'png'
+        path = os.path.join(directory, f'sample-{index}-{width}x{height}.{extension}')
+        options = {'quality': 85} if image_format == 'JPEG' else {}
+        image.save(path, image_format, **options)
+        samples.append({
+            'path': path,
+            'name': os.path.basename(path),
+            'content_type': 'image/jpeg' if image_format == 'JPEG' else 'image/png',
+            'size': os.path.getsize(path),
+        })
+    return samples
+
+
+def multipart(files: list[tuple[str, str, bytes]], field: str = 'file') -> tuple[bytes, str]:
+    """Тело multipart/form-data из (имя файла, Content-Type, содержимое) и значение Content-Type"""
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, content_type, data in files:
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{name}"\r\n'
+                   f'Content-Type: {content_type}\r\n\r\n'.encode())
+        body.write(data)
+        body.write(b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode())
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+
+def seed_images(host: str, port: int, samples: list[dict], count: int, batch_size: int = 20) -> list[str]:
+    """
+    Загружает count изображений через POST /api/images/batch.
+
+    Файлы берутся из samples по кругу. Возвращает имена загруженных файлов.
+    """
+    contents = [(sample['name'], sample['content_type'], _read(sample['path'])) for sample in samples]
+    filenames = []
+    conn = http.client.HTTPConnection(host, port, timeout=120)
+    try:
+        for start in range(0, count, batch_size):
+            batch = [contents[index % len(contents)] for index in range(start, min(start + batch_size, count))]
+            body, content_type = multipart(batch, field='files')
+            conn.request('POST', '/api/images/batch', body=body, headers={'Content-Type': content_type})
+            response = conn.getresponse()
+            data = response.read()
+            if response.status != 200:
+                raise RuntimeError(f'Seeding failed: {response.status} {data[:200]!r}')
+            filenames.extend(result['filename'] for result in json.loads(data)['results'] if result['success'])
+    finally:
+        conn.close()
+    if len(filenames) < count:
+        raise RuntimeError(f'Seeding failed: only {len(filenames)} of {count} images were accepted')
+    return filenames
+
+
+def run_clients(host: str, port: int, *, concurrency: int, processes: int, duration: float, warmup: float,
+                mix: dict[str, int], filenames: list[str], samples: list[dict], seed: int) -> list[dict]:
+    """
+    Выполняет нагрузку: concurrency соединений в processes процессах.
+
+    Каждый клиент работает warmup + duration секунд; запросы, начатые во
+    время прогрева, в результат не попадают.
+
+    Возвращает:
+        list[dict]: результат каждого процесса (см. _client_process)
+    """
+    processes = max(1, min(processes, concurrency))
+    started = time.time()
+    tasks = []
+    for index in range(processes):
+        threads = concurrency // processes + (1 if index < concurrency % processes else 0)
+        tasks.append(dict(host=host, port=port, threads=threads, start_at=started + 0.5, warmup=warmup,
+                          duration=duration, mix=mix, filenames=filenames, samples=samples,
+                          seed=seed * 1000 + index))
+    with ProcessPoolExecutor(processes, mp_context=get_context('fork')) as pool:
+        return list(pool.map(_client_process_kwargs, tasks))
+
+
+def _client_process_kwargs(kwargs: dict) -> dict:
+    return _client_process(**kwargs)
+
+
+def _client_process(host: str, port: int, threads: int, start_at: float, warmup: float, duration: float,
+                    mix: dict[str, int], filenames: list[str], samples: list[dict], seed: int) -> dict:
+    """
+    Клиенты одного процесса.
+
+    Возвращает:
+        dict: {'latencies': {операция: [сек, ...]}, 'statuses': {операция: {код: количество}},
+               'errors': {операция: количество}}
+    """
+    contents = [(sample['name'], sample['content_type'], _read(sample['path'])) for sample in samples]
+    result = {'latencies': {}, 'statuses': {}, 'errors': {}}
+    lock = threading.Lock()
+    measure_from = start_at + warmup
+    deadline = measure_from + duration
+
+    def client(client_seed: int) -> None:
+        rng = random.Random(client_seed)
+        names, weights = zip(*((name, weight) for name, weight in mix.items() if weight > 0))
+        conn = http.client.HTTPConnection(host, port, timeout=60)
+        state = {'uploaded': [], 'cursor': None, 'pages': 0}
+        latencies = {}
+        statuses = {}
+        errors = {}
+        time.sleep(max(0.0, start_at - time.time()))
+        while True:
+            begin = time.time()
+            if begin >= deadline:
+                break
+            operation = rng.choices(names, weights)[0]
+            if operation == 'delete' and not state['uploaded']:
+                operation = 'upload'
+            started = time.perf_counter()
+            try:
+                status = _perform(conn, operation, rng, state, filenames, contents)
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                status = None
+            elapsed = time.perf_counter() - started
+            if begin < measure_from or begin + elapsed > deadline:
+                continue
+            latencies.setdefault(operation, []).append(elapsed)
+            operation_statuses = statuses.setdefault(operation, {})
+            operation_statuses[status] = operation_statuses.get(status, 0) + 1
+            if status is None or status >= 400:
+                errors[operation] = errors.get(operation, 0) + 1
+        conn.close()
+        with lock:
+            for operation, values in latencies.items():
+                result['latencies'].setdefault(operation, []).extend(values)
+            for operation, counts in statuses.items():
+                merged = result['statuses'].setdefault(operation, {})
+                for status, count in counts.items():
+                    merged[status] = merged.get(status, 0) + count
+            for operation, count in errors.items():
+                result['errors'][operation] = result['errors'].get(operation, 0) + count
+
+    workers = [threading.Thread(target=client, args=(seed * 1000 + index,)) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return result
+
+
+def _perform(conn: http.client.HTTPConnection, operation: str, rng: random.Random, state: dict,
+             filenames: list[str], contents: list[tuple]) -> int:
+    """Выполняет одну операцию и возвращает код ответа; тело ответа читается полностью"""
+    if operation == 'get':
+        conn.request('GET', f'/images/{rng.choice(filenames)}')
+    elif operation == 'thumb':
+        conn.request('GET', f'/thumbs/{THUMB_WIDTH}/{rng.choice(filenames)}')
+    elif operation == 'list':
+        path = f'/api/images?per_page={LIST_PER_PAGE}'
+        if state['cursor']:
+            path += f"&cursor={state['cursor']}"
+        conn.request('GET', path)
+    elif operation == 'upload':
+        body, content_type = multipart([rng.choice(contents)])
+        conn.request('POST', '/api/images', body=body, headers={'Content-Type': content_type})
+    else:
+        filename = state['uploaded'].pop(rng.randrange(len(state['uploaded'])))
+        conn.request('DELETE', f'/api/images/{filename}')
+
+    response = conn.getresponse()
+    data = response.read()
+    if response.status == 200:
+        if operation == 'upload':
+            state['uploaded'].append(json.loads(data)['filename'])
+        elif operation == 'list':
+            state['pages'] += 1
+            cursor = json.loads(data).get('next_cursor')
+            if cursor is None or state['pages'] >= LIST_PAGES:
+                cursor, state['pages'] = None, 0
+            state['cursor'] = cursor
+    return response.status
+
+
+def _read(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
@@ -0,0 +1,14 @@
+#!/bin/bash
+
+# Фоновые задачи (таблица jobs). Воркеры работают в сервисе jobs
+# docker-compose; скрипт выполняет команды в нём, например:
+#   ./commands/jobs_worker.sh --stats
+#   ./commands/jobs_worker.sh --retry-failed
+#   ./commands/jobs_worker.sh --enqueue images.revalidate '{"filename": "<uuid>.jpg"}'
+#   ./commands/jobs_worker.sh --once   # выполнить готовые задачи и выйти
+docker compose -f config/docker/docker-compose.yml exec -T jobs python -m app.jobs.worker "$@"
+
+if [ $? -ne 0 ]; then
+    echo "Ошибка при выполнении команды воркера задач!"
+    exit 1
+fi
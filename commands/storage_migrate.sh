@@ -0,0 +1,14 @@
+#!/bin/bash
+
+# Перенос изображений в хранилище по хэшу содержимого (STORAGE_MODE=cas).
+# Параметры передаются скрипту миграции, например:
+#   ./commands/storage_migrate.sh --dry-run
+echo "Перенос изображений в хранилище по хэшу содержимого..."
+docker exec -t app python -m app.storage.migrate "$@"
+
+if [ $? -eq 0 ]; then
+    echo "Перенос завершён. Для новых загрузок установите STORAGE_MODE=cas"
+else
+    echo "Ошибка при переносе изображений!"
+    exit 1
+fi
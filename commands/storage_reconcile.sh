@@ -0,0 +1,16 @@
+#!/bin/bash
+
+# Сверка файлов изображений с БД: лишние файлы переносятся в карантин
+# (data/quarantine), записи без файлов перечисляются. Например:
+#   ./commands/storage_reconcile.sh --dry-run          # только отчёт
+#   ./commands/storage_reconcile.sh                    # перенос лишних файлов в карантин
+#   ./commands/storage_reconcile.sh --delete-dangling  # и удаление записей без файлов
+echo "Сверка файлов изображений с базой данных..."
+docker exec -t app python -m app.storage.reconcile "$@"
+
+if [ $? -eq 0 ]; then
+    echo "Сверка завершена"
+else
+    echo "Ошибка при сверке файлов!"
+    exit 1
+fi
@@ -1,13 +1,157 @@
 import os
+import tempfile
 from pathlib import Path
 
 # Настройки сервера
 SERVER_ADDRESS = ('0.0.0.0', 8000)
 
+# Режим работы сервера:
+#   single   — один поток, один процесс (как раньше)
+#   threaded — поток на каждый запрос (ThreadingHTTPServer)
+#   prefork  — несколько процессов-воркеров на одном порту (SO_REUSEPORT),
+#              каждый воркер обслуживает запросы в потоках
+SERVER_MODE = os.getenv('SERVER_MODE', 'threaded')
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', os.cpu_count() or 1))
+SERVER_REQUEST_QUEUE_SIZE = int(os.getenv('SERVER_REQUEST_QUEUE_SIZE', 128))
+
+# Постоянные соединения HTTP/1.1 (keep-alive). Соединение закрывается, если
+# следующий запрос не пришёл за SERVER_KEEPALIVE_TIMEOUT секунд (0 — после
+# каждого ответа) или по нему обслужено SERVER_KEEPALIVE_MAX_REQUESTS запросов.
+# Таймаут больше keepalive_timeout апстрима в nginx: простаивающее соединение
+# должен закрывать nginx, иначе он может отправить запрос в уже закрытое
+SERVER_KEEPALIVE_TIMEOUT = float(os.getenv('SERVER_KEEPALIVE_TIMEOUT', 75))
+SERVER_KEEPALIVE_MAX_REQUESTS = int(os.getenv('SERVER_KEEPALIVE_MAX_REQUESTS', 1000))
+SERVER_DRAIN_MAX_SIZE = 1024 * 1024  # Сколько непрочитанного тела запроса дочитать, чтобы не закрывать соединение
+
+# Бэкенд сервера:
+#   sync  — http.server + psycopg2 (по умолчанию)
+#   async — aiohttp + asyncpg, соединения обслуживаются корутинами
+SERVER_BACKEND = os.getenv('SERVER_BACKEND', 'sync')
+
 # Настройки для загрузки файлов
 ALLOWED_EXTENSIONS = ('jpg', 'jpeg', 'png', 'gif')
 ALLOWED_LENGTH = (5 * 1024 * 1024)  # 5MB
 ALLOWED_MIME_TYPES = ['image/jpeg', 'image/png', 'image/gif']
+# Расширение сохранённого файла — по типу содержимого, а не по имени от клиента
+MIME_EXTENSIONS = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/gif': 'gif'}
+UPLOAD_CHUNK_SIZE = 64 * 1024  # Размер блока при потоковом чтении тела запроса
+UPLOAD_MAX_BODY_SIZE = ALLOWED_LENGTH + 64 * 1024  # Файл + заголовки частей multipart
+UPLOAD_BATCH_MAX_FILES = int(os.getenv('UPLOAD_BATCH_MAX_FILES', 100))  # Файлов в одном запросе POST /api/images/batch
+UPLOAD_BATCH_MAX_BODY_SIZE = int(os.getenv('UPLOAD_BATCH_MAX_BODY_SIZE', 200 * 1024 * 1024))
+UPLOAD_VALIDATION_WORKERS = int(os.getenv('UPLOAD_VALIDATION_WORKERS', 4))  # Потоков для проверки типа файлов пакета
+
+# Пакетное удаление (POST /api/images/delete)
+DELETE_BATCH_MAX_ITEMS = int(os.getenv('DELETE_BATCH_MAX_ITEMS', 100000))  # id и имён файлов в одном запросе
+DELETE_BATCH_MAX_BODY_SIZE = 8 * 1024 * 1024
+UNLINK_BATCH_SIZE = 1000  # Сколько файлов BlobStore фоновое удаление освобождает одной транзакцией
+
+# Способ хранения загруженных файлов:
+#   flat — IMAGES_PATH/<uuid>.<расширение>, каждый файл отдельно (по умолчанию)
+#   cas  — по хэшу содержимого: IMAGES_PATH/ab/cd/<sha256>; одинаковые файлы
+#          хранятся один раз, в таблице blobs ведётся счётчик ссылок
+STORAGE_MODE = os.getenv('STORAGE_MODE', 'flat')
+
+# Где хранятся файлы изображений (app/storage):
+#   local — каталог IMAGES_PATH (по умолчанию)
+#   s3    — S3-совместимое хранилище (AWS S3, MinIO), нужен пакет boto3.
+#           Уменьшенные копии по-прежнему кэшируются на локальном диске (THUMBS_PATH)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'local')
+S3_BUCKET = os.getenv('S3_BUCKET', 'images')
+S3_PREFIX = os.getenv('S3_PREFIX', '')  # Префикс ключей в бакете, например 'images/'
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL') or None  # Для MinIO и moto, например http://minio:9000
+S3_REGION = os.getenv('S3_REGION') or None
+# Без ключей boto3 берёт учётные данные из своей стандартной цепочки (AWS_*, профиль, роль)
+S3_ACCESS_KEY_ID = os.getenv('S3_ACCESS_KEY_ID') or None
+S3_SECRET_ACCESS_KEY = os.getenv('S3_SECRET_ACCESS_KEY') or None
+S3_MAX_POOL_CONNECTIONS = int(os.getenv('S3_MAX_POOL_CONNECTIONS', 32))  # HTTP-соединений в пуле клиента процесса
+S3_MULTIPART_THRESHOLD = int(os.getenv('S3_MULTIPART_THRESHOLD', 8 * 1024 * 1024))  # С какого размера загружать частями
+S3_MULTIPART_CHUNK_SIZE = int(os.getenv('S3_MULTIPART_CHUNK_SIZE', 8 * 1024 * 1024))
+S3_UPLOAD_CONCURRENCY = int(os.getenv('S3_UPLOAD_CONCURRENCY', 4))  # Частей, загружаемых параллельно
+S3_SPOOL_PATH = os.getenv('S3_SPOOL_PATH', os.path.join(tempfile.gettempdir(), 'image-hosting-uploads'))
+
+# Политики кэширования (заголовок Cache-Control) для разных типов ответов
+IMAGE_CACHE_CONTROL = 'public, max-age=31536000, immutable'  # Имена картинок уникальны (UUID), содержимое не меняется
+STATIC_CACHE_CONTROL = 'public, max-age=3600'
+FAVICON_CACHE_CONTROL = 'public, max-age=31536000'
+DEFAULT_CACHE_CONTROL = 'no-cache, no-store, must-revalidate'  # Для динамических ответов (API, редиректы, ошибки)
+
+# Отдача картинок через nginx: приложение только находит файл и отвечает
+# заголовком X-Accel-Redirect, а байты nginx отдаёт с диска из internal
+# location ACCEL_REDIRECT_PREFIX (config/nginx/nginx.conf). Работает только за
+# nginx и с STORAGE_BACKEND=local: при обращении к приложению напрямую тело
+# ответа будет пустым
+ACCEL_REDIRECT_ENABLED = os.getenv('ACCEL_REDIRECT_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+ACCEL_REDIRECT_PREFIX = os.getenv('ACCEL_REDIRECT_PREFIX', '/_protected_images/')  # Ключ файла дописывается к префиксу
+ACCEL_REDIRECT_VARIANTS_PREFIX = os.getenv('ACCEL_REDIRECT_VARIANTS_PREFIX', '/_protected_variants/')  # Копии из VARIANTS_PATH
+
+# Сжатие динамических ответов (JSON, HTML, метрики) по заголовку Accept-Encoding:
+# zstd и br — если установлены пакеты zstandard и brotli, gzip — всегда.
+# Ответы меньше COMPRESSION_MIN_SIZE байт и картинки не сжимаются. Уровни
+# быстрые: в отличие от статики, ответ сжимается заново на каждый запрос
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_LEVELS = {'gzip': 5, 'br': 4, 'zstd': 3}
+
+# Сколько записей о файлах изображений (путь, размер, MIME-тип, ETag) держать в памяти процесса
+IMAGE_METADATA_CACHE_SIZE = int(os.getenv('IMAGE_METADATA_CACHE_SIZE', 10000))
+# Через сколько секунд запись кэша перед отдачей сверяется с таблицей images: кэш
+# свой у каждого процесса, и удалённое в другом процессе изображение отдаётся не дольше этого
+IMAGE_METADATA_CACHE_TTL = float(os.getenv('IMAGE_METADATA_CACHE_TTL', 5))
+
+# Уменьшенные копии изображений (миниатюры)
+THUMBNAIL_SIZES = tuple(int(w) for w in os.getenv('THUMBNAIL_SIZES', '160,320').split(',') if w.strip())  # Ширины, которые готовятся сразу после загрузки
+THUMBNAIL_MIN_WIDTH = 16  # Остальные ширины из этого диапазона готовятся при первом запросе
+THUMBNAIL_MAX_WIDTH = int(os.getenv('THUMBNAIL_MAX_WIDTH', 1600))
+THUMBNAIL_WIDTH_STEP = int(os.getenv('THUMBNAIL_WIDTH_STEP', 80))  # Остальные ширины округляются вверх до кратной шагу
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))  # Процессов в пуле, который уменьшает картинки
+THUMBNAIL_QUALITY = 85  # Качество JPEG
+THUMBNAIL_TIMEOUT = 30  # Сколько секунд запрос ждёт готовую миниатюру
+
+# Перекодирование картинок в WebP/AVIF по заголовку Accept (app/media/VariantService.py).
+# Копия готовится в фоне при первом запросе, до её готовности отдаётся оригинал.
+# AVIF есть в Pillow начиная с 11.3; форматы, которых нет в установленном Pillow, пропускаются
+VARIANTS_ENABLED = os.getenv('VARIANTS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+VARIANT_FORMATS = tuple(f.strip() for f in os.getenv('VARIANT_FORMATS', 'avif,webp').split(',') if f.strip())  # В порядке предпочтения
+VARIANT_QUALITY = {'webp': 80, 'avif': 60}
+VARIANT_SOURCE_TYPES = ('image/jpeg', 'image/png')  # GIF отдаётся как есть
+VARIANT_WORKERS = int(os.getenv('VARIANT_WORKERS', 1))  # Процессов в пуле, который перекодирует картинки
+# Оригинал, отданный, пока копия не готова, кэшируется ненадолго: иначе браузер
+# не запросит картинку снова и копию так и не получит
+VARIANT_PENDING_CACHE_CONTROL = 'public, max-age=60'
+
+# Сверка файлов с БД (python -m app.storage.reconcile)
+RECONCILE_GRACE_PERIOD = int(os.getenv('RECONCILE_GRACE_PERIOD', 3600))  # Файлы и записи моложе стольких секунд не трогаем: возможно, загрузка ещё идёт
+RECONCILE_SORT_CHUNK_SIZE = 200000  # Сколько имён файлов сортировать в памяти, остальное — через временные файлы
+
+# Фоновые задачи (app/jobs, таблица jobs). Если включены, сервер ставит
+# в очередь миниатюры после загрузки и удаление файлов, а выполняют их
+# воркеры, запущенные отдельно (commands/jobs_worker.sh)
+JOBS_ENABLED = os.getenv('JOBS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+JOBS_WORKER_THREADS = int(os.getenv('JOBS_WORKER_THREADS', 4))
+JOBS_POLL_INTERVAL = 1.0  # Сколько секунд воркер ждёт, если очередь пуста
+JOBS_VISIBILITY_TIMEOUT = int(os.getenv('JOBS_VISIBILITY_TIMEOUT', 300))  # Через сколько секунд задачу зависшего воркера заберёт другой
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_BASE_DELAY = 5  # Задержка перед повтором: 5, 10, 20, ... секунд
+JOBS_RETRY_MAX_DELAY = 3600
+
+# Метрики Prometheus (GET /metrics, нужен пакет prometheus_client).
+# Воркеры пишут значения в файлы METRICS_MULTIPROC_DIR, /metrics суммирует их
+# по всем процессам; каталог очищается при запуске сервера
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+METRICS_MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR', '/tmp/image-hosting-metrics')
+
+# Профилирование запросов (app/utils/profiling.py). Запрос профилируется,
+# если в заголовке X-Profile или параметре ?_profile= передан PROFILE_TOKEN,
+# или случайно с вероятностью PROFILE_SAMPLE_RATE. Пустой токен и 0 — выключено
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_MODE = os.getenv('PROFILE_MODE', 'cprofile')  # cprofile — .pstats, sampling — свёрнутые стеки .collapsed
+PROFILE_SAMPLE_INTERVAL = 0.005  # Период снятия стеков в режиме sampling, сек
+PROFILE_PATH = os.getenv('PROFILE_PATH', '/app/profiles')
+SLOW_REQUEST_THRESHOLD = float(os.getenv('SLOW_REQUEST_THRESHOLD', 0))  # Запросы дольше стольких секунд пишутся в журнал по фазам; 0 — выключено
+
+# Как часто (в секундах) проверять изменения файлов в STATIC_PATH для кэша в памяти; 0 — только по SIGHUP
+STATIC_CACHE_CHECK_INTERVAL = float(os.getenv('STATIC_CACHE_CHECK_INTERVAL', 2))
 
 # Пути к директориям
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -20,6 +164,9 @@ LOGS_PATH = '/app/logs'
 LOG_FILE = 'app.log'
 ERROR_FILE = 'upload_failed.html'
 STATIC_PATH = '/app/static'  # Возвращаем оригинальный путь для Docker
+THUMBS_PATH = os.getenv('THUMBS_PATH', '/app/thumbs')  # Уменьшенные копии: THUMBS_PATH/<ширина>/<имя файла>
+VARIANTS_PATH = os.getenv('VARIANTS_PATH', '/app/variants')  # Копии в WebP/AVIF: VARIANTS_PATH/<формат>-<качество>/<имя файла>.<формат>
+QUARANTINE_PATH = os.getenv('QUARANTINE_PATH', '/app/quarantine')  # Лишние файлы, найденные app.storage.reconcile
 
 # Новые пути (с использованием Path)
 IMAGES_DIR = DATA_DIR / 'images'
@@ -30,6 +177,17 @@ STATIC_DIR = DATA_DIR / 'static'
 for directory in [DATA_DIR, IMAGES_DIR, LOGS_DIR, STATIC_DIR]:
     directory.mkdir(parents=True, exist_ok=True)
 
+# Журнал доступа (app/utils/access_log.py): строка на запрос, пишется фоновым потоком
+ACCESS_LOG_ENABLED = os.getenv('ACCESS_LOG_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+ACCESS_LOG_FILE = os.getenv('ACCESS_LOG_FILE', str(LOGS_DIR / 'access.log'))  # '-' — в stdout
+ACCESS_LOG_FORMAT = os.getenv('ACCESS_LOG_FORMAT', 'json')  # json | combined
+# Доля записываемых запросов по маршрутам, 'МЕТОД шаблон=доля' через запятую; ошибки пишутся всегда
+ACCESS_LOG_SAMPLE_RATES = os.getenv('ACCESS_LOG_SAMPLE_RATES',
+                                    'GET /images/<filename>=0.1,GET /thumbs/<size>/<filename>=0.1')
+ACCESS_LOG_QUEUE_SIZE = 10000  # Записей в очереди; при переполнении новые отбрасываются
+ACCESS_LOG_BATCH_SIZE = 500
+ACCESS_LOG_FLUSH_INTERVAL = 1.0  # Не дольше стольких секунд запись ждёт в очереди, сек
+
 # Настройки базы данных
 DB_CONFIG = {
     'dbname': os.getenv('DB_NAME', 'image_hosting'),
@@ -44,5 +202,11 @@ DB_CONFIG = {
 DB_CONNECT_RETRIES = 10
 DB_RETRY_DELAY = 5
 
+# Настройки пула соединений
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))  # Ожидание свободного соединения, сек
+DB_POOL_HEALTHCHECK_INTERVAL = float(os.getenv('DB_POOL_HEALTHCHECK_INTERVAL', 30))  # Проверка SELECT 1 после простоя, сек
+
 # Строка подключения к базе данных
 DATABASE_URL = f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['dbname']}"
\ No newline at end of file
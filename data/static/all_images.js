@@ -1,7 +1,7 @@
 document.addEventListener('DOMContentLoaded', function() {
     let currentImageIndex = 0;
     let images = [];
-    let currentPage = 1;
+    let nextCursor = null; // курсор следующей порции из ответа API
     let isLoading = false;
     let currentView = 'gallery'; // 'gallery' или 'table'
 
@@ -47,7 +47,7 @@ document.addEventListener('DOMContentLoaded', function() {
         // Устанавливаем количество изображений для галереи
         imagesPerPage = 15;
         // Обновляем изображения при переключении вида
-        loadImages(1);
+        loadImages();
     });
     
     tableViewBtn.addEventListener('click', () => {
@@ -60,7 +60,7 @@ document.addEventListener('DOMContentLoaded', function() {
         // Устанавливаем большее количество изображений для таблицы
         imagesPerPage = 25;
         // Обновляем изображения при переключении вида
-        loadImages(1);
+        loadImages();
     });
 
     /**
@@ -213,12 +213,13 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     /**
-     * Загружает изображения с пагинацией
+     * Загружает изображения с пагинацией по курсору
      * 
-     * @param {number} page - Номер страницы (начиная с 1)
+     * @param {string|null} cursor - Курсор из next_cursor предыдущего ответа
+     *                               (null — загрузить список заново)
      * @returns {Promise<void>}
      */
-    async function loadImages(page = 1) {
+    async function loadImages(cursor = null) {
         if (isLoading) return;
         isLoading = true;
         
@@ -242,7 +243,11 @@ document.addEventListener('DOMContentLoaded', function() {
 
         try {
             // Передаем параметр per_page со значением imagesPerPage
-            const response = await fetch(`/api/images?page=${page}&per_page=${imagesPerPage}`);
+            let url = `/api/images?per_page=${imagesPerPage}`;
+            if (cursor) {
+                url += `&cursor=${encodeURIComponent(cursor)}`;
+            }
+            const response = await fetch(url);
             
             if (!response.ok) {
                 throw new Error(`Ошибка загрузки: ${response.status} ${response.statusText}`);
@@ -250,19 +255,15 @@ document.addEventListener('DOMContentLoaded', function() {
             
             const data = await response.json();
             
-            if (page === 1) {
+            if (!cursor) {
                 images = data.images;
             } else {
-                // Проверяем, есть ли новые изображения
-                if (data.images.length === 0) {
-                    isLoading = false;
-                    return;
-                }
                 images = [...images, ...data.images];
             }
+            // null означает, что изображений больше нет
+            nextCursor = data.next_cursor;
 
             renderAllImages();
-            currentPage = page;
         } catch (error) {
             console.error('Ошибка загрузки изображений:', error);
             
@@ -271,7 +272,7 @@ document.addEventListener('DOMContentLoaded', function() {
             errorContainer.style.display = 'block';
             
             // Если это первая страница и произошла ошибка, показываем пустое состояние
-            if (page === 1) {
+            if (!cursor) {
                 const galleryContainer = document.getElementById('images-gallery');
                 galleryContainer.innerHTML = '<p class="no-images">Не удалось загрузить изображения. Попробуйте обновить страницу.</p>';
             }
@@ -333,7 +334,9 @@ document.addEventListener('DOMContentLoaded', function() {
             };
 
                 const imageElement = document.createElement('img');
-            imageElement.src = `/images/${image.filename}`;
+            // В сетке достаточно уменьшенной копии, оригинал открывается в предпросмотре
+            imageElement.src = `/thumbs/320/${image.filename}`;
+            imageElement.loading = 'lazy';
             imageElement.alt = image.original_name || image.filename;
             imageElement.style.maxWidth = '100%';
             imageElement.style.maxHeight = '100%';
@@ -368,7 +371,8 @@ document.addEventListener('DOMContentLoaded', function() {
             // Превью
             const thumbnailCell = document.createElement('td');
             const thumbnail = document.createElement('img');
-            thumbnail.src = `/images/${image.filename}`;
+            thumbnail.src = `/thumbs/160/${image.filename}`;
+            thumbnail.loading = 'lazy';
             thumbnail.alt = image.original_name || image.filename;
             thumbnail.className = 'thumbnail';
             thumbnailCell.appendChild(thumbnail);
@@ -448,11 +452,11 @@ document.addEventListener('DOMContentLoaded', function() {
         const scrollPosition = window.innerHeight + window.scrollY;
         const documentHeight = document.documentElement.scrollHeight;
         
-        if (scrollPosition >= documentHeight - 1000 && !isLoading) {
-            loadImages(currentPage + 1);
+        if (scrollPosition >= documentHeight - 1000 && !isLoading && nextCursor) {
+            loadImages(nextCursor);
         }
     });
 
     // Начальная загрузка изображений
-    loadImages(1);
+    loadImages();
 });
\ No newline at end of file
@@ -0,0 +1,83 @@
+"""Range и If-Range в AsyncImageHostingHandler.send_image: те же правила, что у синхронного бэкенда."""
+
+import asyncio
+import os
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from app.handlers.AsyncImageHostingHandler import AsyncImageHostingHandler
+from app.storage.LocalStorage import LocalStorage
+from app.utils.image_metadata import ImageMetadata
+from config import settings
+
+CONTENT = os.urandom(1000)
+
+
+@pytest.fixture
+def app(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    (tmp_path / 'a.jpg').write_bytes(CONTENT)
+
+    def handler(remote: bool):
+        async def send(request: web.Request) -> web.StreamResponse:
+            stored = storage.stat('a.jpg')
+            if remote:
+                # Как у S3Storage: локального пути нет, тело читается через storage.open
+                stored.path = None
+            image = AsyncImageHostingHandler(request)
+            image.storage = storage
+            return await image.send_image(ImageMetadata('a.jpg', stored, 'image/jpeg'))
+        return send
+
+    app = web.Application()
+    app.router.add_get('/local', handler(remote=False))
+    app.router.add_get('/remote', handler(remote=True))
+    return app
+
+
+def fetch(app, path: str, headers: dict = None) -> list[tuple]:
+    """Выполняет запросы: сначала без заголовков (валидаторы), затем с headers"""
+    async def run():
+        async with TestClient(TestServer(app)) as client:
+            plain = await client.get(path)
+            etag, last_modified = plain.headers['ETag'], plain.headers['Last-Modified']
+            prepared = {name: value.format(etag=etag, last_modified=last_modified)
+                        for name, value in (headers or {}).items()}
+            response = await client.get(path, headers=prepared)
+            return response.status, response.headers, await response.read()
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('path', ['/local', '/remote'])
+def test_range_without_if_range(app, path):
+    status, headers, body = fetch(app, path, {'Range': 'bytes=10-19'})
+    assert status == 206
+    assert headers['Content-Range'] == 'bytes 10-19/1000'
+    assert body == CONTENT[10:20]
+
+
+@pytest.mark.parametrize('path', ['/local', '/remote'])
+@pytest.mark.parametrize('if_range', ['{etag}', '{last_modified}'])
+def test_matching_if_range(app, path, if_range):
+    status, _, body = fetch(app, path, {'Range': 'bytes=0-9', 'If-Range': if_range})
+    assert status == 206
+    assert body == CONTENT[:10]
+
+
+@pytest.mark.parametrize('path', ['/local', '/remote'])
+@pytest.mark.parametrize('if_range', ['"nope"', 'W/{etag}', 'Mon, 01 Jan 2001 00:00:00 GMT'])
+def test_mismatched_if_range_serves_whole_file(app, path, if_range):
+    status, headers, body = fetch(app, path, {'Range': 'bytes=0-9', 'If-Range': if_range})
+    assert status == 200
+    assert 'Content-Range' not in headers
+    assert body == CONTENT
+
+
+@pytest.mark.parametrize('path', ['/local', '/remote'])
+def test_unsatisfiable_range_is_not_cached(app, path):
+    status, headers, _ = fetch(app, path, {'Range': 'bytes=5000-'})
+    assert status == 416
+    assert headers['Content-Range'] == 'bytes */1000'
+    assert headers.get('Cache-Control') != settings.IMAGE_CACHE_CONTROL
@@ -0,0 +1,151 @@
+"""MultipartStreamParser: разделители на границе блоков, обрезанное тело, ограничения размера."""
+
+import hashlib
+import io
+import os
+
+import pytest
+
+from app.handlers.FileHandler import MultipartError, MultipartStreamParser, UploadTooLarge
+
+BOUNDARY = b'----boundary42'
+
+
+def build_body(parts: list[tuple], boundary: bytes = BOUNDARY) -> bytes:
+    """parts: (имя поля, имя файла или None, содержимое)"""
+    body = b'preamble\r\n'
+    for name, filename, content in parts:
+        body += b'--' + boundary + b'\r\n'
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        body += f'Content-Disposition: {disposition}\r\n'.encode()
+        if filename is not None:
+            body += b'Content-Type: application/octet-stream\r\n'
+        body += b'\r\n' + content + b'\r\n'
+    return body + b'--' + boundary + b'--\r\nepilogue'
+
+
+def parse(body: bytes, tmp_path, content_length: int = None, **options):
+    parser = MultipartStreamParser(BOUNDARY, str(tmp_path), **options)
+    return parser.parse(io.BytesIO(body), len(body) if content_length is None else content_length)
+
+
+def read(upload) -> bytes:
+    with open(upload.path, 'rb') as f:
+        return f.read()
+
+
+def spooled(tmp_path) -> list[str]:
+    return [name for name in os.listdir(tmp_path) if name.startswith('.upload-')]
+
+
+# Блоки короче разделителя и не кратные ему: разделитель приходит в двух и более блоках
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 16, 17, 64, 4096])
+def test_delimiter_split_across_chunks(tmp_path, chunk_size):
+    content = os.urandom(1000)
+    body = build_body([('title', None, 'привет'.encode()), ('file', 'a.jpg', content)])
+
+    fields, files = parse(body, tmp_path, chunk_size=chunk_size)
+
+    assert fields == {'title': 'привет'}
+    assert [(f.field, f.filename, f.size) for f in files] == [('file', 'a.jpg', 1000)]
+    assert read(files[0]) == content
+
+
+@pytest.mark.parametrize('chunk_size', [5, 16, 19])
+def test_partial_delimiter_inside_content_is_kept(tmp_path, chunk_size):
+    # Хвост len(sep) - 1 в буфере: начало разделителя внутри файла не должно теряться
+    delimiter = b'\r\n--' + BOUNDARY
+    content = b'x' * 10 + delimiter[:-1] + b'y' + delimiter[:5] + b'\r\n--' + b'z' * 10
+    body = build_body([('file', 'a.bin', content)])
+
+    _, files = parse(body, tmp_path, chunk_size=chunk_size)
+
+    assert read(files[0]) == content
+
+
+def test_multiple_files_head_and_hash(tmp_path):
+    first, second = os.urandom(5000), os.urandom(10)
+    body = build_body([('files', 'a.png', first), ('files', 'b.png', second)])
+
+    _, files = parse(body, tmp_path, chunk_size=100, hash_algorithm='sha256')
+
+    assert [read(f) for f in files] == [first, second]
+    assert files[0].head == first[:2048]
+    assert files[1].head == second
+    assert files[0].digest == hashlib.sha256(first).hexdigest()
+
+
+def test_filename_path_is_stripped(tmp_path):
+    body = build_body([('file', 'C:\\Users\\me\\photo.jpg', b'data')])
+
+    _, files = parse(body, tmp_path)
+
+    assert files[0].filename == 'photo.jpg'
+
+
+def test_connection_closed_before_end(tmp_path):
+    body = build_body([('file', 'a.jpg', os.urandom(500))])
+    truncated = body[:300]
+
+    with pytest.raises(MultipartError, match='Connection closed'):
+        parse(truncated, tmp_path, content_length=len(body), chunk_size=64)
+    assert spooled(tmp_path) == []
+
+
+def test_content_length_shorter_than_body(tmp_path):
+    body = build_body([('file', 'a.jpg', os.urandom(500))])
+
+    with pytest.raises(MultipartError, match='Unexpected end'):
+        parse(body, tmp_path, content_length=300, chunk_size=64)
+    assert spooled(tmp_path) == []
+
+
+def test_malformed_delimiter(tmp_path):
+    body = b'--' + BOUNDARY + b'XX\r\n'
+
+    with pytest.raises(MultipartError):
+        parse(body, tmp_path)
+
+
+def test_oversize_file_aborts_parse(tmp_path):
+    body = build_body([('file', 'a.jpg', b'ok'), ('file', 'big.jpg', b'x' * 101)])
+
+    with pytest.raises(UploadTooLarge):
+        parse(body, tmp_path, max_file_size=100, chunk_size=16)
+    # Временные файлы уже разобранных частей удаляются
+    assert spooled(tmp_path) == []
+
+
+def test_oversize_file_is_skipped_in_batch(tmp_path):
+    body = build_body([('files', 'big.jpg', b'x' * 101), ('files', 'ok.jpg', b'y' * 100)])
+
+    _, files = parse(body, tmp_path, max_file_size=100, chunk_size=16, fail_on_oversize=False)
+
+    assert files[0].error is not None
+    assert files[0].size == 101
+    assert files[1].error is None
+    assert read(files[1]) == b'y' * 100
+
+
+def test_too_many_files(tmp_path):
+    body = build_body([('files', f'{i}.jpg', b'data') for i in range(3)])
+
+    with pytest.raises(UploadTooLarge, match='Too many files'):
+        parse(body, tmp_path, max_files=2)
+    assert spooled(tmp_path) == []
+
+
+def test_field_too_large(tmp_path):
+    body = build_body([('comment', None, b'x' * (MultipartStreamParser.MAX_FIELD_SIZE + 1))])
+
+    with pytest.raises(UploadTooLarge, match='Form field'):
+        parse(body, tmp_path)
+
+
+def test_part_headers_too_large(tmp_path):
+    body = b'--' + BOUNDARY + b'\r\n' + b'X-Filler: ' + b'x' * MultipartStreamParser.MAX_HEADERS_SIZE
+
+    with pytest.raises(MultipartError, match='too large'):
+        parse(body, tmp_path, content_length=len(body) + 100)
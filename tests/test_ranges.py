@@ -0,0 +1,82 @@
+"""Разбор Range и If-Range в AdvancedHTTPRequestHandler (без сокета и сервера)."""
+
+from email.utils import formatdate
+from http.client import HTTPMessage
+
+import pytest
+
+from app.handlers.AdvancedHandler import AdvancedHTTPRequestHandler
+
+SIZE = 1000
+MTIME = 1_700_000_000.5
+LAST_MODIFIED = formatdate(MTIME, usegmt=True)
+ETAG = '"abc-3e8"'
+
+
+def requested_range(headers: dict, command: str = 'GET'):
+    handler = AdvancedHTTPRequestHandler.__new__(AdvancedHTTPRequestHandler)
+    handler.command = command
+    handler.headers = HTTPMessage()
+    for name, value in headers.items():
+        handler.headers[name] = value
+    return handler._requested_range(SIZE, MTIME, LAST_MODIFIED, ETAG)
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-99', (0, 99)),
+    ('bytes=10-19', (10, 19)),
+    ('bytes=900-', (900, 999)),
+    ('bytes=900-5000', (900, 999)),
+    ('bytes=-100', (900, 999)),
+    ('bytes=-5000', (0, 999)),
+    ('bytes=999-999', (999, 999)),
+    ('BYTES = 0-0', (0, 0)),
+])
+def test_satisfiable(header, expected):
+    assert requested_range({'Range': header}) == expected
+
+
+@pytest.mark.parametrize('header', ['bytes=1000-', 'bytes=5000-6000', 'bytes=20-10', 'bytes=-0'])
+def test_unsatisfiable(header):
+    assert requested_range({'Range': header}) == 'unsatisfiable'
+
+
+@pytest.mark.parametrize('header', [
+    'items=0-10',       # не байты
+    'bytes=0-1,5-6',    # несколько диапазонов не поддерживаются
+    'bytes=a-b',
+    'bytes=',
+])
+def test_ignored_range_serves_whole_file(header):
+    assert requested_range({'Range': header}) is None
+
+
+def test_no_range_header():
+    assert requested_range({}) is None
+
+
+def test_range_ignored_for_post():
+    assert requested_range({'Range': 'bytes=0-9'}, command='POST') is None
+
+
+def test_range_for_head():
+    assert requested_range({'Range': 'bytes=0-9'}, command='HEAD') == (0, 9)
+
+
+@pytest.mark.parametrize('if_range', [
+    ETAG,
+    LAST_MODIFIED,
+    formatdate(MTIME + 60, usegmt=True),
+])
+def test_if_range_matches(if_range):
+    assert requested_range({'Range': 'bytes=0-9', 'If-Range': if_range}) == (0, 9)
+
+
+@pytest.mark.parametrize('if_range', [
+    '"other"',
+    'W/"abc-3e8"',  # для If-Range слабый ETag не подходит
+    formatdate(MTIME - 60, usegmt=True),
+    'not a date',
+])
+def test_if_range_mismatch_serves_whole_file(if_range):
+    assert requested_range({'Range': 'bytes=0-9', 'If-Range': if_range}) is None
@@ -0,0 +1,144 @@
+"""Router: дерево сегментов, приоритет совпадений, наборы методов для 405."""
+
+import pytest
+
+from app.router import Router
+
+
+class Handler:
+    def get_image(self, filename):
+        return ('image', filename)
+
+    def get_thumbnail(self, size, filename):
+        return ('thumb', size, filename)
+
+    def delete_image(self, filename):
+        return ('delete', filename)
+
+    def get_latest(self):
+        return ('latest',)
+
+    def get_file(self, id):
+        return ('file', id)
+
+    def serve_static(self, path):
+        return ('static', path)
+
+    def get_any(self, **params):
+        return ('any', params)
+
+
+@pytest.fixture
+def router():
+    # Router — синглтон; для каждого теста нужна своя пустая таблица
+    router = object.__new__(Router)
+    router.__init__()
+    router.add_route('GET', '/api/images', Handler.get_latest)
+    router.add_route('GET', '/api/images/latest', Handler.get_latest)
+    router.add_route('GET', '/api/images/<filename>', Handler.get_image)
+    router.add_route('DELETE', '/api/images/<filename>', Handler.delete_image)
+    router.add_route('GET', '/thumbs/<size>/<filename>', Handler.get_thumbnail)
+    router.add_route('GET', '/files/file-<id>.png', Handler.get_file)
+    router.add_route('GET', '/static/<path:path>', Handler.serve_static)
+    router.add_route('POST', '/static/upload', Handler.get_latest)
+    router.add_route('GET', '/any/<a>/<b>', Handler.get_any)
+    return router
+
+
+def call(router, method: str, path: str):
+    found = router.match(method, path)
+    assert found.route is not None, found.allowed
+    return found.route.call(Handler(), found.params)
+
+
+def test_static_path(router):
+    assert call(router, 'GET', '/api/images') == ('latest',)
+
+
+def test_query_string_is_ignored(router):
+    assert call(router, 'GET', '/api/images?page=2') == ('latest',)
+
+
+def test_exact_segment_wins_over_parameter(router):
+    assert call(router, 'GET', '/api/images/latest') == ('latest',)
+    assert call(router, 'GET', '/api/images/a.jpg') == ('image', 'a.jpg')
+
+
+def test_several_parameters(router):
+    assert call(router, 'GET', '/thumbs/320/a.jpg') == ('thumb', '320', 'a.jpg')
+
+
+def test_pattern_segment(router):
+    assert call(router, 'GET', '/files/file-42.png') == ('file', '42')
+    assert router.match('GET', '/files/file-42.jpg').route is None
+
+
+def test_catch_all(router):
+    assert call(router, 'GET', '/static/css/site/main.css') == ('static', 'css/site/main.css')
+    assert router.match('GET', '/static/').route is None
+
+
+def test_static_route_wins_over_catch_all(router):
+    assert router.match('POST', '/static/upload').route.handler is Handler.get_latest
+    # GET того же пути уходит в <path:path>
+    assert call(router, 'GET', '/static/upload') == ('static', 'upload')
+
+
+def test_handler_receives_all_params_with_kwargs(router):
+    assert call(router, 'GET', '/any/1/2') == ('any', {'a': '1', 'b': '2'})
+
+
+def test_not_found(router):
+    found = router.match('GET', '/missing')
+    assert found.route is None
+    assert found.allowed == frozenset()
+    assert router.resolve('GET', '/missing') == (None, '404 Not Found')
+
+
+def test_empty_parameter_does_not_match(router):
+    assert router.match('GET', '/api/images/').route is None
+
+
+def test_method_not_allowed_on_parameter_path(router):
+    found = router.match('POST', '/api/images/a.jpg')
+    assert found.route is None
+    assert found.allowed == {'GET', 'DELETE'}
+    assert router.resolve('POST', '/api/images/a.jpg') == (None, '405 Method Not Allowed')
+
+
+def test_method_not_allowed_on_static_path(router):
+    assert router.match('DELETE', '/api/images').allowed == {'GET'}
+
+
+def test_allowed_methods_merge_across_matching_routes(router):
+    # /static/upload: POST — статический маршрут, GET — <path:path>
+    assert router.match('DELETE', '/static/upload').allowed == {'GET', 'POST'}
+    # /api/images/latest: GET — точный сегмент, DELETE — <filename>
+    assert router.match('PUT', '/api/images/latest').allowed == {'GET', 'DELETE'}
+
+
+def test_allowed_is_returned_for_matched_route(router):
+    assert router.match('GET', '/api/images/a.jpg').allowed == {'GET', 'DELETE'}
+
+
+def test_unsupported_method(router):
+    with pytest.raises(ValueError):
+        router.add_route('TRACE', '/x', Handler.get_latest)
+
+
+def test_catch_all_must_be_last(router):
+    with pytest.raises(ValueError):
+        router.add_route('GET', '/files/<path:path>/edit', Handler.serve_static)
+
+
+def test_conflicting_parameter_names(router):
+    with pytest.raises(ValueError):
+        router.add_route('PUT', '/api/images/<name>', Handler.get_image)
+
+
+def test_add_route_does_not_change_previous_table(router):
+    # copy-on-write: уже полученные ссылки на таблицу не меняются
+    root = router._root
+    router.add_route('PUT', '/api/images/<filename>', Handler.get_image)
+    assert router.match('PUT', '/api/images/a.jpg').route is not None
+    assert 'PUT' not in root.children['api'].children['images'].param[1].routes